@@ -1,19 +1,29 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from core.views import (
     register,
     MyLoginView,
     dashboard,
+    dashboard_async,
     kategorije_list_create,
     transakcije_list_create,
     ciljevi_list_create,
     transakcije_export_csv,
+    transakcije_import,
+    transakcije_batch,
     logout_view,
     racuni_list_create,
+    racun_povijest,
     budzeti_list_create,
     ponavljajuce_transakcije_list_create,
     process_recurring_transactions,
     budget_analysis,
+    budget_analysis_async,
+    analytics,
+    cash_flow_forecast,
+    widget_data,
+    metrics,
 )
 
 urlpatterns = [
@@ -21,14 +31,22 @@ urlpatterns = [
     path("register/", register, name="register"),
     path("login/", MyLoginView.as_view(), name="login"),
     path("logout/", logout_view, name="logout"), 
-    path("", dashboard, name="dashboard"),
+    # pod ASGI poslužiteljem pregled i analiza računaju upite istovremeno
+    path("", dashboard_async if settings.ASYNC_VIEWS else dashboard, name="dashboard"),
     path("kategorije/", kategorije_list_create, name="kategorije"),
     path("transakcije/", transakcije_list_create, name="transakcije"),
     path("transakcije/export/", transakcije_export_csv, name="transakcije_export"),
+    path("transakcije/import/", transakcije_import, name="transakcije_import"),
     path("racuni/", racuni_list_create, name="racuni"),
+    path("racuni/<int:pk>/povijest/", racun_povijest, name="racun_povijest"),
     path("budzeti/", budzeti_list_create, name="budzeti"),
     path("ponavljajuce/", ponavljajuce_transakcije_list_create, name="ponavljajuce"),
     path("ponavljajuce/process/", process_recurring_transactions, name="process_recurring"),
     path("ciljevi/", ciljevi_list_create, name="ciljevi"),
-    path("analiza/", budget_analysis, name="budget_analysis"),
+    path("analiza/", budget_analysis_async if settings.ASYNC_VIEWS else budget_analysis, name="budget_analysis"),
+    path("analitika/", analytics, name="analitika"),
+    path("prognoza/", cash_flow_forecast, name="prognoza"),
+    path("api/widgeti/<slug:widget>/", widget_data, name="widget_data"),
+    path("api/transakcije/", transakcije_batch, name="transakcije_batch"),
+    path("metrics/", metrics, name="metrics"),
 ]
@@ -1,36 +1,123 @@
 from django.contrib import admin
-from .models import Kategorija, Transakcija, CiljStednje, Racun, Budzet, PonavljajucaTransakcija
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from .models import Kategorija, Transakcija, CiljStednje, Racun, Budzet, PonavljajucaTransakcija, Posao
+
+
+def estimated_count(model, using):
+    """Procjena broja redaka tablice iz statistike baze, ili None ako je nema.
+
+    PostgreSQL je drži u pg_class (VACUUM/ANALYZE), SQLite u sqlite_stat1
+    nakon ANALYZE. Obje su O(1), za razliku od COUNT(*) koji čita cijelu tablicu.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                           [connection.ops.quote_name(table)])
+        elif connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            except DatabaseError:
+                # ANALYZE još nije pokrenut pa tablica statistike ne postoji
+                return None
+        else:
+            return None
+        rows = cursor.fetchall()
+    # SQLite ima redak po indeksu, a prvi broj je broj redaka u indeksu;
+    # djelomični indeksi (npr. transakcija_jedno_ponavljanje) broje samo dio
+    # tablice, pa vrijedi najveći
+    counts = [int(str(row[0]).split()[0]) for row in rows if row[0] is not None]
+    return max(counts) if counts else None
+
+
+class ApproximateCountPaginator(Paginator):
+    """Bez filtera broj redaka uzima iz statistike baze kad je tablica velika.
+
+    Broj je približan (vrijedi od zadnjeg ANALYZE), pa zadnje stranice mogu
+    biti prazne. S filterom ili pretragom broji točno, preko indeksa.
+    """
+    threshold = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            procjena = estimated_count(qs.model, qs.db)
+            if procjena is not None and procjena >= self.threshold:
+                return procjena
+        return super().count
+
 
 @admin.register(Kategorija)
 class KategorijaAdmin(admin.ModelAdmin):
     list_display = ("naziv", "tip", "korisnik")
     list_filter = ("tip",)
-    search_fields = ("naziv",)
+    list_select_related = ("korisnik",)
+    # korisničko ime razlikuje istoimene kategorije u autocomplete pretrazi
+    search_fields = ("naziv", "korisnik__username")
+    autocomplete_fields = ("korisnik",)
 
 @admin.register(Transakcija)
 class TransakcijaAdmin(admin.ModelAdmin):
     list_display = ("datum", "kategorija", "racun", "iznos", "korisnik", "doprinos_cilju")
-    list_filter = ("kategorija__tip", "kategorija", "racun")
+    # filteri po kategoriji i računu nabrajali bi retke svih korisnika;
+    # ?kategorija__id__exact= i ?racun__id__exact= i dalje rade
+    list_filter = ("kategorija__tip",)
+    list_select_related = ("kategorija", "racun", "korisnik", "doprinos_cilju")
     search_fields = ("opis",)
+    date_hierarchy = "datum"
+    autocomplete_fields = ("korisnik", "kategorija", "racun", "doprinos_cilju")
+    raw_id_fields = ("ponavljajuca",)
+    paginator = ApproximateCountPaginator
+    # bez drugog COUNT(*) cijele tablice uz filtrirani popis
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # FTS indeks umjesto LIKE '%…%' prolaza kroz cijelu tablicu
+        return queryset.search(search_term), False
 
 @admin.register(CiljStednje)
 class CiljStednjeAdmin(admin.ModelAdmin):
     list_display = ("naziv", "korisnik", "cilj_iznos", "trenutno_stanje")
+    list_select_related = ("korisnik",)
+    search_fields = ("naziv", "korisnik__username")
+    date_hierarchy = "datum_pocetka"
+    autocomplete_fields = ("korisnik",)
 
 @admin.register(Racun)
 class RacunAdmin(admin.ModelAdmin):
     list_display = ("naziv", "tip", "korisnik", "trenutno_stanje", "aktivno")
     list_filter = ("tip", "aktivno")
-    search_fields = ("naziv",)
+    list_select_related = ("korisnik",)
+    search_fields = ("naziv", "korisnik__username")
+    date_hierarchy = "datum_kreiranja"
+    autocomplete_fields = ("korisnik",)
 
 @admin.register(Budzet)
 class BudzetAdmin(admin.ModelAdmin):
     list_display = ("kategorija", "period", "godina", "mjesec", "iznos", "korisnik", "aktivno")
     list_filter = ("period", "godina", "mjesec", "aktivno")
+    list_select_related = ("kategorija", "korisnik")
     search_fields = ("kategorija__naziv",)
+    date_hierarchy = "datum_kreiranja"
+    autocomplete_fields = ("korisnik", "kategorija")
 
 @admin.register(PonavljajucaTransakcija)
 class PonavljajucaTransakcijaAdmin(admin.ModelAdmin):
     list_display = ("opis", "kategorija", "iznos", "frekvencija", "sljedeci_datum", "korisnik", "aktivno")
     list_filter = ("frekvencija", "aktivno")
+    list_select_related = ("kategorija", "korisnik")
     search_fields = ("opis",)
+    date_hierarchy = "sljedeci_datum"
+    autocomplete_fields = ("korisnik", "kategorija", "doprinos_cilju")
+
+@admin.register(Posao)
+class PosaoAdmin(admin.ModelAdmin):
+    list_display = ("vrsta", "objekt_id", "korisnik", "od_datuma", "broj", "pokusaji", "zakazano", "greska")
+    list_filter = ("vrsta",)
+    list_select_related = ("korisnik",)
+    date_hierarchy = "zakazano"
+    autocomplete_fields = ("korisnik",)
@@ -0,0 +1,211 @@
+"""Dugoročna analiza potrošnje nad NumPy nizovima.
+
+Povijest transakcija korisnika učitava se jednim upitom u zbijene nizove
+(dan, iznos u centima, kategorija, račun) pa se trendovi, pomični prosjeci,
+percentili i usporedbe s prošlom godinom računaju vektorski, bez Decimal i
+float pretvorbi po retku. U float (eure) se pretvara tek rezultat.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+from .caching import DATA, get_version
+from .models import Kategorija, Transakcija
+
+YEARS = 10
+WINDOWS = (3, 6, 12)
+# percentili mjesečnih iznosa po kategoriji i pojedinačnih troškova
+PERCENTILES = (50, 90)
+TRANSACTION_PERCENTILES = (25, 50, 75, 90, 99)
+
+
+@dataclass
+class History:
+    # dani od 1970-01-01 (datetime64[D] kao int32)
+    dan: np.ndarray
+    # iznos u centima, pozitivan za prihode, negativan za troškove
+    centi: np.ndarray
+    # indeks u ``kategorije`` (ne id)
+    kategorija: np.ndarray
+    # id računa, 0 za transakcije bez računa
+    racun: np.ndarray
+    # (id, naziv, tip) kategorija korisnika
+    kategorije: list
+
+    def __len__(self):
+        return len(self.dan)
+
+
+def load_history(user, od=None, do=None):
+    """Transakcije korisnika (opcionalno od/do datuma) kao History"""
+    kategorije = list(Kategorija.objects.filter(korisnik=user).order_by("pk").values_list("pk", "naziv", "tip"))
+    qs = Transakcija.objects.filter(korisnik=user).order_by()
+    if od is not None:
+        qs = qs.filter(datum__gte=od)
+    if do is not None:
+        qs = qs.filter(datum__lte=do)
+    # centi se računaju u bazi, pa se Decimal ne stvara za svaki redak
+    rows = list(qs.annotate(centi=Cast(Round(F("iznos") * 100), IntegerField()))
+                .values_list("datum", "centi", "kategorija_id", "racun_id"))
+
+    ids = np.array([k[0] for k in kategorije], dtype=np.int64)
+    prihod = np.array([k[2] == "PRIHOD" for k in kategorije], dtype=bool)
+    if not rows:
+        prazno = np.empty(0, dtype=np.int32)
+        return History(prazno, np.empty(0, dtype=np.int64), prazno, prazno, kategorije)
+
+    datumi, centi, kategorija_ids, racuni = zip(*rows)
+    kategorija = np.searchsorted(ids, np.array(kategorija_ids, dtype=np.int64)).astype(np.int32)
+    centi = np.array(centi, dtype=np.int64)
+    return History(
+        dan=np.array(datumi, dtype="datetime64[D]").astype(np.int32),
+        centi=np.where(prihod[kategorija], centi, -centi),
+        kategorija=kategorija,
+        racun=np.array([r or 0 for r in racuni], dtype=np.int32),
+        kategorije=kategorije,
+    )
+
+
+def month_index(dan):
+    """Redni broj mjeseca od 1970-01 za niz dana"""
+    return dan.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def category_months(history, prvi, broj):
+    """Matrica (kategorija x mjesec) zbrojeva u centima za ``broj`` mjeseci od ``prvi``"""
+    mjesec = month_index(history.dan) - prvi
+    sel = (mjesec >= 0) & (mjesec < broj)
+    k = len(history.kategorije)
+    # int64 zbroj; bincount s težinama bi prešao u float64
+    matrica = np.zeros(k * broj, dtype=np.int64)
+    np.add.at(matrica, history.kategorija[sel].astype(np.int64) * broj + mjesec[sel], history.centi[sel])
+    return matrica.reshape(k, broj)
+
+
+def rolling_mean(values, window):
+    """Pomični prosjek zadnjih ``window`` vrijednosti po zadnjoj osi; NaN dok prozor nije pun"""
+    values = np.asarray(values, dtype=np.float64)
+    cs = np.cumsum(values, axis=-1)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        out[..., window - 1:] = cs[..., window - 1:]
+        out[..., window:] -= cs[..., :-window]
+        out[..., window - 1:] /= window
+    return out
+
+
+def trend_slope(values):
+    """Nagib pravca najmanjih kvadrata po zadnjoj osi (promjena po mjesecu)"""
+    n = values.shape[-1]
+    x = np.arange(n) - (n - 1) / 2
+    return values @ x / (x @ x) if n > 1 else np.zeros(values.shape[:-1])
+
+
+def _month_label(m):
+    return _month_start(m).strftime("%m.%Y")
+
+
+def _month_start(m):
+    godina, mjesec = divmod(int(m), 12)
+    return date(godina + 1970, mjesec + 1, 1)
+
+
+def _eur(values):
+    """Centi u eure zaokružene na 2 decimale; NaN postaje None (JSON)"""
+    values = np.round(np.asarray(values, dtype=np.float64) / 100, 2)
+    eur = [None if np.isnan(v) else float(v) for v in values.ravel()]
+    return eur if values.ndim else eur[0]
+
+
+def _pct(value):
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+def month_range(today, years):
+    """Prvi i zadnji mjesec (od 1970-01) analize zadnjih ``years`` godina"""
+    zadnji = (today.year - 1970) * 12 + today.month - 1
+    return zadnji - years * 12 + 1, zadnji
+
+
+def analyze(history, today, years=YEARS):
+    """Trendovi i statistike zadnjih ``years`` godina (do tekućeg mjeseca).
+
+    Vraća rječnik spreman za predložak i JSON: mjesečni prihodi, troškovi i
+    pomični prosjeci troškova, promjena troškova u odnosu na isti mjesec
+    prošle godine te po kategoriji zbroj zadnjih 12 mjeseci, promjena u
+    odnosu na prethodnih 12, trend, pomični prosjeci i percentili mjesečnih
+    iznosa.
+    """
+    prvi, zadnji = month_range(today, years)
+    if len(history):
+        prvi = max(prvi, int(month_index(history.dan).min()))
+    broj = zadnji - prvi + 1
+    matrica = category_months(history, prvi, broj)
+    prihod = np.array([k[2] == "PRIHOD" for k in history.kategorije], dtype=bool)
+
+    prihodi = matrica[prihod].sum(axis=0)
+    # troškovi kao pozitivni iznosi
+    troskovi = -matrica[~prihod].sum(axis=0)
+    prosli = np.full(broj, np.nan)
+    prosli[12:] = troskovi[:-12]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoy = np.where(prosli > 0, (troskovi - prosli) / prosli * 100, np.nan)
+
+    # po kategoriji, troškovi pozitivni; zadnjih 12 mjeseci prema prethodnih 12
+    iznosi = np.abs(matrica)
+    zadnjih12 = iznosi[:, -12:].sum(axis=1)
+    prethodnih12 = iznosi[:, -24:-12].sum(axis=1) if broj > 12 else np.zeros(len(iznosi), dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        promjena = np.where(prethodnih12 > 0, (zadnjih12 - prethodnih12) / prethodnih12 * 100, np.nan)
+    nagib = trend_slope(iznosi[:, -12:].astype(np.float64))
+    prosjeci = {w: rolling_mean(iznosi, w)[:, -1] for w in WINDOWS}
+    percentili = np.percentile(iznosi, PERCENTILES, axis=1) if broj else np.zeros((len(PERCENTILES), len(iznosi)))
+
+    kategorije = []
+    for i in np.argsort(-zadnjih12, kind="stable"):
+        if not iznosi[i].any():
+            continue
+        _, naziv, tip = history.kategorije[i]
+        kategorije.append({
+            "naziv": naziv,
+            "tip": tip,
+            "zadnjih12": _eur(zadnjih12[i]),
+            "prethodnih12": _eur(prethodnih12[i]),
+            "promjena": _pct(promjena[i]),
+            "trend": _eur(nagib[i]),
+            # redom kao WINDOWS i PERCENTILES
+            "prosjeci": _eur([prosjeci[w][i] for w in WINDOWS]),
+            "percentili": _eur(percentili[:, i]),
+        })
+
+    iznosi_troskova = -history.centi[history.centi < 0]
+    return {
+        "mjeseci": [_month_label(m) for m in range(prvi, zadnji + 1)],
+        "prihodi": _eur(prihodi),
+        "troskovi": _eur(troskovi),
+        "prosjeci": [{"prozor": w, "vrijednosti": _eur(rolling_mean(troskovi, w))} for w in WINDOWS],
+        "promjena_godisnje": [_pct(v) for v in yoy],
+        "kategorije": kategorije,
+        "transakcije": len(history),
+        "percentili_transakcija": list(zip(
+            TRANSACTION_PERCENTILES,
+            _eur(np.percentile(iznosi_troskova, TRANSACTION_PERCENTILES))
+            if len(iznosi_troskova) else [None] * len(TRANSACTION_PERCENTILES),
+        )),
+    }
+
+
+def cached_analytics(user, today, years=YEARS):
+    """analyze() za zadnjih ``years`` godina, spremljen dok se podaci korisnika ne promijene"""
+    key = f"analitika:{user.pk}:{get_version(DATA, user.pk)}:{today.isoformat()}:{years}"
+    data = cache.get(key)
+    if data is None:
+        od = _month_start(month_range(today, years)[0])
+        data = analyze(load_history(user, od=od, do=today), today, years)
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
@@ -7,3 +7,5 @@ class CoreConfig(AppConfig):
     def ready(self):
         # registriraj signale
         import core.signals  # noqa
+        # mjerenje upita na svakoj novoj vezi prema bazi (core.middleware)
+        import core.instrumentation  # noqa
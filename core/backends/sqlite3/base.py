@@ -0,0 +1,100 @@
+"""SQLite backend s PRAGMA postavkama po vezi i BEGIN IMMEDIATE.
+
+Podržava OPTIONS ``init_command`` (naredbe odvojene s ``;``, izvršavaju se
+na svakoj novoj vezi) i ``transaction_mode`` (DEFERRED, IMMEDIATE ili
+EXCLUSIVE za atomic blokove), isto kao ugrađeni backend od Djanga 5.1.
+Kad se projekt prebaci na 5.1, ENGINE se vraća na django.db.backends.sqlite3
+bez promjene OPTIONS (osim reda čekanja pisaca ispod).
+
+Sa zadanim DEFERRED transakcija koja prvo čita pa piše (spremanje transakcije
+čita staro stanje pa mijenja stanja računa i sažetke) ne može čekati na
+zaključavanje: SQLite odmah javlja "database is locked" ako je drugi pisac
+već počeo. IMMEDIATE uzima zaključavanje za pisanje na početku pa pisci
+čekaju jedan drugoga (busy_timeout) umjesto da padnu.
+
+SQLite pisce koji čekaju budi redom kojim pokušavaju, uz sve dulje pauze,
+pa pod opterećenjem poneki čeka sekundama. Zato dretve istog procesa prije
+BEGIN IMMEDIATE čekaju na zajedničkom zaključavanju po datoteci baze, a
+busy_timeout ostaje samo za pisce iz drugih procesa.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    """Zaključavanje pisaca istog procesa za datoteku baze ``name``"""
+    with _write_locks_guard:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # postavlja get_connection_params() pri spajanju
+    init_commands = ()
+    transaction_mode = None
+    busy_timeout = 5.0
+    _held_write_lock = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_commands = [c.strip() for c in params.pop("init_command", "").split(";") if c.strip()]
+        mode = params.pop("transaction_mode", None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode mora biti jedan od {', '.join(TRANSACTION_MODES)}")
+        self.transaction_mode = mode and mode.upper()
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            conn.execute(command)
+        # isto čekanje za red pisaca u procesu kao za zaključavanje baze
+        self.busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0] / 1000
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute("BEGIN")
+            return
+        lock = None
+        if self.transaction_mode != "DEFERRED" and not self.is_in_memory_db():
+            lock = write_lock(self.settings_dict["NAME"])
+            if not lock.acquire(timeout=self.busy_timeout):
+                raise OperationalError("database is locked")
+        try:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
+        except BaseException:
+            if lock is not None:
+                lock.release()
+            raise
+        self._held_write_lock = lock
+
+    def _release_write_lock(self):
+        lock, self._held_write_lock = self._held_write_lock, None
+        if lock is not None:
+            lock.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write_lock()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write_lock()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write_lock()
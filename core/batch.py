@@ -0,0 +1,134 @@
+"""Skupni unos i izmjena transakcija iz JSON-a (API za mobilne i skriptne klijente).
+
+Stavke se provjeravaju poljima obrasca bez upita po stavci: kategorije,
+računi i ciljevi korisnika dohvaćaju se jednim upitom po modelu za sve
+stavke, a transakcije koje se mijenjaju jednim upitom po id-evima. Ako
+ijedna stavka nije ispravna, ništa se ne sprema. Inače se nove transakcije
+spremaju s bulk_create, izmjene s bulk_update, sve u jednoj transakciji
+baze, a stanja računa, ciljeva i sažetaka usklađuju se jednom po
+pogođenom retku (TransactionEffects).
+"""
+from decimal import Decimal
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+from .models import CiljStednje, Kategorija, Racun, Transakcija, TransactionEffects
+
+MAX_ITEMS = 5000
+
+FIELDS = {
+    "kategorija": forms.IntegerField(),
+    "racun": forms.IntegerField(required=False),
+    "doprinos_cilju": forms.IntegerField(required=False),
+    "iznos": forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal("0.01")),
+    "datum": forms.DateField(input_formats=["%Y-%m-%d"]),
+    "opis": forms.CharField(max_length=255, required=False),
+}
+# veze na objekte korisnika: polje -> (model, samo aktivni)
+RELATIONS = {
+    "kategorija": (Kategorija, False),
+    "racun": (Racun, True),
+    "doprinos_cilju": (CiljStednje, False),
+}
+
+
+class BatchError(ValueError):
+    """Zahtjev u cjelini nije ispravan (nije popis, previše stavki)"""
+
+
+class TransactionBatch:
+    def __init__(self, user):
+        self.user = user
+        self.errors = {}
+
+    def run(self, items):
+        """Sprema stavke ili ništa; vraća (id-evi novih, broj izmijenjenih).
+
+        Nakon neuspjele provjere vraća None, a greške su u ``errors``
+        ({indeks stavke: {polje: [poruke]}}).
+        """
+        if not isinstance(items, list):
+            raise BatchError("Očekuje se popis transakcija")
+        if len(items) > MAX_ITEMS:
+            raise BatchError(f"Najviše {MAX_ITEMS} transakcija po zahtjevu")
+        cleaned = [self.clean(i, item) for i, item in enumerate(items)]
+        if self.errors:
+            return None
+        postojece = self.load_existing(cleaned)
+        objekti = self.load_related(cleaned)
+        nove, izmjene = [], []
+        for i, podaci in enumerate(cleaned):
+            pk = podaci.pop("id", None)
+            obj = Transakcija(korisnik=self.user) if pk is None else postojece.get(pk)
+            if obj is None:
+                self.add_error(i, "id", "Transakcija ne postoji")
+                continue
+            self.assign(i, obj, podaci, objekti)
+            (nove if pk is None else izmjene).append(obj)
+        if self.errors:
+            return None
+        with TransactionEffects.deferred():
+            Transakcija.objects.bulk_create_with_effects(nove)
+            Transakcija.objects.bulk_update_with_effects(izmjene, list(FIELDS))
+        return [t.pk for t in nove], len(izmjene)
+
+    def add_error(self, i, field, message):
+        self.errors.setdefault(i, {}).setdefault(field, []).append(message)
+
+    def clean(self, i, item):
+        """Provjerava oblik stavke; kod izmjene su obavezna samo navedena polja"""
+        if not isinstance(item, dict):
+            self.add_error(i, "__all__", "Stavka mora biti objekt")
+            return {}
+        podaci = {}
+        if "id" in item:
+            try:
+                podaci["id"] = forms.IntegerField().clean(item["id"])
+            except ValidationError as e:
+                for poruka in e.messages:
+                    self.add_error(i, "id", poruka)
+        nepoznata = set(item) - set(FIELDS) - {"id"}
+        if nepoznata:
+            self.add_error(i, "__all__", f"Nepoznata polja: {', '.join(sorted(nepoznata))}")
+        for name, field in FIELDS.items():
+            if name not in item and "id" in item:
+                continue
+            try:
+                podaci[name] = field.clean(item.get(name))
+            except ValidationError as e:
+                for poruka in e.messages:
+                    self.add_error(i, name, poruka)
+        return podaci
+
+    def load_existing(self, cleaned):
+        ids = [podaci["id"] for podaci in cleaned if "id" in podaci]
+        if len(ids) != len(set(ids)):
+            raise BatchError("Ista transakcija je navedena više puta")
+        if not ids:
+            return {}
+        # in_bulk dijeli velike popise id-eva prema ograničenju parametara baze
+        return Transakcija.objects.filter(korisnik=self.user).select_related("kategorija").in_bulk(ids)
+
+    def load_related(self, cleaned):
+        """Objekti korisnika na koje stavke upućuju, jedan upit po modelu"""
+        objekti = {}
+        for name, (model, aktivni) in RELATIONS.items():
+            ids = {podaci[name] for podaci in cleaned if podaci.get(name) is not None}
+            qs = model.objects.filter(korisnik=self.user)
+            if aktivni:
+                qs = qs.filter(aktivno=True)
+            objekti[name] = qs.in_bulk(ids) if ids else {}
+        return objekti
+
+    def assign(self, i, obj, podaci, objekti):
+        for name, value in podaci.items():
+            if name not in RELATIONS:
+                setattr(obj, name, value)
+            elif value is None:
+                setattr(obj, name, None)
+            elif value in objekti[name]:
+                # učitana kategorija daje tip za knjiženje bez dodatnog upita
+                setattr(obj, name, objekti[name][value])
+            else:
+                self.add_error(i, name, "Ne postoji")
@@ -0,0 +1,46 @@
+"""Verzije podataka po korisniku i brojači pogodaka cachea.
+
+Spremljeni rezultati imaju verziju korisnika u ključu, pa ih poništava
+jednostavno podizanje verzije (bump_versions). Verzija je vremenska oznaka
+promjene (ns), tako da ni izbačen ključ ne vraća stariju verziju, a služi i
+kao vrijeme zadnje promjene podataka korisnika.
+"""
+import time
+
+from django.core.cache import cache
+
+# sve što utječe na pregled (transakcije, budžeti, računi, ciljevi, pravila)
+DATA = "podaci"
+# samo ponavljajuća pravila (prognoza)
+RULES = "prognoza"
+
+COUNTER_PREFIX = "brojac:"
+
+
+def _version_key(namespace, user_id):
+    return f"verzija:{namespace}:{user_id}"
+
+
+def get_version(namespace, user_id):
+    return cache.get_or_set(_version_key(namespace, user_id), time.time_ns, None)
+
+
+def bump_versions(namespace, user_ids):
+    """Poništava sve spremljene rezultate iz ``namespace`` za navedene korisnike"""
+    now = time.time_ns()
+    cache.set_many({_version_key(namespace, user_id): now for user_id in set(user_ids)}, None)
+
+
+def count(name):
+    """Povećava brojač (npr. dashboard_hit); brojači se čitaju s counters()"""
+    key = COUNTER_PREFIX + name
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def counters(names):
+    values = cache.get_many([COUNTER_PREFIX + name for name in names])
+    return {name: values.get(COUNTER_PREFIX + name, 0) for name in names}
@@ -0,0 +1,195 @@
+"""Generator sintetičkih podataka za testiranje opterećenja (create_demo_data --scale).
+
+Svaki korisnik dobiva vlastiti random.Random izveden iz seeda i rednog broja,
+pa isti seed uvijek daje iste podatke, bez obzira na broj procesa i
+redoslijed kojim ih procesi obrađuju. Sve se sprema s bulk_create, a
+transakcije s bulk_create_with_effects u komadima od chunk_size redaka.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Budzet, CiljStednje, Kategorija, PonavljajucaTransakcija, Racun, Transakcija
+
+DEMO_PASSWORD = "demo123"
+
+# naziv, tip, (min, max) iznos, relativna učestalost, opisi
+KATEGORIJE = (
+    ("Hrana", "TROSAK", (5, 150), 40, ("Kupovina u trgovini", "Restoran", "Dostava hrane", "Kava", "Pekara")),
+    ("Transport", "TROSAK", (2, 100), 20, ("Benzin", "Javni prijevoz", "Taksi", "Parking")),
+    ("Režije", "TROSAK", (30, 250), 5, ("Struja", "Voda", "Internet", "Mobitel")),
+    ("Zabava", "TROSAK", (10, 200), 10, ("Kino", "Koncert", "Izlazak", "Video igre")),
+    ("Zdravlje", "TROSAK", (10, 300), 4, ("Liječnik", "Lijekovi", "Terapija", "Pregled")),
+    ("Obrazovanje", "TROSAK", (20, 500), 2, ("Knjige", "Tečaj", "Seminar", "Materijali")),
+    ("Odjeća", "TROSAK", (15, 300), 5, ("Odjeća", "Obuća", "Sportska oprema")),
+    ("Stanovanje", "TROSAK", (300, 900), 0, ("Najam",)),
+    ("Plaća", "PRIHOD", (1200, 4000), 0, ("Plaća",)),
+    ("Freelance", "PRIHOD", (100, 2000), 2, ("Projekt", "Konzultacije", "Honorar")),
+    ("Investicije", "PRIHOD", (5, 500), 1, ("Dividenda", "Kamate")),
+)
+RACUNI = (
+    ("Tekući račun", "BANKA", (500, 5000)),
+    ("Gotovina", "GOTOVINA", (20, 500)),
+    ("Kreditna kartica", "KREDITNA", (-2000, 0)),
+    ("Štednja", "STEDNJA", (1000, 20000)),
+)
+RASPONI = {naziv: raspon for naziv, _, raspon, *_ in KATEGORIJE}
+CILJEVI = (("Ljetovanje", 3000), ("Novi laptop", 2000), ("Hitni fond", 5000), ("Auto", 15000))
+
+
+@dataclass
+class ScaleResult:
+    users: int = 0
+    transactions: int = 0
+    other: int = 0
+
+    def __iadd__(self, other):
+        self.users += other.users
+        self.transactions += other.transactions
+        self.other += other.other
+        return self
+
+
+def amount(rng, low, high):
+    """Iznosi su nagnuti prema donjoj granici (puno malih, malo velikih)"""
+    return Decimal(low + (high - low) * rng.random() ** 2).quantize(Decimal("0.01"))
+
+
+class DemoGenerator:
+    def __init__(self, seed=0, transactions=1000, months=24, chunk_size=5000, prefix="demo", today=None):
+        self.seed = seed
+        self.transactions = transactions
+        self.months = months
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.today = today or timezone.localdate()
+        self.password = make_password(DEMO_PASSWORD)
+        self.weights = [k[3] for k in KATEGORIJE]
+
+    def rng(self, index):
+        return random.Random(self.seed * 1_000_003 + index)
+
+    def run(self, start, count):
+        """Kreira korisnike s rednim brojevima [start, start + count)"""
+        result = ScaleResult()
+        # dovoljno korisnika u jednoj grupi da transakcije popune jedan komad
+        group = max(1, self.chunk_size // max(1, self.transactions))
+        for first in range(start, start + count, group):
+            result += self.run_group(range(first, min(first + group, start + count)))
+        return result
+
+    def run_group(self, indices):
+        result = ScaleResult()
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f"{self.prefix}{i:07d}", email=f"{self.prefix}{i:07d}@example.com",
+                     password=self.password)
+                for i in indices
+            ])
+            result.users = len(users)
+            setup = [self.build_setup(user, self.rng(i)) for user, i in zip(users, indices)]
+            # redoslijed prati strane ključeve; bulk_create preuzima pk spremljenih objekata
+            for model, field in ((Kategorija, "kategorije"), (Racun, "racuni"), (CiljStednje, "ciljevi"),
+                                 (Budzet, "budzeti"), (PonavljajucaTransakcija, "pravila")):
+                objs = [obj for s in setup for obj in s[field]]
+                model.objects.bulk_create(objs)
+                result.other += len(objs)
+
+            batch = []
+            for s in setup:
+                for t in s["transakcije"]:
+                    batch.append(t)
+                    if len(batch) >= self.chunk_size:
+                        result.transactions += len(Transakcija.objects.bulk_create_with_effects(batch, self.chunk_size))
+                        batch = []
+            result.transactions += len(Transakcija.objects.bulk_create_with_effects(batch, self.chunk_size))
+        return result
+
+    def build_setup(self, user, rng):
+        today = self.today
+        kategorije = {naziv: Kategorija(korisnik=user, naziv=naziv, tip=tip) for naziv, tip, *_ in KATEGORIJE}
+        racuni = []
+        for naziv, tip, (low, high) in RACUNI[:rng.randint(2, len(RACUNI))]:
+            stanje = amount(rng, low, high)
+            racuni.append(Racun(korisnik=user, naziv=naziv, tip=tip, pocetno_stanje=stanje, trenutno_stanje=stanje))
+        ciljevi = [
+            CiljStednje(korisnik=user, naziv=naziv, cilj_iznos=iznos,
+                        datum_pocetka=today - timedelta(days=rng.randint(30, 30 * self.months)),
+                        datum_kraja=today + timedelta(days=rng.randint(30, 730)))
+            for naziv, iznos in rng.sample(CILJEVI, rng.randint(0, 2))
+        ]
+
+        budzeti = []
+        for naziv, tip, (low, high), tezina, _ in KATEGORIJE:
+            if tip != "TROSAK" or not tezina:
+                continue
+            mjesecno = Decimal(round((low + high) / 2 * tezina / 4 * (0.5 + rng.random())))
+            budzeti.append(Budzet(korisnik=user, kategorija=kategorije[naziv], iznos=mjesecno,
+                                  godina=today.year, mjesec=today.month))
+            budzeti.append(Budzet(korisnik=user, kategorija=kategorije[naziv], iznos=mjesecno * 12,
+                                  period="GODINA", godina=today.year))
+
+        placa = amount(rng, *RASPONI["Plaća"])
+        najam = amount(rng, *RASPONI["Stanovanje"])
+        dan_place = rng.randint(1, 28)
+        pocetak = today.replace(day=dan_place)
+        sljedeci = pocetak if pocetak > today else (pocetak.replace(day=1) + timedelta(days=32)).replace(day=dan_place)
+        pravila = [
+            PonavljajucaTransakcija(korisnik=user, kategorija=kategorije["Plaća"], iznos=placa, opis="Plaća",
+                                    frekvencija="MJESECNO", datum_pocetka=pocetak, sljedeci_datum=sljedeci),
+            PonavljajucaTransakcija(korisnik=user, kategorija=kategorije["Stanovanje"], iznos=najam, opis="Najam",
+                                    frekvencija="MJESECNO", datum_pocetka=pocetak, sljedeci_datum=sljedeci),
+            PonavljajucaTransakcija(korisnik=user, kategorija=kategorije["Hrana"], iznos=amount(rng, 30, 120),
+                                    opis="Tjedna kupovina", frekvencija="TJEDNO", datum_pocetka=today,
+                                    sljedeci_datum=today + timedelta(days=rng.randint(1, 7))),
+        ]
+        for cilj in ciljevi[:1]:
+            pravila.append(PonavljajucaTransakcija(
+                korisnik=user, kategorija=kategorije["Plaća"], iznos=amount(rng, 50, 300),
+                opis=f"Štednja: {cilj.naziv}", frekvencija="MJESECNO", datum_pocetka=pocetak,
+                sljedeci_datum=sljedeci, doprinos_cilju=cilj,
+            ))
+
+        return {
+            "kategorije": list(kategorije.values()), "racuni": racuni, "ciljevi": ciljevi,
+            "budzeti": budzeti, "pravila": pravila,
+            "transakcije": self.build_transactions(user, rng, kategorije, racuni, ciljevi, placa, najam, dan_place),
+        }
+
+    def build_transactions(self, user, rng, kategorije, racuni, ciljevi, placa, najam, dan_place):
+        """Plaća i najam svaki mjesec, ostatak nasumični troškovi i prihodi"""
+        n = self.transactions
+        mjesec = self.today.replace(day=1)
+        for _ in range(self.months):
+            if n < 2:
+                break
+            for kategorija, iznos, datum in ((kategorije["Plaća"], placa, mjesec.replace(day=dan_place)),
+                                             (kategorije["Stanovanje"], najam, mjesec)):
+                if datum <= self.today:
+                    yield Transakcija(korisnik=user, kategorija=kategorija, racun=racuni[0], iznos=iznos,
+                                      datum=datum, opis=kategorija.naziv if kategorija.tip == "PRIHOD" else "Najam")
+                    n -= 1
+            mjesec = (mjesec - timedelta(days=1)).replace(day=1)
+
+        dani = 30 * self.months
+        for naziv, tip, (low, high), _, opisi in rng.choices(KATEGORIJE, weights=self.weights, k=max(0, n)):
+            yield Transakcija(
+                korisnik=user,
+                kategorija=kategorije[naziv],
+                racun=rng.choice(racuni) if rng.random() < 0.9 else None,
+                doprinos_cilju=rng.choice(ciljevi) if ciljevi and tip == "PRIHOD" and rng.random() < 0.3 else None,
+                iznos=amount(rng, low, high),
+                datum=self.today - timedelta(days=rng.randint(0, dani)),
+                opis=rng.choice(opisi),
+            )
+
+
+def generate(start, count, options):
+    """Ulazna točka za radni proces (mora biti funkcija na razini modula)"""
+    return DemoGenerator(**options).run(start, count)
@@ -0,0 +1,147 @@
+"""Prognoza stanja iz ponavljajućih transakcija.
+
+Pravila se ne razvijaju korak po korak (calculate_next_date), nego se za sve
+korisnike odjednom računaju nizovi datuma (NumPy), zbrajaju po danu i
+akumuliraju kumulativnom sumom. Iznosi se drže u centima (int64). Koraci i
+svođenje na kraj mjeseca dolaze iz models.step_date, pa prognoza daje iste
+datume kao process_due.
+"""
+from datetime import date, timedelta
+import calendar
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .caching import RULES, get_version
+from .models import DAY_STEPS, MONTH_STEPS, PonavljajucaTransakcija, Racun, step_date
+
+# date.toordinal() za 1970-01-01, pomak između NumPy dana i Python ordinala
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MAX_MONTHS = 60
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def horizon_end(today, months):
+    """Zadnji dan prognoze: isti dan ``months`` mjeseci kasnije (ili kraj mjeseca)"""
+    godina, mjesec = divmod(today.year * 12 + today.month - 1 + months, 12)
+    zadnji_dan = calendar.monthrange(godina, mjesec + 1)[1]
+    return date(godina, mjesec + 1, min(today.day, zadnji_dan))
+
+
+def _ranges(counts):
+    """Za counts=[2, 3] vraća (rule=[0, 0, 1, 1, 1], k=[0, 1, 0, 1, 2])"""
+    rule = np.repeat(np.arange(len(counts)), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return rule, np.arange(counts.sum()) - starts
+
+
+def _expand_daily(first, last, step):
+    counts = np.where(last >= first, (last - first) // step + 1, 0)
+    rule, k = _ranges(counts)
+    return rule, first[rule] + k * step[rule]
+
+
+def _months(ordinals):
+    """Ordinali datuma u mjesece od 1970-01 (NumPy datetime64[M])"""
+    return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _expand_monthly(first, last, step, dan, second):
+    """Mjesečna, kvartalna i godišnja pravila.
+
+    Prvo ponavljanje je sljedeci_datum, drugo ``second`` (step_date, koji
+    kvartalna pravila vodi na prvi mjesec sljedećeg kvartala), a dalje se ide
+    korakom ``step`` mjeseci na dan ``dan``, u kraćim mjesecima zadnji dan,
+    kao što step_date radi za svaki sljedeći korak.
+    """
+    m1 = _months(second)
+    counts = np.where(last >= first, 1 + np.maximum(0, (_months(last) - m1) // step + 1), 0)
+    rule, k = _ranges(counts)
+    mjeseci = m1[rule] + np.maximum(k - 1, 0) * step[rule]
+    pocetak = mjeseci.astype("datetime64[M]").astype("datetime64[D]")
+    duljina = ((mjeseci + 1).astype("datetime64[M]").astype("datetime64[D]") - pocetak).astype(np.int64)
+    ordinals = np.where(k == 0, first[rule],
+                        (pocetak + np.minimum(dan[rule], duljina) - 1).astype(np.int64) + EPOCH_ORDINAL)
+    # zadnji mjesec može imati dan nakon kraja
+    mask = ordinals <= last[rule]
+    return rule[mask], ordinals[mask]
+
+
+def expand_rules(rules, end):
+    """Razvija pravila do ``end``; vraća (indeks pravila, ordinal datuma) nizove"""
+    first = np.array([r["sljedeci_datum"].toordinal() for r in rules], dtype=np.int64)
+    last = np.array([min(end, r["datum_kraja"] or end).toordinal() for r in rules], dtype=np.int64)
+    frekvencija = np.array([r["frekvencija"] for r in rules])
+
+    rule_idx = []
+    ordinals = []
+    for sel, expand in (
+        (np.isin(frekvencija, list(DAY_STEPS)), "daily"),
+        (np.isin(frekvencija, list(MONTH_STEPS)), "monthly"),
+    ):
+        idx = np.flatnonzero(sel)
+        if not len(idx):
+            continue
+        if expand == "daily":
+            step = np.array([DAY_STEPS[f] for f in frekvencija[idx]], dtype=np.int64)
+            rule, dates = _expand_daily(first[idx], last[idx], step)
+        else:
+            step = np.array([MONTH_STEPS[f] for f in frekvencija[idx]], dtype=np.int64)
+            dan = np.array([rules[i]["datum_pocetka"].day for i in idx], dtype=np.int64)
+            # drugo ponavljanje po pravilu, jedan poziv step_date po pravilu
+            second = np.array([step_date(rules[i]["sljedeci_datum"], rules[i]["frekvencija"], rules[i]["datum_pocetka"].day)
+                               .toordinal() for i in idx], dtype=np.int64)
+            rule, dates = _expand_monthly(first[idx], last[idx], step, dan, second)
+        rule_idx.append(idx[rule])
+        ordinals.append(dates)
+    if not rule_idx:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rule_idx), np.concatenate(ordinals)
+
+
+def forecast_deltas(user_ids, today, months):
+    """Kumulativne promjene stanja (u centima) po danu za više korisnika odjednom.
+
+    Vraća rječnik {korisnik_id: int64 niz duljine broja dana}; dospjela a
+    neobrađena ponavljanja pribrajaju se prvom danu.
+    """
+    end = horizon_end(today, months)
+    days = (end - today).days + 1
+    rules = list(PonavljajucaTransakcija.objects
+                 .filter(korisnik_id__in=user_ids, aktivno=True, sljedeci_datum__lte=end)
+                 .values("korisnik_id", "iznos", "frekvencija", "sljedeci_datum",
+                         "datum_pocetka", "datum_kraja", "kategorija__tip"))
+    user_pos = {user_id: i for i, user_id in enumerate(user_ids)}
+    totals = np.zeros(len(user_ids) * days, dtype=np.int64)
+    if rules:
+        rule_idx, ordinals = expand_rules(rules, end)
+        cents = np.array([
+            round(r["iznos"] * 100) * (1 if r["kategorija__tip"] == "PRIHOD" else -1)
+            for r in rules
+        ], dtype=np.int64)
+        owner = np.array([user_pos[r["korisnik_id"]] for r in rules], dtype=np.int64)
+        offsets = np.clip(ordinals - today.toordinal(), 0, days - 1)
+        np.add.at(totals, owner[rule_idx] * days + offsets, cents[rule_idx])
+    cumulative = np.cumsum(totals.reshape(len(user_ids), days), axis=1)
+    return {user_id: cumulative[i] for user_id, i in user_pos.items()}
+
+
+def forecast_for_user(user, months=12, today=None):
+    """Dnevna prognoza ukupnog stanja računa korisnika za sljedećih ``months`` mjeseci.
+
+    Razvijena pravila se spremaju u cache dok se pravila korisnika ne
+    promijene; trenutno stanje računa čita se pri svakom pozivu.
+    """
+    today = today or date.today()
+    months = max(1, min(months, MAX_MONTHS))
+    version = get_version(RULES, user.pk)
+    key = f"prognoza:{user.pk}:{version}:{today.isoformat()}:{months}"
+    deltas = cache.get(key)
+    if deltas is None:
+        deltas = forecast_deltas([user.pk], today, months)[user.pk]
+        cache.set(key, deltas, CACHE_TIMEOUT)
+    stanje = Racun.objects.filter(korisnik=user, aktivno=True).aggregate(s=Sum("trenutno_stanje"))["s"] or 0
+    balances = (round(stanje * 100) + deltas) / 100
+    days = [today + timedelta(days=i) for i in range(len(deltas))]
+    return days, balances
@@ -83,3 +83,8 @@ class PonavljajucaTransakcijaForm(BootstrapFormMixin, forms.ModelForm):
         if user:
             self.fields['kategorija'].queryset = Kategorija.objects.filter(korisnik=user)
             self.fields['doprinos_cilju'].queryset = CiljStednje.objects.filter(korisnik=user)
+
+class ImportForm(BootstrapFormMixin, forms.Form):
+    datoteka = forms.FileField(label="CSV datoteka")
+    razdjelnik = forms.ChoiceField(label="Razdjelnik", choices=((",", ","), (";", ";"), ("\t", "Tab")))
+    kreiraj_kategorije = forms.BooleanField(label="Kreiraj nepostojeće kategorije", required=False)
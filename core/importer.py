@@ -0,0 +1,188 @@
+"""Uvoz bankovnih izvoda (CSV) u Transakcija.
+
+Datoteka se čita kao tok redaka, svaki redak se mapira na kategoriju, račun
+i cilj korisnika, a duplikati se prepoznaju po sha256 sadržaja retka
+(``Transakcija.hash_uvoza``). Transakcije se spremaju s bulk_create u
+komadima; svaki komad je zasebna transakcija baze u kojoj se stanja računa,
+ciljeva i sažetaka usklađuju jednom, pa uvoz ne drži zaključavanje pisanja
+za cijelu datoteku.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import time
+
+from .models import CiljStednje, Kategorija, Racun, Transakcija, TransactionEffects
+
+# zadani nazivi stupaca odgovaraju CSV izvozu (transakcije_export_csv)
+DEFAULT_COLUMNS = {
+    "datum": "Datum",
+    "tip": "Tip",
+    "kategorija": "Kategorija",
+    "iznos": "Iznos",
+    "opis": "Opis",
+    "cilj": "Cilj",
+    "racun": "Račun",
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%Y.", "%d/%m/%Y")
+TIPOVI = {"prihod": "PRIHOD", "trošak": "TROSAK", "trosak": "TROSAK"}
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    rows: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def parse_amount(value):
+    """Prihvaća 1234.56, 1234,56 i 1.234,56"""
+    value = (value or "").strip().replace(" ", "").replace("\xa0", "")
+    if "," in value:
+        value = value.replace(".", "").replace(",", ".")
+    try:
+        return Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"Neispravan iznos '{value}'")
+
+
+def parse_date(value):
+    value = (value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"Neispravan datum '{value}'")
+
+
+class TransactionImporter:
+    def __init__(self, user, columns=None, create_missing=False, chunk_size=5000, progress=None):
+        self.user = user
+        self.columns = {**DEFAULT_COLUMNS, **(columns or {})}
+        self.create_missing = create_missing
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.kategorije = {(k.naziv.lower(), k.tip): k.pk for k in Kategorija.objects.filter(korisnik=user)}
+        self.racuni = {naziv.lower(): pk for pk, naziv in Racun.objects.filter(korisnik=user).values_list("pk", "naziv")}
+        self.ciljevi = {naziv.lower(): pk for pk, naziv in CiljStednje.objects.filter(korisnik=user).values_list("pk", "naziv")}
+        # isti sadržaj više puta u datoteci (npr. dvije kave isti dan) su različite transakcije
+        self.occurrences = {}
+
+    def run(self, lines, delimiter=","):
+        """Uvozi retke iz iterabilnog izvora teksta (datoteka), vraća ImportResult"""
+        result = ImportResult()
+        start = time.monotonic()
+        reader = csv.DictReader(lines, delimiter=delimiter)
+        batch = []
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                # neispravan redak (npr. predugo polje) ne prekida ostatak datoteke;
+                # DictReader.line_num se osvježava tek nakon ispravnog retka
+                result.rows += 1
+                result.errors.append((reader.reader.line_num, f"Neispravan CSV redak: {e}"))
+                continue
+            except UnicodeDecodeError:
+                result.rows += 1
+                result.errors.append((reader.reader.line_num + 1, "Neispravno kodiranje retka"))
+                continue
+            result.rows += 1
+            try:
+                batch.append(self.build(row))
+            except RowError as e:
+                result.errors.append((reader.line_num, str(e)))
+            if len(batch) >= self.chunk_size:
+                self.flush(batch, result)
+                batch = []
+                self.report(result, start)
+        self.flush(batch, result)
+        result.seconds = time.monotonic() - start
+        self.report(result, start)
+        return result
+
+    def report(self, result, start):
+        if self.progress:
+            result.seconds = time.monotonic() - start
+            self.progress(result)
+
+    def column(self, row, name):
+        return (row.get(self.columns[name]) or "").strip()
+
+    def build(self, row):
+        try:
+            # datoteke otvorene s errors="surrogateescape" nose krive bajtove kao surogate
+            "".join(value for value in row.values() if isinstance(value, str)).encode("utf-8")
+        except UnicodeEncodeError:
+            raise RowError("Neispravno kodiranje retka")
+        datum = parse_date(self.column(row, "datum"))
+        iznos = parse_amount(self.column(row, "iznos"))
+        if not iznos:
+            raise RowError("Iznos ne smije biti 0")
+        opis = self.column(row, "opis")[:255]
+        tip = TIPOVI.get(self.column(row, "tip").lower(), self.column(row, "tip").upper())
+        if tip not in ("PRIHOD", "TROSAK"):
+            # bez stupca tip predznak iznosa određuje prihod/trošak
+            tip = "TROSAK" if iznos < 0 else "PRIHOD"
+        kategorija_id = self.kategorija(self.column(row, "kategorija"), tip)
+        racun_id = self.lookup(self.racuni, self.column(row, "racun"), "Račun")
+        cilj_id = self.lookup(self.ciljevi, self.column(row, "cilj"), "Cilj")
+
+        sadrzaj = f"{datum.isoformat()}|{iznos}|{opis}|{kategorija_id}|{racun_id}|{cilj_id}"
+        n = self.occurrences.get(sadrzaj, 0)
+        self.occurrences[sadrzaj] = n + 1
+        return Transakcija(
+            korisnik=self.user,
+            kategorija_id=kategorija_id,
+            racun_id=racun_id,
+            doprinos_cilju_id=cilj_id,
+            iznos=abs(iznos),
+            datum=datum,
+            opis=opis,
+            hash_uvoza=hashlib.sha256(f"{sadrzaj}|{n}".encode()).hexdigest(),
+        )
+
+    def kategorija(self, naziv, tip):
+        if not naziv:
+            raise RowError("Nedostaje kategorija")
+        key = (naziv.lower(), tip)
+        if key not in self.kategorije:
+            if not self.create_missing:
+                raise RowError(f"Nepoznata kategorija '{naziv}' ({tip})")
+            self.kategorije[key] = Kategorija.objects.create(korisnik=self.user, naziv=naziv, tip=tip).pk
+        return self.kategorije[key]
+
+    def lookup(self, known, naziv, label):
+        if not naziv:
+            return None
+        try:
+            return known[naziv.lower()]
+        except KeyError:
+            raise RowError(f"{label} '{naziv}' ne postoji")
+
+    def flush(self, batch, result):
+        if not batch:
+            return
+        # provjera duplikata i upis u istoj transakciji, da dva istodobna uvoza ne sudare na hash_uvoza
+        with TransactionEffects.deferred():
+            postojeci = set(Transakcija.objects.filter(korisnik=self.user, hash_uvoza__in=[t.hash_uvoza for t in batch])
+                            .values_list("hash_uvoza", flat=True))
+            novi = [t for t in batch if t.hash_uvoza not in postojeci]
+            Transakcija.objects.bulk_create_with_effects(novi, batch_size=self.chunk_size)
+        result.created += len(novi)
+        result.duplicates += len(batch) - len(novi)
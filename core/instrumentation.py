@@ -0,0 +1,123 @@
+"""Mjerenje upita i renderiranja predložaka unutar jednog zahtjeva.
+
+RequestStats se postavlja u ContextVar za trajanje zahtjeva (vidi
+core.middleware). Upiti se mjere kroz execute wrapper koji se dodaje svakoj
+novoj vezi prema bazi, pa se broje i upiti iz sync_to_async dretvi (ASGI), a
+predlošci kroz TimedDjangoTemplates backend.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+import sys
+import threading
+import time
+
+import django
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+
+_trenutni = ContextVar("request_stats", default=None)
+
+DJANGO_DIR = str(Path(django.__file__).parent)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    # (trajanje, sql) najsporijih upita, najviše settings.QUERY_LOG_TOP
+    slowest: list = field(default_factory=list)
+    # (trajanje, sql, porijeklo) upita sporijih od settings.SLOW_QUERY_MS
+    slow: list = field(default_factory=list)
+    # upiti iz paralelnih dretvi (asinkroni pregled) bilježe se istovremeno
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def activate(self):
+        return _trenutni.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _trenutni.reset(token)
+
+    def record_query(self, sql, duration):
+        origin = query_origin() if duration * 1000 >= settings.SLOW_QUERY_MS else None
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            top = settings.QUERY_LOG_TOP
+            if len(self.slowest) < top or duration > self.slowest[-1][0]:
+                self.slowest.append((duration, sql))
+                self.slowest.sort(key=lambda q: q[0], reverse=True)
+                del self.slowest[top:]
+            if origin is not None:
+                self.slow.append((duration, sql, origin))
+
+
+def query_origin():
+    """Prvi okvir stoga iz koda projekta (izvan Djanga i ovog modula)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (not filename.startswith(DJANGO_DIR) and "site-packages" not in filename
+                and filename != __file__ and not filename.startswith("<")):
+            try:
+                filename = str(Path(filename).relative_to(settings.BASE_DIR))
+            except ValueError:
+                pass
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def timed_execute(execute, sql, params, many, context):
+    """execute_wrapper: mjeri svaki upit aktivnog zahtjeva"""
+    stats = _trenutni.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - start)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+connection_created.connect(install_wrapper, dispatch_uid="core.instrumentation")
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _trenutni.get()
+        if stats is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates koji zbraja vrijeme renderiranja u RequestStats.
+
+    Uključeni predlošci ({% include %}, {% extends %}) renderiraju se unutar
+    glavnog pa se ne broje dvaput.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
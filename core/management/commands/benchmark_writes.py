@@ -0,0 +1,145 @@
+from datetime import timedelta
+from decimal import Decimal
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+from core.models import Kategorija, Racun, Transakcija, TransactionEffects
+
+
+class Command(BaseCommand):
+    help = ('Mjeri propusnost upisa transakcija s N istovremenih pisaca '
+            '(--compare: zadani Django SQLite prema WAL + BEGIN IMMEDIATE, svaki na novoj bazi)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Broj istovremenih pisaca (zadano: 8)')
+        parser.add_argument('--transactions', type=int, default=100, help='Transakcija po piscu (zadano: 100)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed za iznose i datume (zadano: 0)')
+        parser.add_argument('--compare', action='store_true',
+                            help='Pokreni oba SQLite načina na privremenim bazama i usporedi ih')
+        parser.add_argument('--json', action='store_true', help='Rezultat kao JSON (za --compare)')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.handle_compare(options)
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('Mjerenje treba bazu u datoteci (DATABASE_URL)')
+
+        rezultat = self.run_writers(options['writers'], options['transactions'], options['seed'])
+        if options['json']:
+            self.stdout.write(json.dumps(rezultat))
+        else:
+            self.stdout.write(self.format_result(connection.settings_dict['ENGINE'], rezultat))
+
+    def run_writers(self, writers, transactions, seed):
+        """Svaki pisac u svojoj dretvi (i vezi) sprema ``transactions`` transakcija preko save()"""
+        oznaka = uuid.uuid4().hex[:8]
+        korisnici = [self.create_user(f'benchmark-{oznaka}-{i}') for i in range(writers)]
+        latencije = []
+        greske = []
+        start = threading.Barrier(writers + 1)
+
+        def pisac(i, user, kategorije, racun):
+            rng = random.Random(seed * 1000 + i)
+            today = timezone.localdate()
+            try:
+                start.wait()
+                for _ in range(transactions):
+                    pocetak = time.perf_counter()
+                    try:
+                        # dio transakcija s ranijim datumom, kao kod ručnog unosa
+                        Transakcija.objects.create(
+                            korisnik=user, kategorija=rng.choice(kategorije), racun=racun,
+                            iznos=Decimal(rng.randint(100, 20000)) / 100,
+                            datum=today - timedelta(days=rng.choice((0, 0, 0, rng.randint(1, 90)))),
+                        )
+                    except OperationalError as e:
+                        greske.append(str(e))
+                    else:
+                        latencije.append(time.perf_counter() - pocetak)
+            finally:
+                connection.close()
+
+        dretve = [threading.Thread(target=pisac, args=(i, *k)) for i, k in enumerate(korisnici)]
+        for d in dretve:
+            d.start()
+        start.wait()
+        pocetak = time.perf_counter()
+        for d in dretve:
+            d.join()
+        trajanje = time.perf_counter() - pocetak
+
+        # kategorije i računi su zaštićeni dok postoje transakcije
+        users = User.objects.filter(pk__in=[k[0].pk for k in korisnici])
+        with TransactionEffects.deferred():
+            Transakcija.objects.filter(korisnik__in=users).delete()
+        users.delete()
+
+        latencije.sort()
+        return {
+            'writers': writers,
+            'ok': len(latencije),
+            'errors': len(greske),
+            'error_sample': greske[0] if greske else None,
+            'seconds': round(trajanje, 3),
+            'per_second': round(len(latencije) / trajanje, 1) if trajanje else 0,
+            'p50_ms': round(latencije[len(latencije) // 2] * 1000, 1) if latencije else None,
+            'p95_ms': round(latencije[int(len(latencije) * 0.95)] * 1000, 1) if latencije else None,
+            'max_ms': round(latencije[-1] * 1000, 1) if latencije else None,
+        }
+
+    def create_user(self, username):
+        user = User.objects.create_user(username)
+        kategorije = [
+            Kategorija.objects.create(korisnik=user, naziv=naziv, tip=tip)
+            for naziv, tip in (('Hrana', 'TROSAK'), ('Režije', 'TROSAK'), ('Plaća', 'PRIHOD'))
+        ]
+        racun = Racun.objects.create(korisnik=user, naziv='Tekući', tip='BANKA',
+                                     pocetno_stanje=1000, trenutno_stanje=1000)
+        return user, kategorije, racun
+
+    def handle_compare(self, options):
+        manage = str(settings.BASE_DIR / 'manage.py')
+        naredba = ['benchmark_writes', '--json', '--writers', str(options['writers']),
+                   '--transactions', str(options['transactions']), '--seed', str(options['seed'])]
+        rezultati = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for naziv, tuning in (('Django zadano', '0'), ('WAL + IMMEDIATE', '1')):
+                env = {**os.environ, 'DATABASE_URL': f'sqlite:///{tmp}/benchmark-{tuning}.sqlite3',
+                       'SQLITE_TUNING': tuning, 'REQUEST_LOG_LEVEL': 'WARNING'}
+                env.pop('REPLICA_DATABASE_URL', None)
+                self.stdout.write(f'{naziv}: migracije i mjerenje...')
+                subprocess.run([sys.executable, manage, 'migrate', '-v', '0'], env=env, check=True)
+                izlaz = subprocess.run([sys.executable, manage, *naredba], env=env, check=True,
+                                       capture_output=True, text=True).stdout
+                rezultati[naziv] = json.loads(izlaz.strip().splitlines()[-1])
+
+        if options['json']:
+            self.stdout.write(json.dumps(rezultati))
+            return
+        for naziv, rezultat in rezultati.items():
+            self.stdout.write(self.format_result(naziv, rezultat))
+        prije, poslije = rezultati.values()
+        if prije['per_second']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Propusnost: {poslije['per_second'] / prije['per_second']:.1f}x, "
+                f"neuspjelih upisa {prije['errors']} -> {poslije['errors']}"
+            ))
+
+    def format_result(self, naziv, r):
+        redak = (f"{naziv}: {r['writers']} pisaca, {r['ok']} upisa u {r['seconds']} s "
+                 f"({r['per_second']}/s, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, max {r['max_ms']} ms), neuspjelih {r['errors']}")
+        if r['error_sample']:
+            redak += f" ({r['error_sample']})"
+        return redak
@@ -1,14 +1,32 @@
-from django.core.management.base import BaseCommand
+import django
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
+from django.db import connections
+from core.demo import DEMO_PASSWORD, DemoGenerator, ScaleResult, generate
 from core.models import Racun, Kategorija, Transakcija, CiljStednje
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from decimal import Decimal
 from datetime import date, timedelta
 import random
+import time
 
 class Command(BaseCommand):
-    help = 'Kreira demo podatke za aplikaciju'
+    help = 'Kreira demo podatke za aplikaciju (--scale N: N generiranih korisnika za testiranje opterećenja)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, help='Broj generiranih korisnika (bez ovoga: jedan demo korisnik)')
+        parser.add_argument('--transactions', type=int, default=1000, help='Transakcija po korisniku (zadano: 1000)')
+        parser.add_argument('--months', type=int, default=24, help='Koliko mjeseci povijesti (zadano: 24)')
+        parser.add_argument('--seed', type=int, default=0, help='Isti seed daje iste podatke (zadano: 0)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Broj paralelnih procesa (samo za bazu s više pisaca, npr. PostgreSQL)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Redaka po bulk_create (zadano: 5000)')
+        parser.add_argument('--prefix', default='demo', help='Prefiks korisničkih imena (zadano: demo)')
 
     def handle(self, *args, **options):
+        if options['scale']:
+            return self.handle_scale(options)
+
         self.stdout.write('Kreiranje demo podataka...')
         
         # Kreiranje demo korisnika
@@ -174,3 +192,57 @@ class Command(BaseCommand):
                 'URL: http://127.0.0.1:8000/'
             )
         )
+
+    def handle_scale(self, options):
+        count, workers = options['scale'], max(1, options['workers'])
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite dopušta samo jednog pisca, paralelni procesi bi čekali zaključanu bazu
+            self.stdout.write(self.style.WARNING('SQLite ne podržava paralelno pisanje, koristi se jedan proces.'))
+            workers = 1
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix, username__regex=rf'^{prefix}[0-9]{{7}}$').exists():
+            raise CommandError(f"Generirani korisnici '{prefix}…' već postoje, zadaj drugi --prefix")
+
+        generator_options = {
+            'seed': options['seed'],
+            'transactions': options['transactions'],
+            'months': options['months'],
+            'chunk_size': options['chunk_size'],
+            'prefix': prefix,
+        }
+        # svaki proces dobiva više manjih raspona da se posao ravnomjerno rasporedi
+        step = max(1, min(1000, count // (workers * 4) or 1))
+        ranges = [(start, min(step, count - start)) for start in range(0, count, step)]
+
+        self.stdout.write(f'Generiranje {count} korisnika × {options["transactions"]} transakcija '
+                          f'({workers} procesa, seed {options["seed"]})...')
+        total = ScaleResult()
+        start_time = time.monotonic()
+
+        def report(result):
+            nonlocal total
+            total += result
+            elapsed = time.monotonic() - start_time
+            self.stdout.write(f'  {total.users}/{count} korisnika, {total.transactions} transakcija, '
+                              f'{total.transactions / elapsed:,.0f} transakcija/s')
+
+        if workers == 1:
+            generator = DemoGenerator(**generator_options)
+            for start, n in ranges:
+                report(generator.run(start, n))
+        else:
+            # procesi ne smiju naslijediti otvorenu vezu prema bazi
+            connections.close_all()
+            # initializer je potreban kad se procesi pokreću sa spawn (macOS, Windows)
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                futures = [pool.submit(generate, start, n, generator_options) for start, n in ranges]
+                for future in as_completed(futures):
+                    report(future.result())
+
+        elapsed = time.monotonic() - start_time
+        rows = total.users + total.transactions + total.other
+        self.stdout.write(self.style.SUCCESS(
+            f'Kreirano {total.users} korisnika, {total.transactions} transakcija i {total.other} ostalih redaka '
+            f'za {elapsed:.1f} s ({rows / elapsed:,.0f} redaka/s, {total.transactions / elapsed:,.0f} transakcija/s). '
+            f'Lozinka svih korisnika: {DEMO_PASSWORD}'
+        ))
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.importer import DEFAULT_COLUMNS, TransactionImporter
+
+
+class Command(BaseCommand):
+    help = 'Uvozi transakcije iz CSV bankovnog izvoda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Korisnik kojem se uvoze transakcije')
+        parser.add_argument('path', help='Putanja do CSV datoteke')
+        parser.add_argument('--map', action='append', default=[], metavar='POLJE=STUPAC',
+                            help=f"Naziv stupca za polje ({', '.join(DEFAULT_COLUMNS)}), npr. --map datum=Datum valute")
+        parser.add_argument('--delimiter', default=',', help='Razdjelnik stupaca (zadano: ,)')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Kodiranje datoteke')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Kreiraj nepostojeće kategorije umjesto prijave greške')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Broj transakcija po bulk_create upitu')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Korisnik '{options['username']}' ne postoji")
+
+        columns = {}
+        for mapping in options['map']:
+            polje, sep, stupac = mapping.partition('=')
+            if not sep or polje not in DEFAULT_COLUMNS:
+                raise CommandError(f"Neispravno mapiranje '{mapping}'")
+            columns[polje] = stupac
+
+        importer = TransactionImporter(
+            user,
+            columns=columns,
+            create_missing=options['create_missing'],
+            chunk_size=options['chunk_size'],
+            progress=lambda r: self.stdout.write(
+                f'Obrađeno {r.rows} redaka ({r.rows_per_second:.0f} redaka/s)'
+            ),
+        )
+        with open(options['path'], encoding=options['encoding'], errors='surrogateescape', newline='') as f:
+            result = importer.run(f, delimiter=options['delimiter'])
+
+        for line_no, message in result.errors:
+            self.stderr.write(f'Redak {line_no}: {message}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Uvezeno {result.created} transakcija, preskočeno {result.duplicates} duplikata, '
+                f'{len(result.errors)} grešaka ({result.seconds:.1f} s).'
+            )
+        )
@@ -1,29 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
 from django.core.management.base import BaseCommand
+from django.db import connections
 from django.utils import timezone
 from core.models import PonavljajucaTransakcija
 
 
+def process_shard(index, count, today, chunk_size):
+    """Obrađuje pravila jednog dijela korisnika (u zasebnom procesu)"""
+    obradjeno = PonavljajucaTransakcija.objects.shard(index, count).process_due(today, chunk_size=chunk_size)
+    return [(recurring.opis, recurring.iznos, n) for recurring, n in obradjeno.items()]
+
+
 class Command(BaseCommand):
     help = 'Obrađuje ponavljajuće transakcije koje su dospjele'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Broj pravila po transakciji baze i transakcija po bulk_create upitu')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Broj procesa; korisnici se dijele po ostatku id %% workers')
+
     def handle(self, *args, **options):
         today = timezone.now().date()
-        recurring_transactions = PonavljajucaTransakcija.objects.filter(
-            aktivno=True,
-            sljedeci_datum__lte=today
-        )
-        
-        processed_count = 0
-        for recurring in recurring_transactions:
-            if not recurring.datum_kraja or recurring.sljedeci_datum <= recurring.datum_kraja:
-                recurring.create_transaction()
-                processed_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Obrađena transakcija: {recurring.opis} - {recurring.iznos} kn'
-                    )
+        workers = max(1, options['workers'])
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite dopušta samo jednog pisca, paralelni procesi bi čekali zaključanu bazu
+            self.stdout.write(self.style.WARNING('SQLite ne podržava paralelno pisanje, koristi se jedan proces.'))
+            workers = 1
+
+        if workers == 1:
+            obradjeno = process_shard(0, 1, today, options['chunk_size'])
+        else:
+            obradjeno = []
+            # procesi ne smiju naslijediti otvorenu vezu prema bazi
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                futures = [pool.submit(process_shard, i, workers, today, options['chunk_size'])
+                           for i in range(workers)]
+                for future in as_completed(futures):
+                    obradjeno.extend(future.result())
+
+        for opis, iznos, count in obradjeno:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Obrađena transakcija: {opis} - {iznos} kn ({count}x)'
                 )
-        
+            )
+
         self.stdout.write(
-            self.style.SUCCESS(f'Ukupno obrađeno {processed_count} ponavljajućih transakcija.')
+            self.style.SUCCESS(
+                f'Ukupno obrađeno {len(obradjeno)} ponavljajućih transakcija '
+                f'({sum(count for *_, count in obradjeno)} kreiranih transakcija).'
+            )
         )
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core.models import DnevnoStanje, MjesecniSazetak
+
+
+class Command(BaseCommand):
+    help = 'Ponovno gradi mjesečne sažetke i dnevna stanja računa ispočetka'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Korisničko ime (zadano: svi korisnici)')
+
+    def handle(self, *args, **options):
+        korisnik = None
+        if options['user']:
+            try:
+                korisnik = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Korisnik '{options['user']}' ne postoji")
+
+        count = MjesecniSazetak.rebuild(korisnik)
+        dnevna = DnevnoStanje.rebuild(korisnik)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Ukupno kreirano {count} redaka mjesečnog sažetka i {dnevna} dnevnih stanja.')
+        )
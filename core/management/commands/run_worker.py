@@ -0,0 +1,43 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.models import Posao
+
+
+class Command(BaseCommand):
+    help = 'Obrađuje poslove iz reda u bazi (usklađivanje stanja uz BACKGROUND_BOOKKEEPING=1)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Obradi sve dospjele poslove i izađi')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Sekundi čekanja kad je red prazan (zadano: 1)')
+        parser.add_argument('--batch', type=int, default=100,
+                            help='Poslova po krugu, između provjera veze s bazom (zadano: 100)')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        # SIGTERM (npr. systemd, docker stop) završava trenutni krug pa izlazi
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        ukupno = neuspjelo = 0
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                obradjeno, greske = Posao.objects.run_pending(limit=options['batch'])
+                ukupno += obradjeno
+                neuspjelo += greske
+                if obradjeno or greske:
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'Obrađeno {obradjeno} poslova, neuspjelih {greske}')
+                    continue
+                if options['once']:
+                    break
+                stop.wait(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Obrađeno {ukupno} poslova, neuspjelih {neuspjelo}.')
+        )
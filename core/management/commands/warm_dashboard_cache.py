@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.reports import cached_dashboard_context
+
+
+class Command(BaseCommand):
+    help = 'Puni cache pregleda za nedavno aktivne korisnike (npr. nakon deploya)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Korisnici prijavljeni u zadnjih N dana (zadano: 7)')
+
+    def handle(self, *args, **options):
+        # LocMemCache živi u procesu naredbe i nestaje s njim, web procesi ga ne vide
+        if isinstance(caches['default'], (LocMemCache, DummyCache)):
+            raise CommandError('Cache nije dijeljen s web procesima (LocMemCache), postavi CACHE_URL')
+        today = timezone.localdate()
+        od = timezone.now() - timedelta(days=options['days'])
+        users = User.objects.filter(is_active=True, last_login__gte=od).order_by('pk')
+
+        count = 0
+        for user in users.iterator():
+            cached_dashboard_context(user, today)
+            count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Pregled spremljen u cache za {count} korisnika.')
+        )
@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import RequestStats, install_wrapper
+
+logger = logging.getLogger("core.requests")
+slow_logger = logging.getLogger("core.slow_query")
+
+
+class QueryInstrumentationMiddleware:
+    """Broj upita, vrijeme baze i predložaka po zahtjevu.
+
+    Rezultat ide u Server-Timing zaglavlje (vidljivo u alatima preglednika,
+    samo uz DEBUG ili za is_staff korisnike) i u jedan JSON redak loga
+    ``core.requests`` (razina INFO); upiti sporiji od
+    settings.SLOW_QUERY_MS zapisuju se u ``core.slow_query`` zajedno s
+    mjestom u kodu odakle su pokrenuti. Upiti koje StreamingHttpResponse
+    izvrši tek tijekom slanja nisu uključeni. Radi i pod WSGI i pod ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # veze otvorene prije učitavanja core.instrumentation (npr. provjere)
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = stats.activate()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            RequestStats.deactivate(token)
+        self.report(request, response, stats, time.perf_counter() - start, getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = stats.activate()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            RequestStats.deactivate(token)
+        total = time.perf_counter() - start
+        # request.user je lijen, a u petlji događaja ne smije čitati bazu
+        user = None
+        if not settings.DEBUG and hasattr(request, "auser"):
+            user = await request.auser()
+        self.report(request, response, stats, total, user)
+        return response
+
+    def report(self, request, response, stats, total, user):
+        # broj i trajanje upita otkrivaju previše o bazi za anonimne korisnike
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} upita"',
+                f"tpl;dur={stats.template_time * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ])
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "ms": round(total * 1000, 1),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 1),
+                "template_ms": round(stats.template_time * 1000, 1),
+                "slowest": [{"ms": round(d * 1000, 1), "sql": sql[:settings.QUERY_LOG_SQL_CHARS]}
+                            for d, sql in stats.slowest],
+            }, ensure_ascii=False))
+        for duration, sql, origin in stats.slow:
+            slow_logger.warning(json.dumps({
+                "path": request.path,
+                "ms": round(duration * 1000, 1),
+                "origin": origin,
+                "sql": sql[:settings.QUERY_LOG_SQL_CHARS],
+            }, ensure_ascii=False))
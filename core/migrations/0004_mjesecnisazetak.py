@@ -0,0 +1,68 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Abs, ExtractMonth, ExtractYear
+
+
+def pozitivni_iznosi(apps, schema_editor):
+    # predznak odsad daje samo tip kategorije (sažetak, 0005, dnevna stanja);
+    # stari negativni troškovi postaju pozitivni prije nego što se iz njih
+    # išta izračuna, a iznosi 0 ne mijenjaju stanja i ne prolaze ograničenje iz 0013
+    for naziv in ('Transakcija', 'PonavljajucaTransakcija'):
+        model = apps.get_model('core', naziv)
+        model.objects.filter(iznos__lt=0).update(iznos=Abs('iznos'))
+        model.objects.filter(iznos=0).delete()
+
+
+def popuni_sazetak(apps, schema_editor):
+    Transakcija = apps.get_model('core', 'Transakcija')
+    MjesecniSazetak = apps.get_model('core', 'MjesecniSazetak')
+    redovi = (Transakcija.objects.order_by()
+              .annotate(godina=ExtractYear('datum'), mjesec=ExtractMonth('datum'))
+              .values('korisnik', 'kategorija', 'racun', 'godina', 'mjesec')
+              .annotate(ukupno=Sum('iznos'), broj=Count('id')))
+    MjesecniSazetak.objects.bulk_create([
+        MjesecniSazetak(korisnik_id=r['korisnik'], kategorija_id=r['kategorija'], racun_id=r['racun'],
+                        godina=r['godina'], mjesec=r['mjesec'], iznos=r['ukupno'], broj=r['broj'])
+        for r in redovi
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_transakcija_racun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(pozitivni_iznosi, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='MjesecniSazetak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('godina', models.IntegerField()),
+                ('mjesec', models.IntegerField()),
+                ('iznos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('broj', models.IntegerField(default=0)),
+                ('kategorija', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.kategorija')),
+                ('korisnik', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('racun', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.racun')),
+            ],
+            options={
+                'ordering': ['godina', 'mjesec'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mjesecnisazetak',
+            constraint=models.UniqueConstraint(condition=models.Q(('racun__isnull', False)), fields=('korisnik', 'godina', 'mjesec', 'kategorija', 'racun'), name='sazetak_jedinstven_po_racunu'),
+        ),
+        migrations.AddConstraint(
+            model_name='mjesecnisazetak',
+            constraint=models.UniqueConstraint(condition=models.Q(('racun__isnull', True)), fields=('korisnik', 'godina', 'mjesec', 'kategorija'), name='sazetak_jedinstven_bez_racuna'),
+        ),
+        migrations.RunPython(popuni_sazetak, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def uskladi_stanja(apps, schema_editor):
+    # brisanje transakcija dosad nije mijenjalo stanje računa, pa ga jednom
+    # izračunaj iz povijesti prije prelaska na delta ažuriranje
+    Racun = apps.get_model('core', 'Racun')
+    Transakcija = apps.get_model('core', 'Transakcija')
+    zbrojevi = (Transakcija.objects.order_by()
+                .filter(racun__isnull=False)
+                .values('racun')
+                .annotate(prihodi=Sum('iznos', filter=Q(kategorija__tip='PRIHOD')),
+                          troskovi=Sum('iznos', filter=Q(kategorija__tip='TROSAK'))))
+    zbrojevi = {z['racun']: z for z in zbrojevi}
+    for racun in Racun.objects.all():
+        z = zbrojevi.get(racun.pk, {})
+        prihodi = z.get('prihodi') or Decimal('0')
+        troskovi = z.get('troskovi') or Decimal('0')
+        # ista formula kao Transakcija.signed_sum: prihod +iznos, trošak -iznos
+        racun.trenutno_stanje = racun.pocetno_stanje + prihodi - troskovi
+        racun.save(update_fields=['trenutno_stanje'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_mjesecnisazetak'),
+    ]
+
+    operations = [
+        migrations.RunPython(uskladi_stanja, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_uskladi_stanja_racuna'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transakcija',
+            name='hash_uvoza',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='transakcija',
+            constraint=models.UniqueConstraint(fields=('korisnik', 'hash_uvoza'), name='transakcija_jedinstven_uvoz'),
+        ),
+    ]
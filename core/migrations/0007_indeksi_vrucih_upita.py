@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transakcija_hash_uvoza'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mjesecnisazetak',
+            index=models.Index(fields=['korisnik', 'godina', 'mjesec'], name='sazetak_korisnik_mjesec'),
+        ),
+        migrations.AddIndex(
+            model_name='mjesecnisazetak',
+            index=models.Index(fields=['korisnik', 'kategorija', 'godina', 'mjesec'], name='sazetak_kor_kat_mjesec'),
+        ),
+        migrations.AddIndex(
+            model_name='ponavljajucatransakcija',
+            index=models.Index(condition=models.Q(('aktivno', True)), fields=['sljedeci_datum'], name='ponavljajuca_aktivno_datum'),
+        ),
+        migrations.AddIndex(
+            model_name='transakcija',
+            index=models.Index(fields=['korisnik', 'datum'], name='transakcija_korisnik_datum'),
+        ),
+        migrations.AddIndex(
+            model_name='transakcija',
+            index=models.Index(fields=['korisnik', 'kategorija', 'datum'], name='transakcija_kor_kat_datum'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# FTS5 indeks opisa, kategorije i računa transakcije (rowid = id transakcije).
+# Stupac korisnik sadrži token 'k<id>' pa pretraga unutar jednog korisnika
+# presijeca samo njegove retke umjesto svih pogodaka u bazi. Okidači drže
+# indeks usklađenim i za bulk_create, update() i preimenovanja. Samo za
+# SQLite; ostale baze koriste icontains (TransakcijaQuerySet.search).
+STVORI = [
+    """
+    CREATE VIRTUAL TABLE core_transakcija_fts USING fts5(
+        korisnik, opis, kategorija, racun,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO core_transakcija_fts (rowid, korisnik, opis, kategorija, racun)
+    SELECT t.id, 'k' || t.korisnik_id, t.opis, k.naziv, r.naziv
+    FROM core_transakcija t
+    JOIN core_kategorija k ON k.id = t.kategorija_id
+    LEFT JOIN core_racun r ON r.id = t.racun_id
+    """,
+    """
+    CREATE TRIGGER core_transakcija_fts_insert AFTER INSERT ON core_transakcija BEGIN
+        INSERT INTO core_transakcija_fts (rowid, korisnik, opis, kategorija, racun) VALUES (
+            new.id, 'k' || new.korisnik_id, new.opis,
+            (SELECT naziv FROM core_kategorija WHERE id = new.kategorija_id),
+            (SELECT naziv FROM core_racun WHERE id = new.racun_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER core_transakcija_fts_update
+    AFTER UPDATE OF korisnik_id, opis, kategorija_id, racun_id ON core_transakcija BEGIN
+        UPDATE core_transakcija_fts SET
+            korisnik = 'k' || new.korisnik_id,
+            opis = new.opis,
+            kategorija = (SELECT naziv FROM core_kategorija WHERE id = new.kategorija_id),
+            racun = (SELECT naziv FROM core_racun WHERE id = new.racun_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_transakcija_fts_delete AFTER DELETE ON core_transakcija BEGIN
+        DELETE FROM core_transakcija_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_kategorija_fts_naziv AFTER UPDATE OF naziv ON core_kategorija BEGIN
+        UPDATE core_transakcija_fts SET kategorija = new.naziv
+        WHERE rowid IN (SELECT id FROM core_transakcija WHERE kategorija_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_racun_fts_naziv AFTER UPDATE OF naziv ON core_racun BEGIN
+        UPDATE core_transakcija_fts SET racun = new.naziv
+        WHERE rowid IN (SELECT id FROM core_transakcija WHERE racun_id = new.id);
+    END
+    """,
+]
+
+OBRISI = [
+    "DROP TRIGGER IF EXISTS core_racun_fts_naziv",
+    "DROP TRIGGER IF EXISTS core_kategorija_fts_naziv",
+    "DROP TRIGGER IF EXISTS core_transakcija_fts_delete",
+    "DROP TRIGGER IF EXISTS core_transakcija_fts_update",
+    "DROP TRIGGER IF EXISTS core_transakcija_fts_insert",
+    "DROP TABLE IF EXISTS core_transakcija_fts",
+]
+
+
+def izvrsi(naredbe):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in naredbe:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_indeksi_vrucih_upita'),
+    ]
+
+    operations = [
+        migrations.RunPython(izvrsi(STVORI), izvrsi(OBRISI)),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def odvoji_duplikate(apps, schema_editor):
+    # preklopljena pokretanja process_recurring mogla su kreirati isto ponavljanje
+    # dvaput; duplikati ostaju (stanja računa ih već uključuju), ali bez veze
+    # na ponavljajuću transakciju
+    Transakcija = apps.get_model('core', 'Transakcija')
+    duplikati = (Transakcija.objects.order_by()
+                 .filter(ponavljajuca__isnull=False)
+                 .values('ponavljajuca', 'datum')
+                 .annotate(broj=Count('id'), prvi=Min('id'))
+                 .filter(broj__gt=1))
+    for d in duplikati:
+        (Transakcija.objects
+         .filter(ponavljajuca=d['ponavljajuca'], datum=d['datum'])
+         .exclude(pk=d['prvi'])
+         .update(ponavljajuca=None))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_pretraga_transakcija'),
+    ]
+
+    operations = [
+        migrations.RunPython(odvoji_duplikate, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transakcija',
+            constraint=models.UniqueConstraint(condition=models.Q(('ponavljajuca__isnull', False)), fields=('ponavljajuca', 'datum'), name='transakcija_jedno_ponavljanje'),
+        ),
+    ]
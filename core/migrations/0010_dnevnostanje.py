@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def popuni_stanja(apps, schema_editor):
+    Transakcija = apps.get_model('core', 'Transakcija')
+    DnevnoStanje = apps.get_model('core', 'DnevnoStanje')
+    redovi = (Transakcija.objects.filter(racun__isnull=False).order_by()
+              .values('racun', 'datum')
+              .annotate(promjena=Sum(Case(When(kategorija__tip='PRIHOD', then=F('iznos')), default=-F('iznos'))))
+              .order_by('racun_id', 'datum'))
+    novi = []
+    racun_id = None
+    for r in redovi:
+        if r['racun'] != racun_id:
+            racun_id, kumulativ = r['racun'], 0
+        kumulativ += r['promjena']
+        novi.append(DnevnoStanje(racun_id=racun_id, datum=r['datum'], promjena=r['promjena'], kumulativ=kumulativ))
+    DnevnoStanje.objects.bulk_create(novi, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_jedno_ponavljanje_po_datumu'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DnevnoStanje',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datum', models.DateField()),
+                ('promjena', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('kumulativ', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('racun', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dnevna_stanja', to='core.racun')),
+            ],
+            options={
+                'ordering': ['racun', 'datum'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dnevnostanje',
+            constraint=models.UniqueConstraint(fields=('racun', 'datum'), name='dnevno_stanje_jedinstveno'),
+        ),
+        migrations.RunPython(popuni_stanja, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dnevnostanje'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Posao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vrsta', models.CharField(choices=[('RACUN', 'Stanje računa'), ('CILJ', 'Stanje cilja')], max_length=10)),
+                ('objekt_id', models.PositiveBigIntegerField()),
+                ('od_datuma', models.DateField(blank=True, null=True)),
+                ('broj', models.IntegerField(default=1)),
+                ('zakazano', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pokusaji', models.IntegerField(default=0)),
+                ('greska', models.TextField(blank=True)),
+                ('kreirano', models.DateTimeField(auto_now_add=True)),
+                ('korisnik', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['zakazano', 'pk'],
+                'indexes': [models.Index(fields=['zakazano'], name='posao_zakazano')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='posao',
+            constraint=models.UniqueConstraint(fields=('vrsta', 'objekt_id'), name='posao_jedinstven'),
+        ),
+    ]
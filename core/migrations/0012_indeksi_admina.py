@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_posao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budzet',
+            index=models.Index(fields=['datum_kreiranja'], name='budzet_datum_kreiranja'),
+        ),
+        migrations.AddIndex(
+            model_name='ciljstednje',
+            index=models.Index(fields=['datum_pocetka'], name='cilj_datum_pocetka'),
+        ),
+        migrations.AddIndex(
+            model_name='ponavljajucatransakcija',
+            index=models.Index(fields=['sljedeci_datum'], name='ponavljajuca_datum'),
+        ),
+        migrations.AddIndex(
+            model_name='racun',
+            index=models.Index(fields=['datum_kreiranja'], name='racun_datum_kreiranja'),
+        ),
+        migrations.AddIndex(
+            model_name='transakcija',
+            index=models.Index(fields=['datum'], name='transakcija_datum'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:42
+
+import django.core.validators
+from decimal import Decimal
+from importlib import import_module
+from django.db import migrations, models
+
+# CheckConstraint na SQLite preslaguje tablicu transakcija: njeni okidači FTS
+# indeksa nestaju s njom, a okidači kategorije i računa koji je spominju
+# ruše preimenovanje. Zato se okidači brišu prije i vraćaju nakon ograničenja.
+pretraga = import_module('core.migrations.0008_pretraga_transakcija')
+OKIDACI = [sql for sql in pretraga.STVORI if 'CREATE TRIGGER' in sql]
+OBRISI_OKIDACE = [sql for sql in pretraga.OBRISI if 'DROP TRIGGER' in sql]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_indeksi_admina'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ponavljajucatransakcija',
+            name='iznos',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.AlterField(
+            model_name='transakcija',
+            name='iznos',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))]),
+        ),
+        migrations.AddConstraint(
+            model_name='ponavljajucatransakcija',
+            constraint=models.CheckConstraint(check=models.Q(('iznos__gt', 0)), name='ponavljajuca_pozitivan_iznos'),
+        ),
+        migrations.RunPython(pretraga.izvrsi(OBRISI_OKIDACE), pretraga.izvrsi(OKIDACI)),
+        migrations.AddConstraint(
+            model_name='transakcija',
+            constraint=models.CheckConstraint(check=models.Q(('iznos__gt', 0)), name='transakcija_pozitivan_iznos'),
+        ),
+        migrations.RunPython(pretraga.izvrsi(OKIDACI), pretraga.izvrsi(OBRISI_OKIDACE)),
+    ]
@@ -1,8 +1,23 @@
-from django.db import models
+from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, Least, Mod
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import timedelta
+from .caching import DATA, RULES, bump_versions
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import partial
 import calendar
+import logging
+import re
+
+logger = logging.getLogger("core.jobs")
 
 class Kategorija(models.Model):
     TIP_CHOICES = (("PRIHOD", "Prihod"), ("TROSAK", "Trošak"))
@@ -25,6 +40,24 @@ class CiljStednje(models.Model):
     datum_pocetka = models.DateField()
     datum_kraja = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # admin: date_hierarchy
+            models.Index(fields=["datum_pocetka"], name="cilj_datum_pocetka"),
+        ]
+
+    @classmethod
+    def adjust_balance(cls, cilj_id, delta):
+        """Atomarno pomiče trenutno stanje cilja za delta"""
+        cls.objects.filter(pk=cilj_id).update(trenutno_stanje=F("trenutno_stanje") + delta)
+
+    @classmethod
+    def refresh_balance(cls, cilj_id):
+        """Postavlja trenutno stanje cilja na zbroj doprinosa (posao iz reda, vidi Posao)"""
+        ukupno = (Transakcija.objects.filter(doprinos_cilju_id=cilj_id).order_by()
+                  .aggregate(ukupno=Transakcija.signed_sum())["ukupno"])
+        cls.objects.filter(pk=cilj_id).update(trenutno_stanje=ukupno or 0)
+
     def progress(self):
         if self.cilj_iznos and self.cilj_iznos > 0:
             return float((self.trenutno_stanje / self.cilj_iznos) * 100)
@@ -52,20 +85,88 @@ class Racun(models.Model):
     class Meta:
         unique_together = ("korisnik", "naziv")
         ordering = ["naziv"]
+        indexes = [
+            # admin: date_hierarchy
+            models.Index(fields=["datum_kreiranja"], name="racun_datum_kreiranja"),
+        ]
 
     def __str__(self):
         return f"{self.naziv} ({self.get_tip_display()})"
 
+    @classmethod
+    def adjust_balance(cls, racun_id, delta):
+        """Atomarno pomiče trenutno stanje računa za delta (bez čitanja povijesti)"""
+        cls.objects.filter(pk=racun_id).update(trenutno_stanje=F("trenutno_stanje") + delta)
+
+    @classmethod
+    def refresh_balance(cls, racun_id, od=None):
+        """Ponovno gradi dnevna stanja računa od datuma ``od`` i iz njih trenutno stanje (posao iz reda)"""
+        kumulativ = DnevnoStanje.rebuild_account(racun_id, od)
+        cls.objects.filter(pk=racun_id).update(trenutno_stanje=F("pocetno_stanje") + kumulativ)
+
+    def balance_on(self, datum):
+        """Stanje računa na kraju dana ``datum`` (iz DnevnoStanje, jedan upit)"""
+        kumulativ = (self.dnevna_stanja.filter(datum__lte=datum).order_by("-datum")
+                     .values_list("kumulativ", flat=True).first())
+        return self.pocetno_stanje + (kumulativ or 0)
+
+    def balance_history(self, od, do):
+        """Stanje na kraju svakog dana s prometom između ``od`` i ``do``.
+
+        Vraća (stanje na početku raspona, [(datum, stanje), ...]).
+        """
+        pocetak = self.balance_on(od - timedelta(days=1))
+        dani = [(datum, self.pocetno_stanje + kumulativ)
+                for datum, kumulativ in self.dnevna_stanja.filter(datum__gte=od, datum__lte=do)
+                                            .order_by("datum").values_list("datum", "kumulativ")]
+        return pocetak, dani
+
     def update_balance(self):
-        """Ažurira trenutno stanje računa na temelju transakcija"""
-        from django.db.models import Sum
-        from decimal import Decimal
-        prihodi = self.transakcije.filter(kategorija__tip="PRIHOD").aggregate(
-            total=Sum('iznos'))['total'] or Decimal('0')
-        troskovi = self.transakcije.filter(kategorija__tip="TROSAK").aggregate(
-            total=Sum('iznos'))['total'] or Decimal('0')
-        self.trenutno_stanje = self.pocetno_stanje + Decimal(str(prihodi)) - abs(Decimal(str(troskovi)))
-        self.save()
+        """Ponovno izračunava trenutno stanje računa iz svih transakcija (usklađivanje)"""
+        ukupno = self.transakcije.order_by().aggregate(ukupno=Transakcija.signed_sum())["ukupno"]
+        self.trenutno_stanje = self.pocetno_stanje + (ukupno or Decimal("0"))
+        self.save(update_fields=["trenutno_stanje"])
+
+class BudzetQuerySet(models.QuerySet):
+    def with_actual_spending(self):
+        """Anotira stvarnu potrošnju za svaki budžet u jednom upitu.
+
+        Mjesec, kvartal i godina svode se na raspon mjeseci (``_mjesec_od`` –
+        ``_mjesec_do``) pa se zbroj iz MjesecniSazetak dohvaća koreliranim
+        podupitom umjesto zasebnog upita po budžetu.
+        """
+        mjesec = Coalesce("mjesec", Value(1))
+        pocetak_kvartala = (mjesec - 1) / 3 * 3 + 1
+        qs = self.annotate(
+            _mjesec_od=Case(
+                When(period="GODINA", then=Value(1)),
+                When(period="KVARTAL", then=pocetak_kvartala),
+                default=mjesec,
+                output_field=models.IntegerField(),
+            ),
+            _mjesec_do=Case(
+                When(period="GODINA", then=Value(12)),
+                When(period="KVARTAL", then=pocetak_kvartala + 2),
+                default=mjesec,
+                output_field=models.IntegerField(),
+            ),
+        )
+        potrosnja = (MjesecniSazetak.objects
+                     .filter(korisnik=OuterRef("korisnik"),
+                             kategorija=OuterRef("kategorija"),
+                             godina=OuterRef("godina"),
+                             mjesec__gte=OuterRef("_mjesec_od"),
+                             mjesec__lte=OuterRef("_mjesec_do"))
+                     .order_by()
+                     .values("kategorija")
+                     .annotate(total=Sum("iznos"))
+                     .values("total"))
+        return qs.annotate(actual_spending=Coalesce(
+            Subquery(potrosnja, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+
 
 class Budzet(models.Model):
     PERIOD_CHOICES = (
@@ -82,9 +183,15 @@ class Budzet(models.Model):
     aktivno = models.BooleanField(default=True)
     datum_kreiranja = models.DateTimeField(auto_now_add=True)
 
+    objects = BudzetQuerySet.as_manager()
+
     class Meta:
         unique_together = ("korisnik", "kategorija", "godina", "mjesec", "period")
         ordering = ["-godina", "-mjesec", "kategorija__naziv"]
+        indexes = [
+            # admin: date_hierarchy
+            models.Index(fields=["datum_kreiranja"], name="budzet_datum_kreiranja"),
+        ]
 
     def __str__(self):
         if self.period == "GODINA":
@@ -103,9 +210,12 @@ class Budzet(models.Model):
 
     def get_actual_spending(self):
         """Vraća stvarni iznos potrošen u tom periodu"""
-        from django.db.models import Sum
         from datetime import date
-        
+
+        # Budžeti dohvaćeni preko with_actual_spending() već imaju iznos
+        if hasattr(self, "actual_spending"):
+            return abs(float(self.actual_spending))
+
         if self.period == "GODINA":
             start_date = date(self.godina, 1, 1)
             end_date = date(self.godina, 12, 31)
@@ -148,6 +258,104 @@ class Budzet(models.Model):
             return (self.get_actual_spending() / float(self.iznos)) * 100
         return 0
 
+# koraci ponavljanja po frekvenciji
+DAY_STEPS = {"DNEVNO": 1, "TJEDNO": 7}
+MONTH_STEPS = {"MJESECNO": 1, "KVARTALNO": 3, "GODISNJE": 12}
+
+
+def step_date(datum, frekvencija, dan):
+    """Datum ponavljanja nakon ``datum``.
+
+    Mjesečni koraci zadržavaju dan u mjesecu ``dan`` (dan početka pravila),
+    a u kraćim mjesecima uzimaju zadnji dan: 31.1. → 29.2. → 31.3.
+    Kvartalna pravila skaču na prvi mjesec sljedećeg kvartala.
+    """
+    if frekvencija in DAY_STEPS:
+        return datum + timedelta(days=DAY_STEPS[frekvencija])
+    mjesec = datum.year * 12 + datum.month - 1
+    if frekvencija == "KVARTALNO":
+        mjesec = (mjesec // 3 + 1) * 3
+    else:
+        mjesec += MONTH_STEPS[frekvencija]
+    godina, mjesec = divmod(mjesec, 12)
+    return date(godina, mjesec + 1, min(dan, calendar.monthrange(godina, mjesec + 1)[1]))
+
+
+class PonavljajucaTransakcijaQuerySet(models.QuerySet):
+    def shard(self, index, count):
+        """Pravila korisnika čiji id daje ostatak ``index`` pri dijeljenju s ``count``"""
+        return self.alias(shard=Mod("korisnik_id", count)).filter(shard=index)
+
+    def process_due(self, today=None, chunk_size=1000):
+        """Kreira sva dospjela ponavljanja (do danas ili datuma kraja).
+
+        Pravilo čiji je sljedeći datum prešao datum kraja postaje neaktivno.
+        Pravila se obrađuju u komadima od ``chunk_size``, svaki u vlastitoj
+        transakciji baze, a stanja ciljeva, računa i sažetaka usklađuju se
+        jednom po pogođenom retku. Sigurno je pokrenuti više procesa
+        istovremeno: gdje baza podržava, pravila se zaključavaju sa
+        SELECT ... FOR UPDATE SKIP LOCKED (drugi proces ih preskače), a inače
+        proces preuzima pravilo tek ako sljedeci_datum još nije promijenio
+        netko drugi. Jedinstveno ograničenje (ponavljajuca, datum) je zadnja
+        zaštita od duplikata. Vraća rječnik
+        {ponavljajuća transakcija: broj kreiranih transakcija}.
+        """
+        today = today or timezone.now().date()
+        zakljucaj = connections[self.db].features.has_select_for_update_skip_locked
+        due = self.filter(aktivno=True, sljedeci_datum__lte=today).order_by("sljedeci_datum", "pk")
+        obradjeno = {}
+        zadnji = None
+        while True:
+            with TransactionEffects.deferred():
+                chunk = due
+                if zadnji is not None:
+                    datum, pk = zadnji
+                    chunk = chunk.filter(Q(sljedeci_datum__gt=datum) | Q(sljedeci_datum=datum, pk__gt=pk))
+                if zakljucaj:
+                    chunk = chunk.select_for_update(skip_locked=True)
+                rules = list(chunk[:chunk_size])
+                if not rules:
+                    break
+                zadnji = (rules[-1].sljedeci_datum, rules[-1].pk)
+
+                batch = []
+                preuzeto = {}
+                for recurring in rules:
+                    dates = recurring.due_dates(today)
+                    prethodni = recurring.sljedeci_datum
+                    if dates:
+                        recurring.sljedeci_datum = recurring.calculate_next_date(dates[-1])
+                    # inače bi ostalo dospjelo i pregledavalo se pri svakom pokretanju
+                    istekao = recurring.datum_kraja is not None and recurring.sljedeci_datum > recurring.datum_kraja
+                    if not dates and not istekao:
+                        continue
+                    recurring.aktivno = not istekao
+                    if not zakljucaj and not self.model.objects.filter(
+                            pk=recurring.pk, sljedeci_datum=prethodni, aktivno=True).update(
+                            sljedeci_datum=recurring.sljedeci_datum, aktivno=recurring.aktivno):
+                        # drugi proces je u međuvremenu obradio ovo pravilo
+                        continue
+                    batch.extend(recurring.build_transaction(datum) for datum in dates)
+                    preuzeto[recurring] = len(dates)
+                if zakljucaj:
+                    self.model.objects.bulk_update(list(preuzeto), ["sljedeci_datum", "aktivno"], batch_size=chunk_size)
+                # bulk_update ne šalje signale, a obrađena ponavljanja ispadaju iz prognoze
+                transaction.on_commit(partial(bump_versions, RULES, [r.korisnik_id for r in preuzeto]))
+                if batch:
+                    # ponavljanja koja već postoje (npr. sljedeci_datum vraćen unatrag) se ne ponavljaju
+                    postojeca = set(Transakcija.objects
+                                    .filter(ponavljajuca__in=list(preuzeto), datum__gte=min(t.datum for t in batch))
+                                    .order_by()
+                                    .values_list("ponavljajuca_id", "datum"))
+                    if postojeca:
+                        batch = [t for t in batch if (t.ponavljajuca_id, t.datum) not in postojeca]
+                        broj = Counter(t.ponavljajuca_id for t in batch)
+                        preuzeto = {r: broj[r.pk] for r in preuzeto if broj[r.pk]}
+                Transakcija.objects.bulk_create_with_effects(batch, batch_size=chunk_size)
+                obradjeno.update({r: broj for r, broj in preuzeto.items() if broj})
+        return obradjeno
+
+
 class PonavljajucaTransakcija(models.Model):
     FREQUENCY_CHOICES = (
         ("DNEVNO", "Dnevno"),
@@ -158,7 +366,7 @@ class PonavljajucaTransakcija(models.Model):
     )
     korisnik = models.ForeignKey(User, on_delete=models.CASCADE)
     kategorija = models.ForeignKey(Kategorija, on_delete=models.CASCADE)
-    iznos = models.DecimalField(max_digits=12, decimal_places=2)
+    iznos = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))])
     opis = models.CharField(max_length=255)
     frekvencija = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
     datum_pocetka = models.DateField()
@@ -167,65 +375,649 @@ class PonavljajucaTransakcija(models.Model):
     sljedeci_datum = models.DateField()
     doprinos_cilju = models.ForeignKey(CiljStednje, null=True, blank=True, on_delete=models.SET_NULL)
 
+    objects = PonavljajucaTransakcijaQuerySet.as_manager()
+
     class Meta:
         ordering = ["sljedeci_datum"]
+        indexes = [
+            # djelomični indeks: Django filtrira aktivno=True kao WHERE "aktivno",
+            # što SQLite ne može spojiti sa složenim (aktivno, sljedeci_datum)
+            models.Index(fields=["sljedeci_datum"], condition=Q(aktivno=True), name="ponavljajuca_aktivno_datum"),
+            # admin: date_hierarchy preko svih, i neaktivnih
+            models.Index(fields=["sljedeci_datum"], name="ponavljajuca_datum"),
+        ]
+        constraints = [
+            models.CheckConstraint(check=Q(iznos__gt=0), name="ponavljajuca_pozitivan_iznos"),
+        ]
 
     def __str__(self):
         return f"{self.opis} - {self.iznos} ({self.get_frekvencija_display()})"
 
     def calculate_next_date(self, current_date):
-        """Izračunava sljedeći datum na temelju frekvencije"""
-        if self.frekvencija == "DNEVNO":
-            return current_date + timedelta(days=1)
-        elif self.frekvencija == "TJEDNO":
-            return current_date + timedelta(weeks=1)
-        elif self.frekvencija == "MJESECNO":
-            if current_date.month == 12:
-                return current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                return current_date.replace(month=current_date.month + 1)
-        elif self.frekvencija == "KVARTALNO":
-            if current_date.month in [1, 2, 3]:
-                return current_date.replace(month=4)
-            elif current_date.month in [4, 5, 6]:
-                return current_date.replace(month=7)
-            elif current_date.month in [7, 8, 9]:
-                return current_date.replace(month=10)
-            else:
-                return current_date.replace(year=current_date.year + 1, month=1)
-        elif self.frekvencija == "GODISNJE":
-            return current_date.replace(year=current_date.year + 1)
-        return current_date
-
-    def create_transaction(self):
-        """Kreira transakciju i ažurira sljedeći datum"""
-        if self.sljedeci_datum <= timezone.now().date():
-            Transakcija.objects.create(
-                korisnik=self.korisnik,
-                kategorija=self.kategorija,
-                iznos=self.iznos,
-                datum=self.sljedeci_datum,
-                opis=self.opis,
-                doprinos_cilju=self.doprinos_cilju
-            )
-            self.sljedeci_datum = self.calculate_next_date(self.sljedeci_datum)
-            self.save()
+        """Izračunava sljedeći datum na temelju frekvencije (vidi step_date)"""
+        if self.frekvencija not in DAY_STEPS and self.frekvencija not in MONTH_STEPS:
+            return current_date
+        return step_date(current_date, self.frekvencija, self.datum_pocetka.day)
+
+    def due_dates(self, today):
+        """Vraća sve dospjele datume od sljedeci_datum do danas (i datuma kraja)"""
+        granica = min(today, self.datum_kraja) if self.datum_kraja else today
+        dates = []
+        datum = self.sljedeci_datum
+        while datum <= granica:
+            dates.append(datum)
+            sljedeci = self.calculate_next_date(datum)
+            if sljedeci <= datum:
+                break
+            datum = sljedeci
+        return dates
+
+    def build_transaction(self, datum):
+        """Vraća (nespremljenu) transakciju za ponavljanje na zadani datum"""
+        return Transakcija(
+            korisnik_id=self.korisnik_id,
+            kategorija_id=self.kategorija_id,
+            iznos=self.iznos,
+            datum=datum,
+            opis=self.opis,
+            doprinos_cilju_id=self.doprinos_cilju_id,
+            ponavljajuca=self,
+        )
+
+class TransakcijaQuerySet(models.QuerySet):
+    def search(self, q, korisnik=None):
+        """Transakcije čiji opis, kategorija ili račun sadrže sve riječi iz q
+        (i kao početak riječi, bez obzira na dijakritike u SQLite FTS5).
+
+        Na SQLite koristi FTS5 indeks core_transakcija_fts (migracija 0008),
+        na ostalim bazama icontains. Uz korisnika pretražuje samo njegove retke
+        indeksa, što je puno brže kad riječ postoji kod mnogo korisnika.
+        """
+        rijeci = re.findall(r"\w+", q or "")
+        if not rijeci:
+            return self
+        qs = self if korisnik is None else self.filter(korisnik=korisnik)
+        if connections[self.db].vendor == "sqlite":
+            upit = "{opis kategorija racun} : (%s)" % " ".join(f'"{rijec}"*' for rijec in rijeci)
+            if korisnik is not None:
+                upit = f'korisnik : "k{getattr(korisnik, "pk", korisnik)}" AND {upit}'
+            return qs.filter(id__in=RawSQL(
+                "SELECT rowid FROM core_transakcija_fts WHERE core_transakcija_fts MATCH %s", (upit,)))
+        for rijec in rijeci:
+            qs = qs.filter(Q(opis__icontains=rijec) | Q(kategorija__naziv__icontains=rijec)
+                           | Q(racun__naziv__icontains=rijec))
+        return qs
+
+    def bulk_create_with_effects(self, objs, batch_size=1000):
+        """bulk_create za uvoz: stanja računa, ciljeva i sažetaka mijenjaju se
+        jednom po pogođenom retku umjesto jednom po transakciji.
+
+        bulk_create ne šalje signale, pa se utjecaj knjiži izravno kroz
+        TransactionEffects.
+        """
+        objs = list(objs)
+        with TransactionEffects.deferred() as effects:
+            created = self.bulk_create(objs, batch_size=batch_size)
+            for obj in objs:
+                effects.add(obj.ledger_state())
+        return created
+
+    def bulk_update_with_effects(self, objs, fields, batch_size=500):
+        """bulk_update s knjiženjem: stara stanja se čitaju jednim upitom po
+        komadu (zaključana gdje baza podržava) i poništavaju, a nova knjiže
+        jednom po pogođenom retku, kao kod bulk_create_with_effects.
+        """
+        objs = list(objs)
+        zakljucaj = connections[self.db].features.has_select_for_update
+        with TransactionEffects.deferred() as effects:
+            for i in range(0, len(objs), batch_size):
+                dio = objs[i:i + batch_size]
+                stara = self.filter(pk__in=[obj.pk for obj in dio]).order_by()
+                if zakljucaj:
+                    stara = stara.select_for_update()
+                stara = {s.pop("pk"): s for s in stara.values("pk", *Transakcija.LEDGER_FIELDS, tip=F("kategorija__tip"))}
+                for obj in dio:
+                    prethodno = stara[obj.pk]
+                    effects.add(prethodno, -1)
+                    effects.add(obj.ledger_state(prethodno["tip"] if prethodno["kategorija_id"] == obj.kategorija_id else None))
+            updated = self.bulk_update(objs, fields, batch_size=batch_size)
+        return updated
+
 
 class Transakcija(models.Model):
     korisnik = models.ForeignKey(User, on_delete=models.CASCADE)
     kategorija = models.ForeignKey(Kategorija, on_delete=models.PROTECT)
     racun = models.ForeignKey(Racun, on_delete=models.PROTECT, null=True, blank=True, related_name='transakcije')
-    iznos = models.DecimalField(max_digits=12, decimal_places=2)
+    # uvijek pozitivan, predznak daje tip kategorije (signed_amount)
+    iznos = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))])
     datum = models.DateField()
     opis = models.CharField(max_length=255, blank=True)
     doprinos_cilju = models.ForeignKey(CiljStednje, null=True, blank=True, on_delete=models.SET_NULL)
     ponavljajuca = models.ForeignKey(PonavljajucaTransakcija, null=True, blank=True, on_delete=models.SET_NULL)
+    # sha256 sadržaja retka iz uvoza, sprječava dvostruki uvoz istog izvoda
+    hash_uvoza = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    # Polja o kojima ovise izvedene tablice (sažeci, stanja)
+    LEDGER_FIELDS = ("korisnik_id", "kategorija_id", "racun_id", "doprinos_cilju_id", "datum", "iznos")
+
+    objects = TransakcijaQuerySet.as_manager()
 
     class Meta:
         ordering = ["-datum", "-id"]
+        indexes = [
+            # popis, izvoz i keyset stranice: korisnik + raspon datuma, -datum, -id
+            models.Index(fields=["korisnik", "datum"], name="transakcija_korisnik_datum"),
+            models.Index(fields=["korisnik", "kategorija", "datum"], name="transakcija_kor_kat_datum"),
+            # admin: popis svih transakcija (-datum, -id) i date_hierarchy
+            models.Index(fields=["datum"], name="transakcija_datum"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["korisnik", "hash_uvoza"], name="transakcija_jedinstven_uvoz"),
+            # jedno ponavljanje po datumu, i kad process_due pokrenu dva procesa
+            models.UniqueConstraint(fields=["ponavljajuca", "datum"], condition=Q(ponavljajuca__isnull=False),
+                                    name="transakcija_jedno_ponavljanje"),
+            # predznak daje tip kategorije; bulk_create/bulk_update i uvoz ne pokreću validatore
+            models.CheckConstraint(check=Q(iznos__gt=0), name="transakcija_pozitivan_iznos"),
+        ]
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Ažuriraj stanje računa ako je transakcija vezana za račun
-        if self.racun:
-            self.racun.update_balance()
+        # čitanje prethodnog stanja, upis i učinci (stanja, sažeci) u jednoj
+        # transakciji: jedno zaključavanje za pisanje i bez napola proknjižene izmjene
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            return super().delete(*args, **kwargs)
+
+    def ledger_state(self, tip=None):
+        """Vraća trenutne vrijednosti LEDGER_FIELDS i tip kategorije kao rječnik.
+
+        Ako kategorija nije učitana, tip ostaje None i TransactionEffects ga
+        dohvaća jednim upitom za sve transakcije odjednom.
+        """
+        if tip is None and self._meta.get_field("kategorija").is_cached(self):
+            tip = self.kategorija.tip
+        return {
+            "tip": tip,
+            "korisnik_id": self.korisnik_id,
+            "kategorija_id": self.kategorija_id,
+            "racun_id": self.racun_id,
+            "doprinos_cilju_id": self.doprinos_cilju_id,
+            "datum": self._meta.get_field("datum").to_python(self.datum),
+            "iznos": Decimal(str(self.iznos)).quantize(Decimal("0.01")),
+        }
+
+    @staticmethod
+    def signed_amount(stanje):
+        """Iznos s predznakom: prihod povećava, trošak smanjuje stanje"""
+        return stanje["iznos"] if stanje["tip"] == "PRIHOD" else -stanje["iznos"]
+
+    @staticmethod
+    def signed_sum():
+        """Agregat zbroja iznosa s predznakom (kao signed_amount) u bazi"""
+        return Sum(Case(When(kategorija__tip="PRIHOD", then=F("iznos")), default=-F("iznos")))
+
+
+class MjesecniSazetak(models.Model):
+    """Zbroj transakcija po korisniku, kategoriji, računu i mjesecu.
+
+    Održava se inkrementalno kroz TransactionEffects, a ``rebuild_rollup``
+    ga gradi ispočetka iz tablice transakcija.
+    """
+    korisnik = models.ForeignKey(User, on_delete=models.CASCADE)
+    kategorija = models.ForeignKey(Kategorija, on_delete=models.CASCADE)
+    racun = models.ForeignKey(Racun, on_delete=models.CASCADE, null=True, blank=True)
+    godina = models.IntegerField()
+    mjesec = models.IntegerField()
+    iznos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    broj = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["godina", "mjesec"]
+        # jedinstvena ograničenja su djelomična (racun NULL / nije NULL) pa ih
+        # upiti bez uvjeta na račun ne mogu koristiti
+        indexes = [
+            models.Index(fields=["korisnik", "godina", "mjesec"], name="sazetak_korisnik_mjesec"),
+            models.Index(fields=["korisnik", "kategorija", "godina", "mjesec"], name="sazetak_kor_kat_mjesec"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["korisnik", "godina", "mjesec", "kategorija", "racun"],
+                condition=Q(racun__isnull=False),
+                name="sazetak_jedinstven_po_racunu",
+            ),
+            models.UniqueConstraint(
+                fields=["korisnik", "godina", "mjesec", "kategorija"],
+                condition=Q(racun__isnull=True),
+                name="sazetak_jedinstven_bez_racuna",
+            ),
+        ]
+
+    # ispod ovoga apply_deltas radi upsert redak po redak
+    BULK_THRESHOLD = 20
+    # redaka po UPDATE ... CASE (5 parametara po retku, SQLite ograničenje je 999)
+    BULK_BATCH = 150
+
+    def __str__(self):
+        return f"{self.kategorija_id} {self.mjesec}/{self.godina}: {self.iznos}"
+
+    @classmethod
+    def apply_delta(cls, korisnik_id, kategorija_id, racun_id, godina, mjesec, iznos, broj):
+        """Atomarno dodaje iznos i broj transakcija u redak sažetka (upsert)"""
+        redak = cls.objects.filter(korisnik_id=korisnik_id, kategorija_id=kategorija_id,
+                                   racun_id=racun_id, godina=godina, mjesec=mjesec)
+        promjena = {"iznos": F("iznos") + iznos, "broj": F("broj") + broj}
+        if redak.update(**promjena):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(korisnik_id=korisnik_id, kategorija_id=kategorija_id,
+                                   racun_id=racun_id, godina=godina, mjesec=mjesec,
+                                   iznos=iznos, broj=broj)
+        except IntegrityError:
+            # netko je u međuvremenu kreirao isti redak
+            redak.update(**promjena)
+
+    @classmethod
+    def apply_deltas(cls, delte):
+        """apply_delta za mnogo redaka odjednom ({ključ: (iznos, broj)}).
+
+        Postojeći retci mijenjaju se s nekoliko UPDATE ... CASE upita, a novi
+        se kreiraju s bulk_create, umjesto dva upita po retku.
+        """
+        if len(delte) < cls.BULK_THRESHOLD:
+            for kljuc, (iznos, broj) in delte.items():
+                cls.apply_delta(*kljuc, iznos, broj)
+            return
+        godine = [kljuc[3] for kljuc in delte]
+        postojeci = {
+            (r["korisnik_id"], r["kategorija_id"], r["racun_id"], r["godina"], r["mjesec"]): r["pk"]
+            for r in cls.objects.filter(korisnik_id__in={kljuc[0] for kljuc in delte},
+                                        godina__gte=min(godine), godina__lte=max(godine))
+                                .values("pk", "korisnik_id", "kategorija_id", "racun_id", "godina", "mjesec")
+        }
+        izmjene = [(postojeci[kljuc], delta) for kljuc, delta in delte.items() if kljuc in postojeci]
+        for i in range(0, len(izmjene), cls.BULK_BATCH):
+            dio = izmjene[i:i + cls.BULK_BATCH]
+            cls.objects.filter(pk__in=[pk for pk, _ in dio]).update(
+                iznos=F("iznos") + Case(*[When(pk=pk, then=Value(iznos)) for pk, (iznos, _) in dio],
+                                        output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+                broj=F("broj") + Case(*[When(pk=pk, then=Value(broj)) for pk, (_, broj) in dio],
+                                      output_field=models.IntegerField()),
+            )
+        novi = {kljuc: delta for kljuc, delta in delte.items() if kljuc not in postojeci}
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create([
+                    cls(korisnik_id=kljuc[0], kategorija_id=kljuc[1], racun_id=kljuc[2], godina=kljuc[3],
+                        mjesec=kljuc[4], iznos=iznos, broj=broj)
+                    for kljuc, (iznos, broj) in novi.items()
+                ], batch_size=cls.BULK_BATCH)
+        except IntegrityError:
+            # netko je u međuvremenu kreirao neki od redaka
+            for kljuc, (iznos, broj) in novi.items():
+                cls.apply_delta(*kljuc, iznos, broj)
+
+    @classmethod
+    def rebuild(cls, korisnik=None):
+        """Gradi sažetak ispočetka iz transakcija, vraća broj redaka"""
+        transakcije = Transakcija.objects.order_by()
+        sazetci = cls.objects.all()
+        if korisnik is not None:
+            transakcije = transakcije.filter(korisnik=korisnik)
+            sazetci = sazetci.filter(korisnik=korisnik)
+        redovi = (transakcije
+                  .annotate(godina=ExtractYear("datum"), mjesec=ExtractMonth("datum"))
+                  .values("korisnik", "kategorija", "racun", "godina", "mjesec")
+                  .annotate(ukupno=Sum("iznos"), broj=Count("id")))
+        with transaction.atomic():
+            sazetci.delete()
+            novi = cls.objects.bulk_create([
+                cls(korisnik_id=r["korisnik"], kategorija_id=r["kategorija"], racun_id=r["racun"],
+                    godina=r["godina"], mjesec=r["mjesec"], iznos=r["ukupno"], broj=r["broj"])
+                for r in redovi
+            ], batch_size=1000)
+        return len(novi)
+
+
+class DnevnoStanje(models.Model):
+    """Promet računa po danu i ukupni promet do kraja tog dana.
+
+    Stanje računa na neki dan je pocetno_stanje + kumulativ zadnjeg retka
+    s datumom do tog dana, jedan upit po indeksu (vidi Racun.balance_on).
+    Održava se kroz TransactionEffects: transakcija s ranijim datumom pomiče
+    kumulativ svih kasnijih dana jednim UPDATE-om. ``rebuild_rollup`` ga
+    gradi ispočetka.
+    """
+    racun = models.ForeignKey(Racun, on_delete=models.CASCADE, related_name="dnevna_stanja")
+    datum = models.DateField()
+    promjena = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    kumulativ = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["racun", "datum"]
+        constraints = [
+            models.UniqueConstraint(fields=["racun", "datum"], name="dnevno_stanje_jedinstveno"),
+        ]
+
+    # redaka po UPDATE ... CASE (4 parametra po retku, SQLite ograničenje je 999)
+    BULK_BATCH = 150
+
+    def __str__(self):
+        return f"{self.racun_id} {self.datum}: {self.kumulativ}"
+
+    @classmethod
+    def apply_deltas(cls, delte):
+        """Knjiži promjene stanja ({(racun_id, datum): iznos s predznakom}).
+
+        Svaka promjena povećava kumulativ svih dana od svog datuma nadalje.
+        Po računu se čitaju retci u rasponu datuma promjena i zadnji redak
+        prije njega; dani nakon raspona pomiču se jednim UPDATE-om za zbroj
+        svih promjena, postojeći dani unutar raspona s UPDATE ... CASE, a
+        dani bez retka kreiraju se s bulk_create.
+        """
+        po_racunu = defaultdict(dict)
+        for (racun_id, datum), iznos in delte.items():
+            if iznos:
+                po_racunu[racun_id][datum] = iznos
+        if not po_racunu:
+            return
+        if connections[cls.objects.db].features.has_select_for_update:
+            # istovremene izmjene istog računa čekaju jedna drugu
+            list(Racun.objects.select_for_update().filter(pk__in=list(po_racunu)).values_list("pk"))
+        iznos = models.DecimalField(max_digits=14, decimal_places=2)
+        novi = []
+        for racun_id, promjene in po_racunu.items():
+            datumi = sorted(promjene)
+            retci = cls.objects.filter(racun_id=racun_id)
+            prethodni = retci.filter(datum__lt=datumi[0]).order_by("-datum").values("datum")[:1]
+            postojeci = {datum: (pk, kumulativ) for pk, datum, kumulativ in (
+                retci.filter(Q(datum__gte=datumi[0], datum__lte=datumi[-1]) | Q(datum=Subquery(prethodni)))
+                .order_by().values_list("pk", "datum", "kumulativ"))}
+            retci.filter(datum__gt=datumi[-1]).update(kumulativ=F("kumulativ") + sum(promjene.values()))
+
+            # kumulativ novog dana: stari kumulativ zadnjeg ranijeg retka + promjene do tog dana
+            izmjene = []
+            osnova = Decimal("0")
+            zbroj = Decimal("0")
+            for datum in sorted(set(postojeci) | set(datumi)):
+                zbroj += promjene.get(datum, 0)
+                if datum not in postojeci:
+                    novi.append(cls(racun_id=racun_id, datum=datum, promjena=promjene[datum], kumulativ=osnova + zbroj))
+                    continue
+                pk, osnova = postojeci[datum]
+                if datum >= datumi[0]:
+                    izmjene.append((pk, zbroj, promjene.get(datum, Decimal("0"))))
+            for i in range(0, len(izmjene), cls.BULK_BATCH):
+                dio = izmjene[i:i + cls.BULK_BATCH]
+                cls.objects.filter(pk__in=[pk for pk, _, _ in dio]).update(
+                    kumulativ=F("kumulativ") + Case(*[When(pk=pk, then=Value(k)) for pk, k, _ in dio], output_field=iznos),
+                    promjena=F("promjena") + Case(*[When(pk=pk, then=Value(p)) for pk, _, p in dio], output_field=iznos),
+                )
+        cls.objects.bulk_create(novi, batch_size=cls.BULK_BATCH)
+
+    @classmethod
+    def rebuild(cls, korisnik=None):
+        """Gradi dnevna stanja ispočetka iz transakcija, vraća broj redaka"""
+        transakcije = Transakcija.objects.filter(racun__isnull=False).order_by()
+        stanja = cls.objects.all()
+        if korisnik is not None:
+            transakcije = transakcije.filter(korisnik=korisnik)
+            stanja = stanja.filter(racun__korisnik=korisnik)
+        redovi = (transakcije
+                  .values("racun", "datum")
+                  .annotate(promjena=Transakcija.signed_sum())
+                  .order_by("racun_id", "datum"))
+        novi = []
+        racun_id = None
+        for r in redovi:
+            if r["racun"] != racun_id:
+                racun_id, kumulativ = r["racun"], Decimal("0")
+            kumulativ += r["promjena"]
+            novi.append(cls(racun_id=racun_id, datum=r["datum"], promjena=r["promjena"], kumulativ=kumulativ))
+        with transaction.atomic():
+            stanja.delete()
+            cls.objects.bulk_create(novi, batch_size=1000)
+        return len(novi)
+
+    @classmethod
+    def rebuild_account(cls, racun_id, od=None):
+        """Gradi dnevna stanja jednog računa ispočetka ili od datuma ``od``.
+
+        Raniji retci ostaju, kumulativ se nastavlja od zadnjeg prije ``od``.
+        Vraća kumulativ zadnjeg dana (ukupni promet računa).
+        """
+        stanja = cls.objects.filter(racun_id=racun_id)
+        transakcije = Transakcija.objects.filter(racun_id=racun_id).order_by()
+        kumulativ = Decimal("0")
+        if od is not None:
+            kumulativ = stanja.filter(datum__lt=od).order_by("-datum").values_list("kumulativ", flat=True).first() or kumulativ
+            stanja = stanja.filter(datum__gte=od)
+            transakcije = transakcije.filter(datum__gte=od)
+        novi = []
+        for datum, promjena in (transakcije.values("datum").annotate(promjena=Transakcija.signed_sum())
+                                .order_by("datum").values_list("datum", "promjena")):
+            kumulativ += promjena
+            novi.append(cls(racun_id=racun_id, datum=datum, promjena=promjena, kumulativ=kumulativ))
+        with transaction.atomic():
+            stanja.delete()
+            cls.objects.bulk_create(novi, batch_size=1000)
+        return kumulativ
+
+
+_odgodeni_effects = ContextVar("odgodeni_effects", default=None)
+
+
+class TransactionEffects:
+    """Skuplja utjecaj transakcija na izvedene tablice i primjenjuje ga odjednom.
+
+    Stanja (vidi Transakcija.ledger_state) se dodaju s predznakom +1 (nova
+    vrijednost) ili -1 (stara vrijednost), a apply() radi po jedan UPDATE za
+    svaki pogođeni redak, bez obzira na broj transakcija.
+    """
+
+    def __init__(self):
+        self.sazetci = defaultdict(lambda: [Decimal("0"), 0])
+        self.racuni = defaultdict(Decimal)
+        self.dnevna = defaultdict(Decimal)
+        self.ciljevi = defaultdict(Decimal)
+        # korisnik računa i cilja, za poslove u redu (BACKGROUND_BOOKKEEPING)
+        self.vlasnici = {}
+        self.bez_tipa = []
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """Skupljač za jednu izmjenu; unutar deferred() vraća zajednički"""
+        odgodeni = _odgodeni_effects.get()
+        if odgodeni is not None:
+            yield odgodeni
+            return
+        effects = cls()
+        yield effects
+        effects.apply()
+
+    @classmethod
+    @contextmanager
+    def deferred(cls):
+        """Skupne izmjene: save()/delete() unutar bloka knjiže se jednom na kraju.
+
+        Primjer::
+
+            with TransactionEffects.deferred():
+                for t in transakcije:
+                    t.save()
+        """
+        odgodeni = _odgodeni_effects.get()
+        if odgodeni is not None:
+            yield odgodeni
+            return
+        effects = cls()
+        token = _odgodeni_effects.set(effects)
+        try:
+            with transaction.atomic():
+                yield effects
+                effects.apply()
+        finally:
+            _odgodeni_effects.reset(token)
+
+    def add(self, stanje, predznak=1):
+        datum = stanje["datum"]
+        kljuc = (stanje["korisnik_id"], stanje["kategorija_id"], stanje["racun_id"],
+                 datum.year, datum.month)
+        sazetak = self.sazetci[kljuc]
+        sazetak[0] += predznak * stanje["iznos"]
+        sazetak[1] += predznak
+        if not (stanje["racun_id"] or stanje["doprinos_cilju_id"]):
+            return
+        if stanje["tip"] is None:
+            self.bez_tipa.append((stanje, predznak))
+        else:
+            self._add_balances(stanje, predznak)
+
+    def _add_balances(self, stanje, predznak):
+        if stanje["racun_id"]:
+            self.racuni[stanje["racun_id"]] += predznak * Transakcija.signed_amount(stanje)
+            self.dnevna[(stanje["racun_id"], stanje["datum"])] += predznak * Transakcija.signed_amount(stanje)
+            self.vlasnici[(Posao.RACUN, stanje["racun_id"])] = stanje["korisnik_id"]
+        if stanje["doprinos_cilju_id"]:
+            self.ciljevi[stanje["doprinos_cilju_id"]] += predznak * Transakcija.signed_amount(stanje)
+            self.vlasnici[(Posao.CILJ, stanje["doprinos_cilju_id"])] = stanje["korisnik_id"]
+
+    def apply(self):
+        if self.bez_tipa:
+            tipovi = dict(Kategorija.objects.filter(pk__in={s["kategorija_id"] for s, _ in self.bez_tipa})
+                          .values_list("pk", "tip"))
+            bez_tipa, self.bez_tipa = self.bez_tipa, []
+            for stanje, predznak in bez_tipa:
+                self._add_balances({**stanje, "tip": tipovi[stanje["kategorija_id"]]}, predznak)
+        with transaction.atomic():
+            if settings.BACKGROUND_BOOKKEEPING:
+                self._enqueue_balances()
+            else:
+                for racun_id, delta in self.racuni.items():
+                    if delta:
+                        Racun.adjust_balance(racun_id, delta)
+                for cilj_id, delta in self.ciljevi.items():
+                    if delta:
+                        CiljStednje.adjust_balance(cilj_id, delta)
+                DnevnoStanje.apply_deltas(self.dnevna)
+            MjesecniSazetak.apply_deltas({kljuc: delta for kljuc, delta in self.sazetci.items() if any(delta)})
+            # spremljeni pregledi pogođenih korisnika više ne vrijede
+            korisnici = {kljuc[0] for kljuc in self.sazetci}
+            transaction.on_commit(lambda: bump_versions(DATA, korisnici))
+
+    def _enqueue_balances(self):
+        # stanja računa i ciljeva usklađuje run_worker; izmjene istog računa
+        # spajaju se u jedan posao koji kreće od najranijeg promijenjenog dana
+        od = {}
+        for (racun_id, datum), delta in self.dnevna.items():
+            if delta:
+                od[racun_id] = min(od.get(racun_id, datum), datum)
+        for racun_id, datum in od.items():
+            Posao.enqueue(Posao.RACUN, racun_id, self.vlasnici[(Posao.RACUN, racun_id)], od_datuma=datum)
+        for cilj_id, delta in self.ciljevi.items():
+            if delta:
+                Posao.enqueue(Posao.CILJ, cilj_id, self.vlasnici[(Posao.CILJ, cilj_id)])
+
+
+class PosaoQuerySet(models.QuerySet):
+    def run_pending(self, limit=None):
+        """Obrađuje dospjele poslove redom, svaki u vlastitoj transakciji.
+
+        Gdje baza podržava, posao se zaključava sa SELECT ... FOR UPDATE SKIP
+        LOCKED pa više workera radi istovremeno. Obrađeni posao se briše samo
+        ako mu se broj nije promijenio; izmjena spojena u posao za vrijeme
+        obrade ostavlja ga za sljedeći krug. Neuspjeli posao se ponavlja
+        kasnije (2^pokušaja sekundi, najviše sat). Vraća (obrađeno, neuspjelo).
+        """
+        zakljucaj = connections[self.db].features.has_select_for_update_skip_locked
+        obradjeno = neuspjelo = 0
+        while limit is None or obradjeno + neuspjelo < limit:
+            with transaction.atomic():
+                qs = self.filter(zakazano__lte=timezone.now()).order_by("zakazano", "pk")
+                if zakljucaj:
+                    qs = qs.select_for_update(skip_locked=True)
+                posao = qs.first()
+                if posao is None:
+                    break
+                try:
+                    with transaction.atomic():
+                        posao.run()
+                except Exception as e:
+                    logger.exception("Posao %s nije uspio", posao)
+                    posao.pokusaji += 1
+                    posao.greska = f"{type(e).__name__}: {e}"
+                    posao.zakazano = timezone.now() + timedelta(seconds=min(2 ** posao.pokusaji, 3600))
+                    posao.save(update_fields=["pokusaji", "greska", "zakazano"])
+                    neuspjelo += 1
+                    continue
+                self.filter(pk=posao.pk, broj=posao.broj).delete()
+                transaction.on_commit(partial(bump_versions, DATA, [posao.korisnik_id]))
+                obradjeno += 1
+        return obradjeno, neuspjelo
+
+
+class Posao(models.Model):
+    """Knjigovodstveni posao u redu u bazi (obrađuje ga ``run_worker``).
+
+    Uz BACKGROUND_BOOKKEEPING spremanje transakcije ne mijenja stanja računa
+    i ciljeva nego zakazuje njihovo usklađivanje. Za svaki račun i cilj
+    postoji najviše jedan zakazani posao: nove izmjene ga samo spajaju
+    (broj + 1, najraniji datum), pa tisuću izmjena istog računa postaje
+    jedno usklađivanje.
+    """
+    RACUN = "RACUN"
+    CILJ = "CILJ"
+    VRSTA_CHOICES = ((RACUN, "Stanje računa"), (CILJ, "Stanje cilja"))
+
+    vrsta = models.CharField(max_length=10, choices=VRSTA_CHOICES)
+    objekt_id = models.PositiveBigIntegerField()
+    korisnik = models.ForeignKey(User, on_delete=models.CASCADE)
+    # najraniji dan od kojeg treba ponovno izgraditi dnevna stanja računa
+    od_datuma = models.DateField(null=True, blank=True)
+    # broj spojenih izmjena, ujedno verzija posla za brisanje nakon obrade
+    broj = models.IntegerField(default=1)
+    zakazano = models.DateTimeField(default=timezone.now)
+    pokusaji = models.IntegerField(default=0)
+    greska = models.TextField(blank=True)
+    kreirano = models.DateTimeField(auto_now_add=True)
+
+    objects = PosaoQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["zakazano", "pk"]
+        indexes = [
+            models.Index(fields=["zakazano"], name="posao_zakazano"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["vrsta", "objekt_id"], name="posao_jedinstven"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_vrsta_display()} {self.objekt_id} ({self.broj})"
+
+    @classmethod
+    def enqueue(cls, vrsta, objekt_id, korisnik_id, od_datuma=None):
+        """Zakazuje posao ili ga spaja s već zakazanim za isti objekt (upsert)"""
+        posao = cls.objects.filter(vrsta=vrsta, objekt_id=objekt_id)
+        promjena = {"broj": F("broj") + 1}
+        if od_datuma is not None:
+            promjena["od_datuma"] = Least(F("od_datuma"), Value(od_datuma))
+        if posao.update(**promjena):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(vrsta=vrsta, objekt_id=objekt_id, korisnik_id=korisnik_id, od_datuma=od_datuma)
+        except IntegrityError:
+            # netko je u međuvremenu zakazao isti posao
+            posao.update(**promjena)
+
+    def run(self):
+        if self.vrsta == self.RACUN:
+            Racun.refresh_balance(self.objekt_id, self.od_datuma)
+        elif self.vrsta == self.CILJ:
+            CiljStednje.refresh_balance(self.objekt_id)
+        else:
+            raise ValueError(f"Nepoznata vrsta posla: {self.vrsta}")
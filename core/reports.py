@@ -0,0 +1,353 @@
+"""Izračuni za pregled (dashboard), po jedan za svaki widget.
+
+Svaka funkcija vraća rječnik spreman za predložak ili JSON, bez lijenih
+querysetova, pa se rezultat može spremiti u cache.
+"""
+from datetime import date, timedelta
+import asyncio
+import calendar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Q, Sum
+
+from .analytics import cached_analytics
+from .caching import DATA, count, get_version
+from .models import Budzet, CiljStednje, MjesecniSazetak, PonavljajucaTransakcija, Racun
+
+
+def month_totals(user, today):
+    """Prihodi, troškovi i razlika tekućeg mjeseca"""
+    totals = dict(MjesecniSazetak.objects
+                  .filter(korisnik=user, broj__gt=0, godina=today.year, mjesec=today.month)
+                  .values("kategorija__tip")
+                  .annotate(total=Sum("iznos"))
+                  .values_list("kategorija__tip", "total"))
+    prihodi = float(totals.get("PRIHOD") or 0)
+    troskovi = abs(float(totals.get("TROSAK") or 0))
+    return {"prihodi": prihodi, "troskovi": troskovi, "stanje": prihodi - troskovi}
+
+
+def month_history(user, today):
+    """Prihodi i troškovi po mjesecima (BAR graf)"""
+    # cijeli tekući mjesec
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    end_of_month = date(today.year, today.month, last_day)
+
+    year_ago = today.replace(day=1) - timedelta(days=365)
+    hist = (MjesecniSazetak.objects
+            .filter(korisnik=user, broj__gt=0)
+            .filter(Q(godina__gt=year_ago.year) | Q(godina=year_ago.year, mjesec__gte=year_ago.month))
+            .filter(Q(godina__lt=today.year) | Q(godina=today.year, mjesec__lte=today.month))
+            .values("godina", "mjesec", "kategorija__tip")
+            .annotate(total=Sum("iznos"))
+            .order_by("godina", "mjesec"))
+
+    months = []
+    inc = {}
+    exp = {}
+    cur = year_ago.replace(day=1)
+    while cur <= end_of_month:
+        key = cur.strftime("%Y-%m")
+        months.append(key)
+        inc[key] = 0.0
+        exp[key] = 0.0
+        if cur.month == 12:
+            cur = cur.replace(year=cur.year + 1, month=1)
+        else:
+            cur = cur.replace(month=cur.month + 1)
+
+    for row in hist:
+        key = f'{row["godina"]:04d}-{row["mjesec"]:02d}'
+        val = float(row["total"] or 0)
+        if row["kategorija__tip"] == "PRIHOD":
+            inc[key] += val
+        else:
+            exp[key] += val
+
+    return {
+        "bar_labels": [f'{k.split("-")[1]}.{k.split("-")[0]}' for k in months],
+        "bar_prihodi": [inc[k] for k in months],
+        "bar_troskovi": [exp[k] for k in months],
+    }
+
+
+def expense_pie(user, today):
+    """Troškovi tekućeg mjeseca po kategorijama (PIE graf)"""
+    pie_qs = (MjesecniSazetak.objects
+              .filter(korisnik=user, broj__gt=0, godina=today.year, mjesec=today.month, kategorija__tip="TROSAK")
+              .values("kategorija__naziv")
+              .annotate(total=Sum("iznos"))
+              .order_by("-total"))
+    return {
+        "pie_labels": [x["kategorija__naziv"] for x in pie_qs],
+        "pie_values": [abs(float(x["total"])) for x in pie_qs],
+    }
+
+
+def budget_summary(user, today):
+    """Budžeti tekućeg mjeseca sa stvarnom potrošnjom"""
+    budgets = Budzet.objects.filter(
+        korisnik=user,
+        godina=today.year,
+        mjesec=today.month,
+        aktivno=True
+    ).select_related("kategorija").with_actual_spending()
+
+    summary = []
+    total_budget = 0
+    total_spent = 0
+    over_budget_count = 0
+
+    for budget in budgets:
+        actual_spending = budget.get_actual_spending()
+        remaining = budget.get_remaining_budget()
+        percentage_used = budget.get_percentage_used()
+
+        summary.append({
+            'budget': budget,
+            'actual': actual_spending,
+            'remaining': remaining,
+            'percentage': percentage_used,
+            'status': 'over' if remaining < 0 else 'warning' if percentage_used > 80 else 'under'
+        })
+
+        total_budget += float(budget.iznos)
+        total_spent += actual_spending
+        if remaining < 0:
+            over_budget_count += 1
+
+    return {
+        "budget_summary": summary,
+        "total_budget": total_budget,
+        "total_spent": total_spent,
+        "over_budget_count": over_budget_count,
+    }
+
+
+def accounts(user):
+    racuni = list(Racun.objects.filter(korisnik=user, aktivno=True))
+    return {
+        "racuni": racuni,
+        "total_account_balance": sum(float(racun.trenutno_stanje) for racun in racuni),
+    }
+
+
+def account_total(user):
+    ukupno = Racun.objects.filter(korisnik=user, aktivno=True).aggregate(ukupno=Sum("trenutno_stanje"))["ukupno"]
+    return {"total_account_balance": float(ukupno or 0)}
+
+
+def goals(user):
+    return {"ciljevi": list(CiljStednje.objects.filter(korisnik=user).order_by("naziv"))}
+
+
+def recurring_count(user):
+    return {"recurring_count": PonavljajucaTransakcija.objects.filter(korisnik=user, aktivno=True).count()}
+
+
+def budget_analysis_data(user, today):
+    """Godišnji budžeti grupirani po kategoriji (analiza budžeta)"""
+    # Dohvati sve aktivne budžete za trenutnu godinu
+    budgets = Budzet.objects.filter(
+        korisnik=user,
+        godina=today.year,
+        aktivno=True
+    ).select_related('kategorija').with_actual_spending().order_by('period', 'mjesec', 'kategorija__naziv')
+
+    # Grupiraj budžete po kategoriji
+    budget_groups = {}
+    for budget in budgets:
+        kategorija_naziv = budget.kategorija.naziv
+        if kategorija_naziv not in budget_groups:
+            budget_groups[kategorija_naziv] = {
+                'kategorija': budget.kategorija,
+                'total_budget': 0,
+                'total_actual': 0,
+                'budgets': []
+            }
+
+        actual_spending = budget.get_actual_spending()
+        budget_groups[kategorija_naziv]['total_budget'] += float(budget.iznos)
+        budget_groups[kategorija_naziv]['total_actual'] += actual_spending
+        budget_groups[kategorija_naziv]['budgets'].append(budget)
+
+    # Kreiraj budget_data za prikaz
+    budget_data = []
+    for kategorija_naziv, group in budget_groups.items():
+        total_remaining = group['total_budget'] - group['total_actual']
+        percentage_used = (group['total_actual'] / group['total_budget'] * 100) if group['total_budget'] > 0 else 0
+
+        budget_data.append({
+            'kategorija_naziv': kategorija_naziv,
+            'kategorija': group['kategorija'],
+            'total_budget': group['total_budget'],
+            'actual': group['total_actual'],
+            'remaining': total_remaining,
+            'percentage': percentage_used,
+            'status': 'over' if total_remaining < 0 else 'under' if percentage_used < 80 else 'warning',
+            'budgets': group['budgets']
+        })
+    return budget_data
+
+
+def dashboard_context(user, today):
+    """Okvir pregleda: samo brojke iz sažetaka i kratki popisi; grafovi,
+    budžeti i računi dolaze zasebno iz WIDGETS"""
+    context = {"current_month": today.month, "current_year": today.year}
+    context.update(month_totals(user, today))
+    context.update(account_total(user))
+    context.update(goals(user))
+    context.update(recurring_count(user))
+    return context
+
+
+def in_thread(fn, *args):
+    """Pokreće fn u zasebnoj dretvi s vlastitom vezom prema bazi.
+
+    Djangov async ORM sve upite izvršava u jednoj dretvi, jedan za drugim;
+    thread_sensitive=False dopušta da se neovisni upiti izvršavaju
+    istovremeno. Veza se nakon toga zatvara prema CONN_MAX_AGE.
+    """
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)()
+
+
+async def adashboard_context(user, today):
+    """dashboard_context s widgetima izračunatima istovremeno"""
+    dijelovi = await asyncio.gather(
+        in_thread(month_totals, user, today),
+        in_thread(account_total, user),
+        in_thread(goals, user),
+        in_thread(recurring_count, user),
+    )
+    context = {"current_month": today.month, "current_year": today.year}
+    for dio in dijelovi:
+        context.update(dio)
+    return context
+
+
+def dashboard_cache_key(user, today):
+    return f"dashboard:{user.pk}:{get_version(DATA, user.pk)}:{today.isoformat()}"
+
+
+def cached_dashboard_context(user, today):
+    """dashboard_context iz cachea; ključ sadrži verziju podataka korisnika,
+    koju signali podižu pri svakoj promjeni (vidi core.caching)"""
+    key = dashboard_cache_key(user, today)
+    context = cache.get(key)
+    if context is None:
+        count("dashboard_miss")
+        context = dashboard_context(user, today)
+        cache.set(key, context, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        count("dashboard_hit")
+    return context
+
+
+async def acached_dashboard_context(user, today):
+    key = await sync_to_async(dashboard_cache_key)(user, today)
+    context = await cache.aget(key)
+    if context is None:
+        await sync_to_async(count)("dashboard_miss")
+        context = await adashboard_context(user, today)
+        await cache.aset(key, context, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        await sync_to_async(count)("dashboard_hit")
+    return context
+
+
+# JSON widgeti: svaki se dohvaća zasebno (fetch) pa ih preglednik učitava paralelno
+
+def summary_widget(user, today):
+    data = month_totals(user, today)
+    data.update(account_total(user))
+    return {
+        "prihodi": data["prihodi"],
+        "troskovi": data["troskovi"],
+        "stanje": data["stanje"],
+        "na_racunima": data["total_account_balance"],
+    }
+
+
+def bar_widget(user, today):
+    data = month_history(user, today)
+    return {"labels": data["bar_labels"], "prihodi": data["bar_prihodi"], "troskovi": data["bar_troskovi"]}
+
+
+def pie_widget(user, today):
+    data = expense_pie(user, today)
+    return {"labels": data["pie_labels"], "values": data["pie_values"]}
+
+
+def budgets_widget(user, today):
+    data = budget_summary(user, today)
+    return {
+        "ukupno": data["total_budget"],
+        "potroseno": data["total_spent"],
+        "prekoraceno": data["over_budget_count"],
+        "budzeti": [{
+            "kategorija": x["budget"].kategorija.naziv,
+            "iznos": float(x["budget"].iznos),
+            "potroseno": x["actual"],
+            "preostalo": x["remaining"],
+            "postotak": x["percentage"],
+            "status": x["status"],
+        } for x in data["budget_summary"]],
+    }
+
+
+def accounts_widget(user, today):
+    return {"racuni": [{
+        "naziv": racun.naziv,
+        "tip": racun.get_tip_display(),
+        "stanje": float(racun.trenutno_stanje),
+    } for racun in accounts(user)["racuni"]]}
+
+
+def goals_widget(user, today):
+    return {"ciljevi": [{
+        "naziv": cilj.naziv,
+        "stanje": float(cilj.trenutno_stanje),
+        "cilj": float(cilj.cilj_iznos),
+        "postotak": cilj.progress(),
+    } for cilj in goals(user)["ciljevi"]]}
+
+
+def budget_analysis_chart(budget_data):
+    """Grupe iz budget_analysis_data u obliku za graf (JSON)"""
+    return {"kategorije": [{
+        "kategorija": x["kategorija_naziv"],
+        "planirano": x["total_budget"],
+        "potroseno": x["actual"],
+        "preostalo": x["remaining"],
+        "postotak": x["percentage"],
+        "status": x["status"],
+    } for x in budget_data]}
+
+
+def budget_analysis_widget(user, today):
+    return budget_analysis_chart(budget_analysis_data(user, today))
+
+
+def analytics_widget(user, today):
+    data = cached_analytics(user, today)
+    return {key: data[key] for key in ("mjeseci", "prihodi", "troskovi", "prosjeci", "promjena_godisnje")}
+
+
+WIDGETS = {
+    "pregled": summary_widget,
+    "prihodi-troskovi": bar_widget,
+    "troskovi-po-kategorijama": pie_widget,
+    "budzeti": budgets_widget,
+    "racuni": accounts_widget,
+    "ciljevi": goals_widget,
+    "analiza-budzeta": budget_analysis_widget,
+    "analitika": analytics_widget,
+}
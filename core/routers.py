@@ -0,0 +1,87 @@
+"""Čitanje izvještaja s replike baze.
+
+View-ovi označeni s @replica_reads (pregled, analiza, izvoz) čitaju s baze
+settings.REPLICA_DATABASE ako je konfigurirana; sve ostalo, i svi zapisi,
+ide na default. Baza za čitanje drži se u ContextVar pa vrijedi i za upite
+iz sync_to_async dretvi i za StreamingHttpResponse koji se čita nakon view-a.
+Korisnik koji je upravo nešto promijenio čita s primarne baze dok replika ne
+sustigne (settings.REPLICA_LAG), jer bi inače spremio zastarjeli pregled pod
+novu verziju podataka.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .caching import DATA, get_version
+
+_baza_za_citanje = ContextVar("baza_za_citanje", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _baza_za_citanje.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replika je kopija primarne baze, objekti s obje strane su isti retci
+        return True
+
+
+@contextmanager
+def reading_from(alias):
+    """Upiti za čitanje unutar bloka idu na ``alias`` (None = default)"""
+    token = _baza_za_citanje.set(alias)
+    try:
+        yield
+    finally:
+        _baza_za_citanje.reset(token)
+
+
+def replica_for(user):
+    """Alias replike za korisnika ili None ako treba čitati s primarne baze"""
+    alias = settings.REPLICA_DATABASE
+    if alias not in settings.DATABASES or not user.is_authenticated:
+        return None
+    # verzija podataka je vrijeme zadnje promjene (ns), vidi core.caching
+    if time.time() - get_version(DATA, user.pk) / 1e9 < settings.REPLICA_LAG:
+        return None
+    return alias
+
+
+def _stream(content, alias):
+    # svaki komad se čita s replike, bez da baza za čitanje "procuri" između komada
+    content = iter(content)
+    while True:
+        with reading_from(alias):
+            try:
+                chunk = next(content)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def replica_reads(view):
+    """Dekorator za view-ove koji samo čitaju (ide ispod @login_required)"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            alias = await sync_to_async(replica_for)(await request.auser())
+            with reading_from(alias):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = replica_for(request.user)
+        with reading_from(alias):
+            response = view(request, *args, **kwargs)
+        if alias and response.streaming:
+            response.streaming_content = _stream(response.streaming_content, alias)
+        return response
+    return wrapper
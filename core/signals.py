@@ -1,41 +1,55 @@
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Transakcija
+from .caching import DATA, RULES, bump_versions
+from .models import Budzet, CiljStednje, Kategorija, PonavljajucaTransakcija, Racun, Transakcija, TransactionEffects
+
+@receiver(pre_save, sender=Transakcija)
+def remember_previous_state(sender, instance: Transakcija, **kwargs):
+    # stanje prije izmjene (jedan upit), potrebno za delta ažuriranje
+    # sažetaka, računa i ciljeva štednje
+    instance._prethodno = None
+    if instance.pk:
+        instance._prethodno = (Transakcija.objects.filter(pk=instance.pk)
+                               .values(*Transakcija.LEDGER_FIELDS, tip=F("kategorija__tip"))
+                               .first())
 
 @receiver(post_save, sender=Transakcija)
-def update_goal_on_save(sender, instance: Transakcija, created, **kwargs):
-    if created and instance.doprinos_cilju:
-        delta = instance.iznos if instance.kategorija.tip == "PRIHOD" else -instance.iznos
-        cilj = instance.doprinos_cilju
-        cilj.trenutno_stanje += delta
-        cilj.save()
-        print(f"Signal: Ažuriran cilj {cilj.naziv} za {delta}€, novo stanje: {cilj.trenutno_stanje}€")
+def apply_effects_on_save(sender, instance: Transakcija, **kwargs):
+    prethodno = getattr(instance, "_prethodno", None)
+    tip = None
+    with TransactionEffects.collect() as effects:
+        # reverzaj stari utjecaj, primijeni novi
+        if prethodno:
+            effects.add(prethodno, -1)
+            if prethodno["kategorija_id"] == instance.kategorija_id:
+                tip = prethodno["tip"]
+        effects.add(instance.ledger_state(tip))
+    instance._prethodno = None
 
-@receiver(pre_save, sender=Transakcija)
-def handle_update(sender, instance: Transakcija, **kwargs):
-    if not instance.pk:
-        return
-    try:
-        old = Transakcija.objects.get(pk=instance.pk)
-    except Transakcija.DoesNotExist:
-        return
-    # reverzaj stari utjecaj
-    if old.doprinos_cilju:
-        old_delta = old.iznos if old.kategorija.tip == "PRIHOD" else -old.iznos
-        cilj = old.doprinos_cilju
-        cilj.trenutno_stanje -= old_delta
-        cilj.save()
-    # primjeni novi
-    if instance.doprinos_cilju:
-        new_delta = instance.iznos if instance.kategorija.tip == "PRIHOD" else -instance.iznos
-        cilj = instance.doprinos_cilju
-        cilj.trenutno_stanje += new_delta
-        cilj.save()
+@receiver(post_delete, sender=Transakcija)
+def apply_effects_on_delete(sender, instance: Transakcija, **kwargs):
+    with TransactionEffects.collect() as effects:
+        effects.add(instance.ledger_state(), -1)
+
+@receiver(post_save, sender=PonavljajucaTransakcija)
+@receiver(post_delete, sender=PonavljajucaTransakcija)
+@receiver(post_save, sender=Kategorija)
+def invalidate_forecast_on_rule_change(sender, instance, **kwargs):
+    # razvijena pravila u cacheu više ne vrijede
+    transaction.on_commit(lambda: bump_versions(RULES, [instance.korisnik_id]))
 
-@receiver(pre_delete, sender=Transakcija)
-def update_goal_on_delete(sender, instance: Transakcija, **kwargs):
-    if instance.doprinos_cilju:
-        cilj = instance.doprinos_cilju
-        delta = instance.iznos if instance.kategorija.tip == "PRIHOD" else -instance.iznos
-        cilj.trenutno_stanje -= delta
-        cilj.save()
+@receiver(post_save, sender=Budzet)
+@receiver(post_delete, sender=Budzet)
+@receiver(post_save, sender=Racun)
+@receiver(post_delete, sender=Racun)
+@receiver(post_save, sender=CiljStednje)
+@receiver(post_delete, sender=CiljStednje)
+@receiver(post_save, sender=PonavljajucaTransakcija)
+@receiver(post_delete, sender=PonavljajucaTransakcija)
+@receiver(post_save, sender=Kategorija)
+@receiver(post_delete, sender=Kategorija)
+def invalidate_dashboard(sender, instance, **kwargs):
+    # promjene transakcija poništava TransactionEffects.apply()
+    transaction.on_commit(lambda: bump_versions(DATA, [instance.korisnik_id]))
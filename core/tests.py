@@ -1,3 +1,1698 @@
-from django.test import TestCase
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import (AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import TRANSACTION_PERCENTILES, cached_analytics
+from .backends.sqlite3.base import DatabaseWrapper as SqliteWrapper
+from .caching import counters
+from .demo import KATEGORIJE, DemoGenerator
+from .forecast import expand_rules
+from .forms import TransakcijaForm
+from .importer import TransactionImporter
+from .models import (Budzet, CiljStednje, DnevnoStanje, Kategorija, MjesecniSazetak, PonavljajucaTransakcija, Posao,
+                     Racun, Transakcija, TransactionEffects)
+from .reports import acached_dashboard_context, adashboard_context, cached_dashboard_context, dashboard_context
+from .views import budget_analysis, budget_analysis_async, dashboard, dashboard_async, keyset_page
+
+
+def seed_user(username, transactions, rng, today=None):
+    """Kreira korisnika s kategorijama, računima, ciljem, budžetima i transakcijama"""
+    today = today or timezone.localdate()
+    user = User.objects.create_user(username, password="x")
+    kategorije = [
+        Kategorija.objects.create(korisnik=user, naziv=naziv, tip=tip)
+        for naziv, tip in (("Hrana", "TROSAK"), ("Transport", "TROSAK"), ("Plaća", "PRIHOD"))
+    ]
+    racuni = [
+        Racun.objects.create(korisnik=user, naziv=naziv, tip="BANKA", pocetno_stanje=100, trenutno_stanje=100)
+        for naziv in ("Tekući", "Gotovina")
+    ]
+    cilj = CiljStednje.objects.create(korisnik=user, naziv="Ljetovanje", cilj_iznos=1000,
+                                      datum_pocetka=today - timedelta(days=365))
+    for kategorija in kategorije[:2]:
+        Budzet.objects.create(korisnik=user, kategorija=kategorija, iznos=500,
+                              godina=today.year, mjesec=today.month)
+        Budzet.objects.create(korisnik=user, kategorija=kategorija, iznos=5000, period="GODINA",
+                              godina=today.year)
+    PonavljajucaTransakcija.objects.create(
+        korisnik=user, kategorija=kategorije[2], iznos=1000, opis="Plaća", frekvencija="MJESECNO",
+        datum_pocetka=today, sljedeci_datum=today + timedelta(days=1), doprinos_cilju=cilj,
+    )
+    Transakcija.objects.bulk_create_with_effects([
+        Transakcija(
+            korisnik=user,
+            kategorija=rng.choice(kategorije),
+            racun=rng.choice(racuni + [None]),
+            doprinos_cilju=rng.choice([cilj, None, None]),
+            iznos=Decimal(rng.randint(100, 50000)) / 100,
+            datum=today - timedelta(days=rng.randint(0, 3 * 365)),
+            opis=rng.choice(["Kava", "Trgovina", "Gorivo", "Plaća"]),
+        )
+        for _ in range(transactions)
+    ])
+    return user
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN je specifičan za SQLite")
+class QueryPlanTests(TestCase):
+    """Svaki SELECT vrućih view-ova mora koristiti indeks, bez punog prolaza tablicom"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(10)
+        cls.user = seed_user("plan", 2000, rng)
+        for i in range(3):
+            seed_user(f"drugi{i}", 500, rng)
+
+    def setUp(self):
+        # spremljeni pregled preskače upite koje testiramo
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def query_plans(self, callback):
+        """Pokreće callback i vraća [(sql, plan)] za svaki izvršeni SELECT"""
+        with CaptureQueriesContext(connection) as ctx:
+            callback()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query["sql"]
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plans.append((sql, "\n".join(row[-1] for row in cursor.fetchall())))
+        return plans
+
+    def assertNoFullScans(self, callback):
+        plans = self.query_plans(callback)
+        self.assertTrue(plans)
+        for sql, plan in plans:
+            with self.subTest(sql=sql[:120]):
+                self.assertIsNone(re.search(r"\bSCAN\b", plan), f"Puni prolaz tablicom:\n{plan}\n{sql}")
+                # transakcije korisnika moraju doći iz indeksa već sortirane
+                if re.search(r'FROM "core_transakcija"', sql):
+                    self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, f"Sortiranje svih redaka:\n{plan}\n{sql}")
+
+    def get(self, name, query=""):
+        return lambda: self.assertEqual(self.client.get(reverse(name) + query).status_code, 200)
+
+    def test_dashboard(self):
+        self.assertNoFullScans(self.get("dashboard"))
+
+    def test_budgets(self):
+        self.assertNoFullScans(self.get("budzeti"))
+
+    def test_budget_analysis(self):
+        self.assertNoFullScans(self.get("budget_analysis"))
+
+    def test_transaction_list(self):
+        self.assertNoFullScans(self.get("transakcije"))
+
+    def test_transaction_list_filters(self):
+        kategorija = Kategorija.objects.filter(korisnik=self.user).first()
+        od = (timezone.localdate() - timedelta(days=200)).isoformat()
+        self.assertNoFullScans(self.get("transakcije", "?tip=TROSAK&ukupno=1"))
+        self.assertNoFullScans(self.get("transakcije", f"?kategorija={kategorija.pk}&od={od}"))
+
+    def test_transaction_list_deep_page(self):
+        t = Transakcija.objects.filter(korisnik=self.user)[1500]
+        self.assertNoFullScans(self.get("transakcije", f"?nakon={t.datum.isoformat()}_{t.pk}"))
+        self.assertNoFullScans(self.get("transakcije", f"?prije={t.datum.isoformat()}_{t.pk}"))
+
+    def test_csv_export(self):
+        def export():
+            response = self.client.get(reverse("transakcije_export") + "?tip=PRIHOD")
+            b"".join(response.streaming_content)
+        self.assertNoFullScans(export)
+
+    def test_forecast(self):
+        self.assertNoFullScans(self.get("prognoza"))
+
+    def test_account_history(self):
+        racun = Racun.objects.filter(korisnik=self.user).first()
+        od = (timezone.localdate() - timedelta(days=400)).isoformat()
+        url = reverse("racun_povijest", args=[racun.pk]) + f"?od={od}&datum={od}"
+        self.assertNoFullScans(lambda: self.assertEqual(self.client.get(url).status_code, 200))
+        # transakcija s ranijim datumom popravlja kumulativ kasnijih dana
+        kategorija = Kategorija.objects.filter(korisnik=self.user).first()
+        self.assertNoFullScans(lambda: Transakcija.objects.create(
+            korisnik=self.user, kategorija=kategorija, racun=racun, iznos=10, datum=timezone.localdate() - timedelta(days=500)))
+
+    def test_recurring_scan(self):
+        self.assertNoFullScans(lambda: PonavljajucaTransakcija.objects.process_due(timezone.localdate() + timedelta(days=40)))
+
+    def test_admin_date_hierarchy(self):
+        self.client.force_login(User.objects.create_superuser("plan-admin", "plan@example.com", "x"))
+        danas = timezone.localdate()
+        url = reverse("admin:core_transakcija_changelist") + f"?datum__year={danas.year}&datum__month={danas.month}"
+        self.assertNoFullScans(lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+
+class QueryBudgetTests(TestCase):
+    """Broj upita svakog view-a je fiksan i ne ovisi o količini podataka.
+
+    Vrijeme se provjerava samo na zahtjev, jer ovisi o stroju:
+    PERF_BASELINE_UPDATE=1 zapisuje trajanja zahtjeva u JSON (PERF_BASELINE,
+    zadano u privremenom direktoriju), a PERF_LATENCY=1 ruši test kad je
+    zahtjev sporiji od PERF_TOLERANCE puta zapisanog vremena.
+    """
+    SIZES = (50, 500, 2500)
+
+    # (ime rute, argumenti, query string): broj upita
+    BUDGETS = {
+        ("dashboard", (), ""): 6,
+        ("kategorije", (), ""): 3,
+        ("transakcije", (), ""): 7,
+        ("transakcije", (), "?tip=TROSAK&ukupno=1"): 8,
+        ("transakcije_export", (), ""): 3,
+        ("transakcije_export", (), "?gzip=1"): 3,
+        ("transakcije_import", (), ""): 2,
+        ("racuni", (), ""): 3,
+        ("budzeti", (), ""): 4,
+        ("ponavljajuce", (), ""): 6,
+        ("process_recurring", (), ""): 7,
+        ("ciljevi", (), ""): 3,
+        ("budget_analysis", (), ""): 3,
+        ("prognoza", (), ""): 4,
+        ("analitika", (), ""): 4,
+        ("widget_data", ("pregled",), ""): 4,
+        ("widget_data", ("prihodi-troskovi",), ""): 3,
+        ("widget_data", ("troskovi-po-kategorijama",), ""): 3,
+        ("widget_data", ("budzeti",), ""): 3,
+        ("widget_data", ("racuni",), ""): 3,
+        ("widget_data", ("ciljevi",), ""): 3,
+        ("widget_data", ("analiza-budzeta",), ""): 3,
+        ("widget_data", ("analitika",), ""): 4,
+        ("metrics", (), ""): 2,
+    }
+    # view-ovi bez prijave
+    ANONYMOUS = {
+        ("login", (), ""): 0,
+        ("register", (), ""): 0,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(13)
+        cls.users = {}
+        for size in cls.SIZES:
+            user = seed_user(f"velicina{size}", size, rng)
+            user.is_staff = True
+            user.save()
+            cls.users[size] = user
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.path = os.environ.get("PERF_BASELINE", os.path.join(tempfile.gettempdir(), "budzet_perf_baseline.json"))
+        cls.tolerance = float(os.environ.get("PERF_TOLERANCE", 3))
+        cls.update = os.environ.get("PERF_BASELINE_UPDATE") == "1"
+        cls.check_latency = os.environ.get("PERF_LATENCY") == "1" and not cls.update
+        cls.baseline = {}
+        if cls.update or cls.check_latency:
+            try:
+                with open(cls.path) as f:
+                    cls.baseline = json.load(f)
+            except FileNotFoundError:
+                pass
+        cls.timings = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.update:
+            with open(cls.path, "w") as f:
+                json.dump({**cls.baseline, **cls.timings}, f, indent=2, sort_keys=True)
+        super().tearDownClass()
+
+    def request(self, name, args, query):
+        # spremljeni pregled preskače upite, a on_commit poništavanje ne radi u TestCase
+        cache.clear()
+        start = time.perf_counter()
+        response = self.client.get(reverse(name, args=args) + query)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+        self.assertIn(response.status_code, (200, 302))
+        return elapsed
+
+    def check_budgets(self, budgets, login):
+        for (name, args, query), budget in budgets.items():
+            counts = {}
+            for size, user in self.users.items():
+                if login:
+                    self.client.force_login(user)
+                else:
+                    self.client.logout()
+                key = f"{name}{'/' + '/'.join(args) if args else ''}{query}@{size}"
+                with self.subTest(key):
+                    with self.assertNumQueries(budget):
+                        elapsed = self.request(name, args, query)
+                with CaptureQueriesContext(connection) as ctx:
+                    self.request(name, args, query)
+                counts[size] = len(ctx)
+                self.timings[key] = round(elapsed * 1000, 2)
+                if self.check_latency and key in self.baseline:
+                    with self.subTest(key, latency=True):
+                        self.assertLessEqual(elapsed * 1000, self.baseline[key] * self.tolerance + 5,
+                                             f"{key} je sporiji od zapisanog ({self.baseline[key]} ms)")
+            with self.subTest(f"{name}{query}", scaling=True):
+                self.assertEqual(len(set(counts.values())), 1, f"Broj upita raste s podacima: {counts}")
+
+    def test_authenticated_views(self):
+        self.check_budgets(self.BUDGETS, login=True)
+
+    def test_anonymous_views(self):
+        self.check_budgets(self.ANONYMOUS, login=False)
+
+
+@unittest.skipUnless(settings.REPLICA_DATABASE in settings.DATABASES, "replika nije konfigurirana (REPLICA_DATABASE_URL)")
+class ReplicaRoutingTests(TransactionTestCase):
+    """Izvještaji čitaju s replike, osim odmah nakon korisnikove promjene"""
+    # replika je u testovima druga veza na istu bazu (TEST MIRROR); bez
+    # transakcije oko testa, jer SQLite veza ne čita tablice zaključane njome
+    databases = "__all__"
+
+    def setUp(self):
+        self.user = seed_user("replika", 200, random.Random(21))
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        replica = connections[settings.REPLICA_DATABASE]
+        with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(replica) as copy:
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(copy)
+
+    @override_settings(REPLICA_LAG=-1)
+    def test_reports_read_from_replica(self):
+        for url in (reverse("dashboard"), reverse("budget_analysis"), reverse("transakcije_export")):
+            with self.subTest(url):
+                primary, replica = self.count_queries(url)
+                # sesija i korisnik se čitaju prije view-a
+                self.assertEqual(primary, 2)
+                self.assertGreater(replica, 0)
+        self.assertEqual(self.count_queries(reverse("transakcije"))[1], 0)
+
+    @override_settings(REPLICA_LAG=60)
+    def test_recent_change_reads_primary(self):
+        self.assertEqual(self.count_queries(reverse("dashboard"))[1], 0)
+
+
+class SqliteBackendTests(SimpleTestCase):
+    """WAL i PRAGMA postavke na svakoj vezi, pisci čekaju u redu umjesto da padnu"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "test.sqlite3")
+
+    def open(self):
+        wrapper = SqliteWrapper({
+            **connection.settings_dict,
+            "ENGINE": "core.backends.sqlite3",
+            "NAME": self.path,
+            "OPTIONS": {"init_command": settings.SQLITE_INIT_COMMAND, "transaction_mode": "IMMEDIATE"},
+        }, alias="sqlite_test")
+        wrapper.ensure_connection()
+        return wrapper
+
+    def test_pragmas(self):
+        wrapper = self.open()
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                       for name in ("journal_mode", "synchronous", "busy_timeout", "foreign_keys")}
+        self.assertEqual(pragmas, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000, "foreign_keys": 1})
+
+    def test_writers_wait_for_each_other(self):
+        prvi = self.open()
+        self.addCleanup(prvi.close)
+        prvi.cursor().execute("CREATE TABLE t (x INTEGER)")
+        # BEGIN IMMEDIATE drži zaključavanje za pisanje i prije prvog upisa
+        prvi._start_transaction_under_autocommit()
+        prvi.cursor().execute("SELECT count(*) FROM t")
+
+        rezultat = []
+
+        def drugi_pisac():
+            drugi = self.open()
+            try:
+                drugi._start_transaction_under_autocommit()
+                drugi.cursor().execute("INSERT INTO t VALUES (2)")
+                drugi.commit()
+                rezultat.append(drugi.cursor().execute("SELECT x FROM t ORDER BY rowid").fetchall())
+            finally:
+                drugi.close()
+
+        dretva = threading.Thread(target=drugi_pisac)
+        dretva.start()
+        time.sleep(0.2)
+        self.assertTrue(dretva.is_alive())
+        prvi.cursor().execute("INSERT INTO t VALUES (1)")
+        prvi.commit()
+        dretva.join(5)
+        self.assertEqual(rezultat, [[(1,), (2,)]])
+
+
+@override_settings(BACKGROUND_BOOKKEEPING=True)
+class BackgroundBookkeepingTests(TestCase):
+    """Izmjene istog računa spajaju se u jedan posao, worker usklađuje stanja"""
+
+    def test_coalesced_refresh(self):
+        user = seed_user("pozadina", 0, random.Random(23))
+        racun = Racun.objects.filter(korisnik=user).first()
+        cilj = CiljStednje.objects.get(korisnik=user)
+        kategorije = list(Kategorija.objects.filter(korisnik=user))
+        rng = random.Random(23)
+        today = timezone.localdate()
+        transakcije = [
+            Transakcija.objects.create(korisnik=user, kategorija=rng.choice(kategorije), racun=racun,
+                                       iznos=rng.randint(1, 500), datum=today - timedelta(days=rng.randint(0, 400)),
+                                       doprinos_cilju=cilj if i % 4 == 0 else None)
+            for i in range(60)
+        ]
+        for t in transakcije[:10]:
+            t.datum -= timedelta(days=30)
+            t.save()
+        transakcije[-1].delete()
+
+        posao = Posao.objects.get(vrsta=Posao.RACUN, objekt_id=racun.pk)
+        self.assertEqual(posao.broj, 71)
+        self.assertEqual(posao.od_datuma, min(t.datum for t in transakcije[:-1]))
+        self.assertEqual(Posao.objects.count(), 2)
+        racun.refresh_from_db()
+        self.assertEqual(racun.trenutno_stanje, racun.pocetno_stanje)
+
+        self.assertEqual(Posao.objects.run_pending(), (2, 0))
+        self.assertFalse(Posao.objects.exists())
+        stanja = list(DnevnoStanje.objects.filter(racun=racun).order_by("datum")
+                                  .values_list("datum", "promjena", "kumulativ"))
+        racun.refresh_from_db()
+        cilj.refresh_from_db()
+        ukupno = Transakcija.objects.filter(racun=racun).aggregate(ukupno=Transakcija.signed_sum())["ukupno"]
+        self.assertEqual(racun.trenutno_stanje, racun.pocetno_stanje + ukupno)
+        self.assertEqual(cilj.trenutno_stanje,
+                         Transakcija.objects.filter(doprinos_cilju=cilj).aggregate(ukupno=Transakcija.signed_sum())["ukupno"])
+        DnevnoStanje.rebuild(user)
+        self.assertEqual(stanja, list(DnevnoStanje.objects.filter(racun=racun).values_list("datum", "promjena", "kumulativ")))
+
+
+class TransactionBatchApiTests(TestCase):
+    """JSON API kreira i mijenja transakcije odjednom, sve ili ništa"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("api", 0, random.Random(29))
+        cls.racun = Racun.objects.filter(korisnik=cls.user).first()
+        cls.cilj = CiljStednje.objects.get(korisnik=cls.user)
+        cls.kategorija = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, items):
+        return self.client.post(reverse("transakcije_batch"), json.dumps({"transakcije": items}),
+                                content_type="application/json")
+
+    def items(self, n):
+        today = timezone.localdate().isoformat()
+        return [{"kategorija": self.kategorija.pk, "racun": self.racun.pk, "iznos": "2.50", "datum": today,
+                 "opis": f"kava {i}", "doprinos_cilju": self.cilj.pk if i % 2 else None} for i in range(n)]
+
+    def assertBalances(self):
+        self.racun.refresh_from_db()
+        self.cilj.refresh_from_db()
+        ukupno = Transakcija.objects.filter(racun=self.racun).aggregate(ukupno=Transakcija.signed_sum())["ukupno"]
+        self.assertEqual(self.racun.trenutno_stanje, self.racun.pocetno_stanje + (ukupno or 0))
+        self.assertEqual(self.racun.balance_on(timezone.localdate()), self.racun.trenutno_stanje)
+        self.assertEqual(self.cilj.trenutno_stanje,
+                         Transakcija.objects.filter(doprinos_cilju=self.cilj).aggregate(ukupno=Transakcija.signed_sum())["ukupno"])
+
+    def test_create_and_update(self):
+        response = self.post(self.items(40))
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()["kreirano"]
+        self.assertEqual(Transakcija.objects.filter(korisnik=self.user, pk__in=ids).count(), 40)
+        self.assertBalances()
+
+        placa = Kategorija.objects.get(korisnik=self.user, tip="PRIHOD")
+        response = self.post([{"id": pk, "iznos": "10.00", "kategorija": placa.pk} for pk in ids[:10]]
+                             + [{"id": pk, "datum": "2020-01-15", "racun": None} for pk in ids[10:20]])
+        self.assertEqual(response.json(), {"kreirano": [], "izmijenjeno": 20})
+        self.assertEqual(Transakcija.objects.get(pk=ids[0]).opis, "kava 0")
+        self.assertBalances()
+
+    def test_queries_do_not_grow_with_batch(self):
+        # prvi zahtjev stvara retke sažetka i dnevnog stanja, sljedeći ih samo mijenjaju
+        self.post(self.items(1))
+        counts = []
+        for n in (20, 100):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post(self.items(n)).status_code, 201)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_batch_saves_nothing(self):
+        drugi = seed_user("api-drugi", 0, random.Random(31))
+        items = self.items(3)
+        items[0]["iznos"] = "abc"
+        items[1]["kategorija"] = Kategorija.objects.filter(korisnik=drugi).first().pk
+        items[2]["id"] = Transakcija.objects.create(korisnik=drugi, kategorija=Kategorija.objects.filter(korisnik=drugi).first(),
+                                                    iznos=1, datum=timezone.localdate()).pk
+        response = self.post(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["greske"]), {"0"})
+        del items[0]
+        response = self.post(items)
+        self.assertEqual(response.json()["greske"], {"0": {"kategorija": ["Ne postoji"]}, "1": {"id": ["Transakcija ne postoji"]}})
+        self.assertFalse(Transakcija.objects.filter(korisnik=self.user).exists())
+        self.assertEqual(self.post({"nije": "popis"}).status_code, 400)
+
+
+class AdminTests(TestCase):
+    """Admin ne smije raditi upit po retku ni brojati cijelu tablicu transakcija"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(37)
+        cls.user = seed_user("vlasnik", 50, rng)
+        seed_user("drugi", 50, rng)
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "x")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(f"admin:core_{model}_changelist"))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_changelists_without_n_plus_one(self):
+        models = ["transakcija", "kategorija", "racun", "ciljstednje", "budzet", "ponavljajucatransakcija", "posao"]
+        prije = {model: self.changelist_queries(model) for model in models}
+        seed_user("treci", 50, random.Random(41))
+        for model in models:
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist_queries(model), prije[model])
+
+    def test_change_form_uses_autocomplete(self):
+        t = Transakcija.objects.filter(korisnik=self.user).first()
+        response = self.client.get(reverse("admin:core_transakcija_change", args=[t.pk]))
+        self.assertContains(response, "admin-autocomplete")
+        # samo odabrane vrijednosti, ne sve kategorije i računi svih korisnika
+        self.assertLess(response.content.count(b"<option"), Kategorija.objects.count())
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "core", "model_name": "transakcija", "field_name": "kategorija", "term": "vlasnik hrana"})
+        self.assertEqual([r["id"] for r in response.json()["results"]],
+                         [str(k.pk) for k in Kategorija.objects.filter(korisnik=self.user, naziv="Hrana")])
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "statistika iz sqlite_stat1")
+    def test_approximate_count(self):
+        url = reverse("admin:core_transakcija_changelist")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        # mala tablica se broji točno
+        self.assertEqual(self.client.get(url).context["cl"].result_count, 100)
+        with connection.cursor() as cursor:
+            # djelomični indeks broji samo dio redaka, a prvi je u tablici statistike
+            cursor.execute("DELETE FROM sqlite_stat1 WHERE tbl = 'core_transakcija'")
+            cursor.execute("INSERT INTO sqlite_stat1 VALUES ('core_transakcija', 'transakcija_jedno_ponavljanje', '3 1 1')")
+            cursor.execute("INSERT INTO sqlite_stat1 VALUES ('core_transakcija', 'transakcija_datum', '2000000 10')")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_count, 2000000)
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT(*)" in q["sql"]])
+        # s pretragom točan broj
+        response = self.client.get(url, {"q": "kava"})
+        self.assertEqual(response.context["cl"].result_count, Transakcija.objects.search("kava").count())
+
+
+class RequestInstrumentationTests(TestCase):
+    """Server-Timing s brojem upita vide samo is_staff korisnici (ili uz DEBUG)"""
+
+    def test_server_timing_only_for_staff(self):
+        user = User.objects.create_user("mjerenje", password="x")
+        self.client.force_login(user)
+        self.assertNotIn("Server-Timing", self.client.get(reverse("kategorije")).headers)
+        self.client.logout()
+        self.assertNotIn("Server-Timing", self.client.get(reverse("login")).headers)
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        self.assertIn("upita", self.client.get(reverse("kategorije")).headers["Server-Timing"])
+        with override_settings(DEBUG=True):
+            self.client.logout()
+            self.assertIn("Server-Timing", self.client.get(reverse("login")).headers)
+
+    @override_settings(DEBUG=False)
+    async def test_async_request_for_lazy_user(self):
+        # pod ASGI-jem nijedan pogled ne čita request.user za nepostojeću stranicu
+        user = await User.objects.acreate(username="mjerenje-async", is_staff=True)
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get("/nope/")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("upita", response.headers["Server-Timing"])
+
+
+class BudgetSpendingTests(TestCase):
+    """with_actual_spending zbraja točno mjesec, kvartal ili godinu budžeta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("budzet", password="x")
+        cls.hrana = Kategorija.objects.create(korisnik=cls.user, naziv="Hrana", tip="TROSAK")
+        transport = Kategorija.objects.create(korisnik=cls.user, naziv="Transport", tip="TROSAK")
+        drugi = User.objects.create_user("budzet-drugi", password="x")
+        tudja = Kategorija.objects.create(korisnik=drugi, naziv="Hrana", tip="TROSAK")
+        # iznosi su potencije dvojke pa zbroj pokazuje točno koji su dani uključeni
+        cls.dani = [date(2023, 12, 31), date(2024, 1, 1), date(2024, 3, 31), date(2024, 4, 1),
+                    date(2024, 6, 30), date(2024, 7, 1), date(2024, 12, 31), date(2025, 1, 1)]
+        for i, datum in enumerate(cls.dani):
+            Transakcija.objects.create(korisnik=cls.user, kategorija=cls.hrana, iznos=2 ** i, datum=datum)
+            Transakcija.objects.create(korisnik=cls.user, kategorija=transport, iznos=1000, datum=datum)
+            Transakcija.objects.create(korisnik=drugi, kategorija=tudja, iznos=1000, datum=datum)
+
+    def expected(self, od, do):
+        return sum(2 ** i for i, datum in enumerate(self.dani) if od <= datum <= do)
+
+    def test_periods(self):
+        slucajevi = [
+            ("MJESEC", 2024, 3, date(2024, 3, 1), date(2024, 3, 31)),
+            ("MJESEC", 2024, 12, date(2024, 12, 1), date(2024, 12, 31)),
+            ("MJESEC", 2024, None, date(2024, 1, 1), date(2024, 1, 31)),
+            ("KVARTAL", 2024, 2, date(2024, 1, 1), date(2024, 3, 31)),
+            ("KVARTAL", 2024, 4, date(2024, 4, 1), date(2024, 6, 30)),
+            ("KVARTAL", 2024, 9, date(2024, 7, 1), date(2024, 9, 30)),
+            ("KVARTAL", 2024, 12, date(2024, 10, 1), date(2024, 12, 31)),
+            ("GODINA", 2024, None, date(2024, 1, 1), date(2024, 12, 31)),
+            ("GODINA", 2025, None, date(2025, 1, 1), date(2025, 12, 31)),
+        ]
+        for period, godina, mjesec, od, do in slucajevi:
+            Budzet.objects.create(korisnik=self.user, kategorija=self.hrana, iznos=100,
+                                  period=period, godina=godina, mjesec=mjesec)
+        budzeti = {(b.period, b.godina, b.mjesec): b for b in Budzet.objects.with_actual_spending()}
+        for period, godina, mjesec, od, do in slucajevi:
+            with self.subTest(period=period, godina=godina, mjesec=mjesec):
+                budzet = budzeti[(period, godina, mjesec)]
+                self.assertEqual(budzet.actual_spending, self.expected(od, do))
+                # isti iznos kao izračun po budžetu iz transakcija
+                self.assertEqual(Budzet.objects.get(pk=budzet.pk).get_actual_spending(), self.expected(od, do))
+
+
+def random_transactions(user, n, rng, days=3 * 365):
+    """Nespremljene transakcije korisnika iz seed_user s nasumičnim vezama i datumima"""
+    kategorije = list(Kategorija.objects.filter(korisnik=user))
+    racuni = list(Racun.objects.filter(korisnik=user))
+    ciljevi = list(CiljStednje.objects.filter(korisnik=user))
+    today = timezone.localdate()
+    return [
+        Transakcija(korisnik=user, kategorija=rng.choice(kategorije), racun=rng.choice(racuni + [None]),
+                    doprinos_cilju=rng.choice(ciljevi + [None, None]), iznos=Decimal(rng.randint(1, 50000)) / 100,
+                    datum=today - timedelta(days=rng.randint(0, days)), opis=rng.choice(["Kava", "Gorivo", "Plaća"]))
+        for _ in range(n)
+    ]
+
+
+class MonthlyRollupTests(TestCase):
+    """Inkrementalni MjesecniSazetak jednak je sažetku izgrađenom ispočetka"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rng = random.Random(43)
+        cls.user = seed_user("sazetak", 0, cls.rng)
+        seed_user("sazetak-drugi", 30, cls.rng)
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        cls.racuni = list(Racun.objects.filter(korisnik=cls.user))
+
+    def snapshot(self):
+        # retci koji su pali na nulu ostaju, rebuild ih ne stvara
+        return {(s.kategorija_id, s.racun_id, s.godina, s.mjesec): (s.iznos, s.broj)
+                for s in MjesecniSazetak.objects.filter(korisnik=self.user) if s.broj or s.iznos}
+
+    def assertRollupMatchesRebuild(self):
+        inkrementalno = self.snapshot()
+        MjesecniSazetak.rebuild(self.user)
+        self.assertEqual(inkrementalno, self.snapshot())
+
+    def test_single_changes(self):
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.hrana, racun=self.racuni[0],
+                                       iznos=Decimal("12.30"), datum=date(2024, 1, 31))
+        self.assertRollupMatchesRebuild()
+        for promjena in ({"kategorija": self.placa}, {"racun": self.racuni[1]}, {"racun": None},
+                         {"datum": date(2024, 2, 1)}, {"datum": date(2023, 12, 31), "iznos": Decimal("99.99")},
+                         {"kategorija": self.hrana, "racun": self.racuni[0], "datum": date(2024, 1, 15)}):
+            with self.subTest(promjena=promjena):
+                for polje, vrijednost in promjena.items():
+                    setattr(t, polje, vrijednost)
+                t.save()
+                self.assertRollupMatchesRebuild()
+        t.delete()
+        self.assertFalse(self.snapshot())
+
+    def test_bulk_changes(self):
+        # dovoljno mjeseci da apply_deltas ide kroz UPDATE ... CASE i bulk_create
+        transakcije = random_transactions(self.user, 300, self.rng)
+        Transakcija.objects.bulk_create_with_effects(transakcije[:150])
+        self.assertRollupMatchesRebuild()
+        with CaptureQueriesContext(connection) as ctx:
+            Transakcija.objects.bulk_create_with_effects(transakcije[150:])
+        self.assertGreaterEqual(len(self.snapshot()), MjesecniSazetak.BULK_THRESHOLD)
+        self.assertTrue([q for q in ctx.captured_queries
+                         if q["sql"].startswith('UPDATE "core_mjesecnisazetak"') and "CASE WHEN" in q["sql"]])
+        self.assertRollupMatchesRebuild()
+
+        izmjene = list(Transakcija.objects.filter(korisnik=self.user).select_related("kategorija")[:120])
+        for t in izmjene:
+            t.kategorija = self.placa if t.kategorija_id == self.hrana.pk else self.hrana
+            t.racun = self.rng.choice(self.racuni + [None])
+            t.datum -= timedelta(days=self.rng.randint(0, 90))
+            t.iznos += 1
+        Transakcija.objects.bulk_update_with_effects(izmjene, ["kategorija", "racun", "datum", "iznos"])
+        self.assertRollupMatchesRebuild()
+
+        with TransactionEffects.deferred():
+            for t in izmjene[:40]:
+                t.delete()
+        self.assertRollupMatchesRebuild()
+
+
+class AccountBalanceTests(TestCase):
+    """Stanja računa pomicana deltama jednaka su izračunu iz svih transakcija"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rng = random.Random(47)
+        cls.user = seed_user("stanje", 0, cls.rng)
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        cls.racuni = list(Racun.objects.filter(korisnik=cls.user))
+
+    def assertBalancesMatchRecompute(self):
+        for racun in Racun.objects.filter(korisnik=self.user):
+            inkrementalno = racun.trenutno_stanje
+            racun.update_balance()
+            self.assertEqual(inkrementalno, racun.trenutno_stanje, racun.naziv)
+
+    def test_single_changes(self):
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.hrana, racun=self.racuni[0],
+                                       iznos=Decimal("40.00"), datum=date(2024, 5, 1))
+        self.assertBalancesMatchRecompute()
+        self.assertEqual(Racun.objects.get(pk=self.racuni[0].pk).trenutno_stanje, self.racuni[0].pocetno_stanje - 40)
+        for promjena in ({"iznos": Decimal("55.50")}, {"racun": self.racuni[1]}, {"kategorija": self.placa},
+                         {"racun": None}, {"racun": self.racuni[0], "kategorija": self.hrana}):
+            with self.subTest(promjena=promjena):
+                for polje, vrijednost in promjena.items():
+                    setattr(t, polje, vrijednost)
+                t.save()
+                self.assertBalancesMatchRecompute()
+        t.delete()
+        self.assertBalancesMatchRecompute()
+        self.assertEqual(Racun.objects.get(pk=self.racuni[0].pk).trenutno_stanje, self.racuni[0].pocetno_stanje)
+
+    def test_bulk_changes(self):
+        Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, 200, self.rng))
+        self.assertBalancesMatchRecompute()
+        izmjene = list(Transakcija.objects.filter(korisnik=self.user).select_related("kategorija")[:80])
+        for t in izmjene:
+            t.racun = self.rng.choice(self.racuni + [None])
+            t.kategorija = self.rng.choice([self.hrana, self.placa])
+        Transakcija.objects.bulk_update_with_effects(izmjene, ["racun", "kategorija"])
+        self.assertBalancesMatchRecompute()
+
+    def test_amount_must_be_positive(self):
+        podaci = {"kategorija": self.hrana.pk, "racun": self.racuni[0].pk, "datum": "2024-05-01", "opis": ""}
+        self.assertFalse(TransakcijaForm({**podaci, "iznos": "-5"}).is_valid())
+        self.assertFalse(TransakcijaForm({**podaci, "iznos": "0"}).is_valid())
+        self.assertTrue(TransakcijaForm({**podaci, "iznos": "5"}).is_valid())
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("transakcije_batch"), json.dumps({"transakcije": [{**podaci, "iznos": "-5"}]}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("iznos", response.json()["greske"]["0"])
+
+        # izvod s negativnim troškom sprema pozitivan iznos, nula je greška retka
+        rezultat = TransactionImporter(self.user).run([
+            "Datum,Tip,Kategorija,Iznos,Račun",
+            f"2024-05-01,Trošak,Hrana,-5.00,{self.racuni[0].naziv}",
+            f"2024-05-02,Trošak,Hrana,0,{self.racuni[0].naziv}",
+        ])
+        self.assertEqual((rezultat.created, [greska for _, greska in rezultat.errors]), (1, ["Iznos ne smije biti 0"]))
+        self.assertEqual(Transakcija.objects.get(korisnik=self.user).iznos, 5)
+        self.assertBalancesMatchRecompute()
+
+        # skupni putovi preskaču validatore, ograničenje u bazi ih ipak odbija
+        for iznos in (Decimal("-5"), Decimal("0")):
+            with self.subTest(iznos=iznos), self.assertRaises(IntegrityError), transaction.atomic():
+                Transakcija.objects.bulk_create_with_effects([Transakcija(
+                    korisnik=self.user, kategorija=self.hrana, racun=self.racuni[0], iznos=iznos, datum=date(2024, 5, 3))])
+        self.assertBalancesMatchRecompute()
+
+
+class GoalBalanceTests(TestCase):
+    """Stanja ciljeva pomicana deltama jednaka su zbroju doprinosa"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rng = random.Random(53)
+        cls.user = seed_user("cilj", 0, cls.rng)
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        cls.ciljevi = [CiljStednje.objects.get(korisnik=cls.user),
+                       CiljStednje.objects.create(korisnik=cls.user, naziv="Auto", cilj_iznos=5000,
+                                                  datum_pocetka=date(2024, 1, 1))]
+
+    def assertGoalsMatchRecompute(self):
+        for cilj in CiljStednje.objects.filter(korisnik=self.user):
+            ukupno = (Transakcija.objects.filter(doprinos_cilju=cilj).order_by()
+                      .aggregate(ukupno=Transakcija.signed_sum())["ukupno"])
+            self.assertEqual(cilj.trenutno_stanje, ukupno or 0, cilj.naziv)
+
+    def test_single_changes(self):
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.placa, doprinos_cilju=self.ciljevi[0],
+                                       iznos=Decimal("100.00"), datum=date(2024, 5, 1))
+        self.assertGoalsMatchRecompute()
+        self.assertEqual(CiljStednje.objects.get(pk=self.ciljevi[0].pk).trenutno_stanje, 100)
+        for promjena in ({"iznos": Decimal("150.25")}, {"doprinos_cilju": self.ciljevi[1]},
+                         {"kategorija": self.hrana}, {"doprinos_cilju": None}, {"doprinos_cilju": self.ciljevi[0]}):
+            with self.subTest(promjena=promjena):
+                for polje, vrijednost in promjena.items():
+                    setattr(t, polje, vrijednost)
+                t.save()
+                self.assertGoalsMatchRecompute()
+        t.delete()
+        self.assertGoalsMatchRecompute()
+        self.assertEqual(CiljStednje.objects.get(pk=self.ciljevi[0].pk).trenutno_stanje, 0)
+
+    def test_bulk_changes(self):
+        Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, 200, self.rng))
+        self.assertGoalsMatchRecompute()
+        izmjene = list(Transakcija.objects.filter(korisnik=self.user).select_related("kategorija")[:80])
+        for t in izmjene:
+            t.doprinos_cilju = self.rng.choice(self.ciljevi + [None])
+            t.iznos += 1
+        Transakcija.objects.bulk_update_with_effects(izmjene, ["doprinos_cilju", "iznos"])
+        self.assertGoalsMatchRecompute()
+        # brisanje cilja ostavlja transakcije bez cilja (SET_NULL), stanje drugog cilja ne mijenja
+        self.ciljevi[1].delete()
+        self.assertGoalsMatchRecompute()
+
+
+class RecurringProcessingTests(TestCase):
+    """process_due sustiže propuštena razdoblja, krajeve mjeseci i smije se ponoviti"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ponavljanje", password="x")
+        cls.placa = Kategorija.objects.create(korisnik=cls.user, naziv="Plaća", tip="PRIHOD")
+
+    def rule(self, frekvencija, pocetak, kraj=None, **kwargs):
+        return PonavljajucaTransakcija.objects.create(
+            korisnik=self.user, kategorija=self.placa, iznos=10, opis=frekvencija, frekvencija=frekvencija,
+            datum_pocetka=pocetak, sljedeci_datum=kwargs.pop("sljedeci_datum", pocetak), datum_kraja=kraj, **kwargs)
+
+    def dates(self, rule):
+        return list(Transakcija.objects.filter(ponavljajuca=rule).order_by("datum").values_list("datum", flat=True))
+
+    def test_catch_up_month_end(self):
+        mjesecno = self.rule("MJESECNO", date(2024, 1, 31))
+        kvartalno = self.rule("KVARTALNO", date(2024, 1, 31))
+        godisnje = self.rule("GODISNJE", date(2024, 2, 29))
+        tjedno = self.rule("TJEDNO", date(2024, 5, 1))
+
+        obradjeno = PonavljajucaTransakcija.objects.process_due(date(2024, 6, 15))
+        self.assertEqual({r.pk: broj for r, broj in obradjeno.items()}, {mjesecno.pk: 5, kvartalno.pk: 2, godisnje.pk: 1, tjedno.pk: 7})
+        self.assertEqual(self.dates(mjesecno), [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31),
+                                                date(2024, 4, 30), date(2024, 5, 31)])
+        self.assertEqual(self.dates(kvartalno), [date(2024, 1, 31), date(2024, 4, 30)])
+        mjesecno.refresh_from_db()
+        self.assertEqual(mjesecno.sljedeci_datum, date(2024, 6, 30))
+
+        PonavljajucaTransakcija.objects.process_due(date(2029, 3, 1))
+        self.assertEqual(self.dates(mjesecno)[5:8], [date(2024, 6, 30), date(2024, 7, 31), date(2024, 8, 31)])
+        self.assertEqual(self.dates(kvartalno)[2:5], [date(2024, 7, 31), date(2024, 10, 31), date(2025, 1, 31)])
+        self.assertEqual(self.dates(godisnje), [date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28),
+                                                date(2027, 2, 28), date(2028, 2, 29), date(2029, 2, 28)])
+
+    def test_rerun_is_idempotent(self):
+        rule = self.rule("MJESECNO", date(2024, 1, 31))
+        PonavljajucaTransakcija.objects.process_due(date(2024, 6, 15))
+        prije = self.dates(rule)
+        self.assertEqual(PonavljajucaTransakcija.objects.process_due(date(2024, 6, 15)), {})
+        # i kad je sljedeci_datum vraćen unatrag, postojeća ponavljanja se ne dupliciraju
+        PonavljajucaTransakcija.objects.filter(pk=rule.pk).update(sljedeci_datum=date(2024, 3, 31))
+        self.assertEqual(PonavljajucaTransakcija.objects.process_due(date(2024, 6, 15)), {})
+        self.assertEqual(self.dates(rule), prije)
+        self.assertEqual(MjesecniSazetak.objects.filter(korisnik=self.user).aggregate(broj=Sum("broj"))["broj"], 5)
+
+    def test_rule_past_end_is_deactivated(self):
+        zavrsava = self.rule("MJESECNO", date(2024, 1, 31), kraj=date(2024, 3, 15))
+        # starije pravilo koje je već prešlo datum kraja, a ostalo aktivno
+        zapelo = self.rule("TJEDNO", date(2024, 1, 1), kraj=date(2024, 2, 1), sljedeci_datum=date(2024, 2, 5))
+        traje = self.rule("MJESECNO", date(2024, 1, 15), kraj=date(2024, 12, 31))
+
+        PonavljajucaTransakcija.objects.process_due(date(2024, 6, 15))
+        self.assertEqual(self.dates(zavrsava), [date(2024, 1, 31), date(2024, 2, 29)])
+        self.assertEqual(self.dates(zapelo), [])
+        self.assertEqual(len(self.dates(traje)), 6)
+        aktivna = dict(PonavljajucaTransakcija.objects.values_list("pk", "aktivno"))
+        self.assertEqual(aktivna, {zavrsava.pk: False, zapelo.pk: False, traje.pk: True})
+        # sljedeće pokretanje nema što dohvatiti
+        self.assertFalse(PonavljajucaTransakcija.objects.filter(aktivno=True, sljedeci_datum__lte=date(2024, 6, 15)).exists())
+
+
+class ForecastExpansionTests(TestCase):
+    """Vektorizirani razvoj pravila (prognoza) daje iste datume kao due_dates"""
+
+    def test_expand_rules_matches_due_dates(self):
+        rng = random.Random(59)
+        user = User.objects.create_user("prognoza", password="x")
+        kategorija = Kategorija.objects.create(korisnik=user, naziv="Plaća", tip="PRIHOD")
+        pravila = []
+        for _ in range(300):
+            frekvencija = rng.choice([f for f, _ in PonavljajucaTransakcija.FREQUENCY_CHOICES])
+            # krajevi mjeseci i prijestupni dan češće od ostalih dana
+            pocetak = rng.choice([date(2024, 2, 29), date(2023, 1, 31), date(2023, 8, 30)]
+                                 + [date(2023, 1, 1) + timedelta(days=rng.randint(0, 700)) for _ in range(3)])
+            pravilo = PonavljajucaTransakcija(korisnik=user, kategorija=kategorija, iznos=1, opis="",
+                                              frekvencija=frekvencija, datum_pocetka=pocetak, sljedeci_datum=pocetak,
+                                              datum_kraja=rng.choice([None, pocetak + timedelta(days=rng.randint(0, 900))]))
+            # dio pravila je već obrađen pa sljedeci_datum nije dan početka
+            for _ in range(rng.randint(0, 5)):
+                pravilo.sljedeci_datum = pravilo.calculate_next_date(pravilo.sljedeci_datum)
+            pravila.append(pravilo)
+        PonavljajucaTransakcija.objects.bulk_create(pravila)
+
+        kraj = date(2027, 1, 15)
+        rules = list(PonavljajucaTransakcija.objects.filter(korisnik=user).order_by("pk")
+                     .values("sljedeci_datum", "datum_pocetka", "datum_kraja", "frekvencija"))
+        rule_idx, ordinals = expand_rules(rules, kraj)
+        razvijeno = defaultdict(list)
+        for i, ordinal in sorted(zip(rule_idx.tolist(), ordinals.tolist())):
+            razvijeno[i].append(date.fromordinal(ordinal))
+        for i, pravilo in enumerate(PonavljajucaTransakcija.objects.filter(korisnik=user).order_by("pk")):
+            with self.subTest(frekvencija=pravilo.frekvencija, pocetak=pravilo.datum_pocetka,
+                              sljedeci=pravilo.sljedeci_datum):
+                self.assertEqual(razvijeno[i], pravilo.due_dates(kraj))
+
+
+class CsvExportTests(TestCase):
+    """CSV izvoz: sadržaj, isti filteri kao popis, gzip na zahtjev i fiksan broj upita"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("izvoz", 0, random.Random(61))
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        cls.cilj = CiljStednje.objects.get(korisnik=cls.user)
+        Transakcija.objects.create(korisnik=cls.user, kategorija=cls.hrana, iznos=Decimal("12.50"),
+                                   racun=Racun.objects.get(korisnik=cls.user, naziv="Gotovina"),
+                                   datum=date(2024, 3, 1), opis="Kava, mlijeko")
+        Transakcija.objects.create(korisnik=cls.user, kategorija=cls.placa, iznos=Decimal("1500.00"),
+                                   datum=date(2024, 3, 5), opis="Plaća", doprinos_cilju=cls.cilj)
+        Transakcija.objects.create(korisnik=cls.user, kategorija=cls.hrana, iznos=Decimal("7.00"),
+                                   datum=date(2024, 4, 2))
+        # tuđe transakcije ne smiju u izvoz
+        seed_user("izvoz-drugi", 20, random.Random(67))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse("transakcije_export"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def rows(self, **params):
+        _, body = self.export(**params)
+        return list(csv.reader(io.StringIO(body.decode("utf-8"))))
+
+    def test_content(self):
+        response, _ = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(self.rows(), [
+            ["Datum", "Tip", "Kategorija", "Iznos", "Opis", "Cilj", "Račun"],
+            ["2024-04-02", "Trošak", "Hrana", "7.0", "", "", ""],
+            ["2024-03-05", "Prihod", "Plaća", "1500.0", "Plaća", "Ljetovanje", ""],
+            ["2024-03-01", "Trošak", "Hrana", "12.5", "Kava, mlijeko", "", "Gotovina"],
+        ])
+
+    def test_filters(self):
+        def datumi(**params):
+            return [row[0] for row in self.rows(**params)[1:]]
+
+        self.assertEqual(datumi(tip="PRIHOD"), ["2024-03-05"])
+        self.assertEqual(datumi(kategorija=self.hrana.pk), ["2024-04-02", "2024-03-01"])
+        self.assertEqual(datumi(od="2024-03-02", do="2024-03-31"), ["2024-03-05"])
+        self.assertEqual(datumi(tip="TROSAK", od="2024-04-01"), ["2024-04-02"])
+
+    def test_gzip(self):
+        response, body = self.export(gzip=1, tip="TROSAK")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("transakcije.csv.gz", response["Content-Disposition"])
+        self.assertEqual(gzip.decompress(body).decode("utf-8").splitlines()[1:],
+                         ["2024-04-02,Trošak,Hrana,7.0,,,", '2024-03-01,Trošak,Hrana,12.5,"Kava, mlijeko",,Gotovina'])
+
+    def test_export_can_be_imported(self):
+        Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, 200, random.Random(71)))
+        _, body = self.export()
+        drugi = User.objects.get(username="izvoz-drugi")
+        rezultat = TransactionImporter(drugi).run(io.StringIO(body.decode("utf-8"), newline=""))
+        self.assertEqual((rezultat.created, rezultat.errors), (203, []))
+
+        def sadrzaj(qs):
+            return sorted(qs.values_list("datum", "kategorija__tip", "kategorija__naziv", "iznos", "opis",
+                                         "doprinos_cilju__naziv", "racun__naziv"))
+        # drugi korisnik ima iste nazive kategorija, računa i cilja (seed_user)
+        uvezeno = Transakcija.objects.filter(korisnik=drugi, hash_uvoza__isnull=False)
+        self.assertEqual(sadrzaj(uvezeno), sadrzaj(Transakcija.objects.filter(korisnik=self.user)))
+        self.assertTrue(uvezeno.filter(racun__isnull=False).exists())
+
+    def test_queries_do_not_grow_with_rows(self):
+        counts = []
+        for n in (0, 300):
+            Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, n, random.Random(n)))
+            with CaptureQueriesContext(connection) as ctx:
+                self.export()
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+
+class TransactionImporterTests(TestCase):
+    """Uvoz izvoda: duplikati, greške po retku i ponovni uvoz iste datoteke"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("uvoz", 0, random.Random(71))
+        cls.racun = Racun.objects.get(korisnik=cls.user, naziv="Tekući")
+
+    def lines(self, *rows):
+        return ["Datum,Tip,Kategorija,Iznos,Opis,Račun", *rows]
+
+    def assertBalance(self):
+        racun = Racun.objects.get(pk=self.racun.pk)
+        ukupno = Transakcija.objects.filter(racun=racun).aggregate(ukupno=Transakcija.signed_sum())["ukupno"] or 0
+        self.assertEqual(racun.trenutno_stanje, racun.pocetno_stanje + ukupno)
+
+    def test_duplicates_and_reimport(self):
+        izvod = self.lines(
+            "2024-05-01,Trošak,Hrana,2.50,Kava,Tekući",
+            # ista kava dvaput isti dan su dvije transakcije
+            "2024-05-01,Trošak,Hrana,2.50,Kava,Tekući",
+            "01.05.2024,Prihod,Plaća,\"1.500,00\",Plaća,Tekući",
+        )
+        rezultat = TransactionImporter(self.user, chunk_size=2).run(izvod)
+        self.assertEqual((rezultat.rows, rezultat.created, rezultat.duplicates, rezultat.errors), (3, 3, 0, []))
+        self.assertBalance()
+
+        rezultat = TransactionImporter(self.user).run(izvod)
+        self.assertEqual((rezultat.created, rezultat.duplicates), (0, 3))
+        # izvod s jednim novim retkom uvozi samo njega
+        rezultat = TransactionImporter(self.user).run(izvod + ["2024-05-01,Trošak,Hrana,2.50,Kava,Tekući"])
+        self.assertEqual((rezultat.created, rezultat.duplicates), (1, 3))
+        self.assertEqual(Transakcija.objects.filter(korisnik=self.user).count(), 4)
+        self.assertBalance()
+
+    def test_row_errors(self):
+        rezultat = TransactionImporter(self.user).run(self.lines(
+            "2024-05-01,Trošak,Hrana,2.50,Kava,Tekući",
+            "2024-13-01,Trošak,Hrana,2.50,Kava,Tekući",
+            "2024-05-02,Trošak,Hrana,abc,Kava,Tekući",
+            "2024-05-03,Trošak,Kino,9.00,,Tekući",
+            "2024-05-04,Trošak,Hrana,3.00,,Štednja",
+            "2024-05-05,Trošak,Hrana,3.00," + "x" * (csv.field_size_limit() + 1) + ",Tekući",
+            "2024-05-06,Prihod,Plaća,100,,Tekući",
+        ))
+        self.assertEqual(rezultat.rows, 7)
+        self.assertEqual(rezultat.created, 2)
+        self.assertEqual([line for line, _ in rezultat.errors], [3, 4, 5, 6, 7])
+        self.assertEqual([greska for _, greska in rezultat.errors[:4]], [
+            "Neispravan datum '2024-13-01'", "Neispravan iznos 'abc'",
+            "Nepoznata kategorija 'Kino' (TROSAK)", "Račun 'Štednja' ne postoji",
+        ])
+        self.assertTrue(rezultat.errors[4][1].startswith("Neispravan CSV redak"))
+        self.assertBalance()
+
+    def test_upload_with_invalid_encoding(self):
+        self.client.force_login(self.user)
+        izvod = "\n".join(self.lines("2024-05-01,Trošak,Hrana,2.50,Kava,Tekući",
+                                     "2024-05-02,Trošak,Hrana,4.00,{},Tekući",
+                                     "2024-05-03,Trošak,Hrana,6.00,Burek,Tekući")).encode("utf-8")
+        izvod = izvod.replace(b"{}", "Čaj".encode("cp1250"))
+        datoteka = SimpleUploadedFile("izvod.csv", izvod, content_type="text/csv")
+        response = self.client.post(reverse("transakcije_import"), {"datoteka": datoteka, "razdjelnik": ","})
+        rezultat = response.context["result"]
+        self.assertEqual((rezultat.created, rezultat.errors), (2, [(3, "Neispravno kodiranje retka")]))
+        self.assertEqual(set(Transakcija.objects.filter(korisnik=self.user).values_list("opis", flat=True)),
+                         {"Kava", "Burek"})
+
+    def test_each_chunk_is_committed_separately(self):
+        stanja = []
+
+        def progress(rezultat):
+            # stanje računa je usklađeno čim je komad spremljen, ne tek na kraju datoteke
+            stanja.append(Racun.objects.get(pk=self.racun.pk).trenutno_stanje)
+
+        rezultat = TransactionImporter(self.user, chunk_size=2, progress=progress).run(self.lines(
+            *(f"2024-05-0{i},Trošak,Hrana,10.00,,Tekući" for i in range(1, 6))))
+        self.assertEqual(rezultat.created, 5)
+        pocetno = self.racun.pocetno_stanje
+        self.assertEqual(stanja, [pocetno - 20, pocetno - 40, pocetno - 50])
+
+
+class KeysetPaginationTests(TestCase):
+    """Kursori stranica popisa transakcija: isti datumi, oba smjera, neispravan kursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("stranice", 0, random.Random(73))
+        hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        # po 11 transakcija na 6 datuma: granice stranica padaju usred istog datuma
+        Transakcija.objects.bulk_create_with_effects([
+            Transakcija(korisnik=cls.user, kategorija=placa if i % 3 == 0 else hrana, iznos=1,
+                        datum=date(2024, 5, 1) + timedelta(days=i % 6), opis=f"t{i}")
+            for i in range(66)
+        ])
+        cls.qs = Transakcija.objects.filter(korisnik=cls.user)
+        cls.poredak = list(cls.qs.order_by("-datum", "-id").values_list("pk", flat=True))
+
+    def test_cursor_round_trip(self):
+        stranice, nakon = [], None
+        while True:
+            rows, nakon, prije = keyset_page(self.qs, nakon, None, 7)
+            stranice.append(([t.pk for t in rows], prije))
+            if not nakon:
+                break
+        self.assertEqual([pk for ids, _ in stranice for pk in ids], self.poredak)
+        self.assertEqual([len(ids) for ids, _ in stranice], [7] * 9 + [3])
+        self.assertIsNone(stranice[0][1])
+
+        # natrag od zadnje stranice kroz kursore "prije" dobivaju se iste stranice
+        prije = stranice[-1][1]
+        for ids, _ in reversed(stranice[:-1]):
+            rows, nakon, prije = keyset_page(self.qs, None, prije, 7)
+            self.assertEqual([t.pk for t in rows], ids)
+            self.assertIsNotNone(nakon)
+        self.assertIsNone(prije)
+
+    def test_invalid_cursor_returns_first_page(self):
+        prva = [t.pk for t in keyset_page(self.qs, None, None, 7)[0]]
+        for kursor in ("abc", "2024-13-01_5", "2024-05-01_x", "2024-05-01_5_6", ""):
+            with self.subTest(kursor=kursor):
+                self.assertEqual([t.pk for t in keyset_page(self.qs, kursor, None, 7)[0]], prva)
+                self.assertEqual([t.pk for t in keyset_page(self.qs, None, kursor, 7)[0]], prva)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("transakcije"), {"nakon": "abc"}).status_code, 200)
+
+    def test_filters_carry_across_pages(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("transakcije"), {"tip": "TROSAK"})
+        self.assertEqual(len(response.context["items"]), 44)
+        self.assertIsNone(response.context["next_query"])
+        response = self.client.get(reverse("transakcije"), {"kategorija": Kategorija.objects.get(korisnik=self.user, naziv="Plaća").pk})
+        self.assertEqual(len(response.context["items"]), 22)
+
+        response = self.client.get(reverse("transakcije"), {"od": "2024-05-02"})
+        self.assertIn("od=2024-05-02", response.context["next_query"])
+        druga = self.client.get(reverse("transakcije") + "?" + response.context["next_query"])
+        ids = [t.pk for t in response.context["items"]] + [t.pk for t in druga.context["items"]]
+        self.assertEqual(ids, list(self.qs.filter(datum__gte=date(2024, 5, 2)).order_by("-datum", "-id")
+                                   .values_list("pk", flat=True)))
+        self.assertIsNone(druga.context["next_query"])
+        self.assertIn("od=2024-05-02", druga.context["prev_query"])
+        self.assertIsNone(druga.context["ukupno"])
+        self.assertEqual(self.client.get(reverse("transakcije") + "?" + druga.context["total_query"]).context["ukupno"], 55)
+
+
+class DashboardCacheTests(TestCase):
+    """Signali poništavaju spremljeni pregled, brojači bilježe pogotke i promašaje"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("cache", 30, random.Random(79))
+        cls.drugi = seed_user("cache-drugi", 0, random.Random(83))
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+
+    def context(self, user=None):
+        return cached_dashboard_context(user or self.user, self.today)
+
+    def misses(self):
+        return counters(["dashboard_miss"])["dashboard_miss"]
+
+    def test_hit_and_miss_counters(self):
+        self.context()
+        self.context()
+        self.context(self.drugi)
+        self.assertEqual(counters(["dashboard_hit", "dashboard_miss"]), {"dashboard_hit": 1, "dashboard_miss": 2})
+
+        self.client.force_login(User.objects.create_superuser("cache-admin", "cache@example.com", "x"))
+        metrike = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn("budzet_dashboard_hit_total 1\n", metrike)
+        self.assertIn("budzet_dashboard_miss_total 2\n", metrike)
+
+    def test_signals_invalidate_cached_context(self):
+        hrana = Kategorija.objects.get(korisnik=self.user, naziv="Hrana")
+        racun = Racun.objects.filter(korisnik=self.user).first()
+        promjene = {
+            "transakcija": lambda: Transakcija.objects.create(korisnik=self.user, kategorija=hrana, racun=racun,
+                                                              iznos=5, datum=self.today),
+            "budžet": lambda: Budzet.objects.filter(korisnik=self.user).first().save(),
+            "račun": lambda: racun.save(),
+            "cilj": lambda: CiljStednje.objects.get(korisnik=self.user).delete(),
+            "pravilo": lambda: PonavljajucaTransakcija.objects.get(korisnik=self.user).save(),
+            "kategorija": lambda: Kategorija.objects.filter(pk=hrana.pk).first().save(),
+        }
+        for naziv, promjena in promjene.items():
+            with self.subTest(promjena=naziv):
+                self.context()
+                self.context(self.drugi)
+                with self.captureOnCommitCallbacks(execute=True):
+                    promjena()
+                promasaji = self.misses()
+                self.context()
+                self.assertEqual(self.misses(), promasaji + 1)
+                # pregled drugog korisnika ostaje u cacheu
+                self.context(self.drugi)
+                self.assertEqual(self.misses(), promasaji + 1)
+
+    def test_invalidated_context_shows_new_data(self):
+        racun = Racun.objects.filter(korisnik=self.user).first()
+        prije = self.context()["total_account_balance"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Transakcija.objects.create(korisnik=self.user, kategorija=Kategorija.objects.get(korisnik=self.user, naziv="Hrana"),
+                                       racun=racun, iznos=Decimal("12.50"), datum=self.today)
+        self.assertAlmostEqual(self.context()["total_account_balance"], prije - 12.5)
+
+    def test_warm_command_needs_shared_cache(self):
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now())
+        with self.assertRaisesMessage(CommandError, "CACHE_URL"):
+            call_command("warm_dashboard_cache", stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as mapa, override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": mapa}}):
+            izlaz = io.StringIO()
+            call_command("warm_dashboard_cache", stdout=izlaz)
+            self.assertIn("za 1 korisnika", izlaz.getvalue())
+            self.context()
+            self.assertEqual(counters(["dashboard_hit", "dashboard_miss"]), {"dashboard_hit": 1, "dashboard_miss": 1})
+
+
+class DashboardShellTests(TestCase):
+    """Okvir pregleda i analize ne računa ono što stranica ionako dohvaća zasebno"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("okvir", 40, random.Random(89))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_dashboard_leaves_widgets_to_fetch(self):
+        response = self.client.get(reverse("dashboard"))
+        for kljuc in ("pie_labels", "pie_values", "bar_labels", "budget_summary", "racuni"):
+            self.assertNotIn(kljuc, response.context)
+        for widget in ("troskovi-po-kategorijama", "prihodi-troskovi", "budzeti", "racuni"):
+            self.assertContains(response, reverse("widget_data", args=[widget]))
+
+        # brojke okvira jednake su onima iz widgeta pregleda
+        pregled = self.client.get(reverse("widget_data", args=["pregled"])).json()
+        for kljuc, widget_kljuc in (("prihodi", "prihodi"), ("troskovi", "troskovi"), ("stanje", "stanje"),
+                                    ("total_account_balance", "na_racunima")):
+            self.assertAlmostEqual(response.context[kljuc], pregled[widget_kljuc])
+
+    def test_budget_analysis_renders_chart_inline(self):
+        response = self.client.get(reverse("budget_analysis"))
+        self.assertNotContains(response, reverse("widget_data", args=["analiza-budzeta"]))
+        self.assertContains(response, 'id="graf-podaci"')
+        self.assertEqual(response.context["graf"], self.client.get(reverse("widget_data", args=["analiza-budzeta"])).json())
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "FTS5 indeks postoji samo na SQLite (migracija 0008)")
+class SearchIndexTests(TestCase):
+    """Okidači iz migracije 0008 drže FTS indeks usklađenim s transakcijama"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_user("pretraga", 0, random.Random(97))
+        cls.drugi = seed_user("pretraga-drugi", 0, random.Random(101))
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.racun = Racun.objects.get(korisnik=cls.user, naziv="Tekući")
+
+    def found(self, q, korisnik=None):
+        return set(Transakcija.objects.search(q, korisnik=korisnik or self.user).values_list("pk", flat=True))
+
+    def assertIndexInSync(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid, korisnik, opis, kategorija, racun FROM core_transakcija_fts ORDER BY rowid")
+            indeks = [tuple(row) for row in cursor.fetchall()]
+        ocekivano = [(t.pk, f"k{t.korisnik_id}", t.opis, t.kategorija.naziv, t.racun.naziv if t.racun else None)
+                     for t in Transakcija.objects.select_related("kategorija", "racun").order_by("pk")]
+        self.assertEqual(indeks, ocekivano)
+
+    def test_save_and_delete(self):
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.hrana, racun=self.racun, iznos=3,
+                                       datum=date(2024, 5, 1), opis="Čaj s prijateljima")
+        # prefiks i riječ bez dijakritika
+        self.assertEqual(self.found("caj prij"), {t.pk})
+        self.assertEqual(self.found("tekuc"), {t.pk})
+        self.assertEqual(self.found("čaj", korisnik=self.drugi), set())
+
+        t.opis = "Kava"
+        t.racun = Racun.objects.get(korisnik=self.user, naziv="Gotovina")
+        t.save()
+        self.assertEqual((self.found("caj"), self.found("kava gotovina")), (set(), {t.pk}))
+        Transakcija.objects.filter(pk=t.pk).update(opis="Burek")
+        self.assertEqual((self.found("kava"), self.found("burek")), (set(), {t.pk}))
+        self.assertIndexInSync()
+
+        t.delete()
+        self.assertEqual(self.found("burek"), set())
+        self.assertIndexInSync()
+
+    def test_bulk_changes(self):
+        rng = random.Random(103)
+        Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, 60, rng)
+                                                     + random_transactions(self.drugi, 20, rng))
+        self.assertIndexInSync()
+        izmjene = list(Transakcija.objects.filter(korisnik=self.user)[:30])
+        for t in izmjene:
+            t.opis = rng.choice(["Pekara", "Kino"])
+            t.racun = None
+        Transakcija.objects.bulk_update_with_effects(izmjene, ["opis", "racun"])
+        self.assertIndexInSync()
+        self.assertEqual(self.found("pekara") | self.found("kino"), {t.pk for t in izmjene})
+        Transakcija.objects.filter(korisnik=self.drugi).delete()
+        self.assertIndexInSync()
+
+    def test_rename_category_and_account(self):
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.hrana, racun=self.racun, iznos=3,
+                                       datum=date(2024, 5, 1), opis="Kava")
+        self.hrana.naziv = "Namirnice"
+        self.hrana.save()
+        self.racun.naziv = "Zajednički"
+        self.racun.save()
+        self.assertEqual((self.found("hrana"), self.found("namirnice")), (set(), {t.pk}))
+        self.assertEqual((self.found("tekuci"), self.found("zajednicki")), (set(), {t.pk}))
+        self.assertIndexInSync()
+
+
+class AsyncViewTests(TransactionTestCase):
+    """Asinkroni pregled i analiza budžeta daju istu stranicu kao sinkroni"""
+    # widgeti se računaju u drugim dretvama s vlastitim vezama, koje ne vide
+    # podatke iz nepotvrđene transakcije oko TestCase testa
+
+    def setUp(self):
+        self.user = seed_user("async", 300, random.Random(107))
+        cache.clear()
+
+    def call(self, view, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return view(request)
+
+    async def acall(self, view, user):
+        request = AsyncRequestFactory().get("/")
+
+        async def auser():
+            return user
+        request.auser = auser
+        return await view(request)
+
+    def test_same_page_as_sync_view(self):
+        for sync_view, async_view in ((dashboard, dashboard_async), (budget_analysis, budget_analysis_async)):
+            with self.subTest(view=sync_view.__name__):
+                cache.clear()
+                odgovor = async_to_sync(self.acall)(async_view, self.user)
+                self.assertEqual(odgovor.status_code, 200)
+                cache.clear()
+                self.assertEqual(odgovor.content.decode(), self.call(sync_view, self.user).content.decode())
+
+    def test_context_matches_sync(self):
+        today = timezone.localdate()
+        self.assertEqual(async_to_sync(adashboard_context)(self.user, today), dashboard_context(self.user, today))
+        # drugi poziv čita iz cachea koji je napunio asinkroni
+        async_to_sync(acached_dashboard_context)(self.user, today)
+        cached_dashboard_context(self.user, today)
+        self.assertEqual(counters(["dashboard_hit", "dashboard_miss"]), {"dashboard_hit": 1, "dashboard_miss": 1})
+
+    def test_anonymous_redirects_to_login(self):
+        for async_view in (dashboard_async, budget_analysis_async):
+            with self.subTest(view=async_view.__name__):
+                odgovor = async_to_sync(self.acall)(async_view, AnonymousUser())
+                self.assertEqual(odgovor.status_code, 302)
+                self.assertTrue(odgovor.url.startswith(reverse("login")))
+
+
+class ShardedRecurringTests(TestCase):
+    """Dijelovi (shard) dijele korisnike bez preklapanja, ponovljena obrada ne duplicira"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(109)
+        frekvencije = [f for f, _ in PonavljajucaTransakcija.FREQUENCY_CHOICES]
+        for i in range(7):
+            user = User.objects.create_user(f"shard{i}", password="x")
+            kategorija = Kategorija.objects.create(korisnik=user, naziv="Plaća", tip="PRIHOD")
+            for _ in range(3):
+                pocetak = date(2024, 1, 1) + timedelta(days=rng.randint(0, 120))
+                PonavljajucaTransakcija.objects.create(korisnik=user, kategorija=kategorija, iznos=10, opis="",
+                                                       frekvencija=rng.choice(frekvencije),
+                                                       datum_pocetka=pocetak, sljedeci_datum=pocetak)
+        cls.today = date(2024, 9, 15)
+
+    def occurrences(self):
+        return sorted(Transakcija.objects.values_list("ponavljajuca_id", "datum"))
+
+    def test_shards_partition_users(self):
+        svi = set(PonavljajucaTransakcija.objects.values_list("pk", flat=True))
+        dijelovi = [set(PonavljajucaTransakcija.objects.shard(i, 3).values_list("pk", flat=True)) for i in range(3)]
+        self.assertEqual(set().union(*dijelovi), svi)
+        self.assertEqual(sum(len(dio) for dio in dijelovi), len(svi))
+        for i, dio in enumerate(dijelovi):
+            korisnici = set(PonavljajucaTransakcija.objects.filter(pk__in=dio).values_list("korisnik_id", flat=True))
+            self.assertTrue(all(k % 3 == i for k in korisnici), korisnici)
+
+    def test_sharded_run_matches_single_run(self):
+        ocekivano = sorted((pravilo.pk, datum) for pravilo in PonavljajucaTransakcija.objects.all()
+                           for datum in pravilo.due_dates(self.today))
+        for i in range(3):
+            PonavljajucaTransakcija.objects.shard(i, 3).process_due(self.today, chunk_size=4)
+        self.assertEqual(self.occurrences(), ocekivano)
+
+        # ponovljeni dijelovi, i cijela obrada povrh njih, nemaju što kreirati
+        for i in range(3):
+            self.assertEqual(PonavljajucaTransakcija.objects.shard(i, 3).process_due(self.today), {})
+        self.assertEqual(PonavljajucaTransakcija.objects.process_due(self.today), {})
+        self.assertEqual(self.occurrences(), ocekivano)
+
+    def test_command_rerun_creates_nothing(self):
+        with mock.patch("django.utils.timezone.now",
+                                 return_value=timezone.make_aware(timezone.datetime(2024, 9, 15, 12))):
+            call_command("process_recurring", "--workers", "3", stdout=io.StringIO())
+            prvo = self.occurrences()
+            izlaz = io.StringIO()
+            call_command("process_recurring", stdout=izlaz)
+        self.assertTrue(prvo)
+        self.assertEqual(self.occurrences(), prvo)
+        self.assertIn("(0 kreiranih transakcija)", izlaz.getvalue())
+
+    def test_occurrence_from_overlapping_run_is_skipped(self):
+        # drugi proces je već kreirao ponavljanje, a sljedeci_datum pravila još nije pomaknut
+        pravilo = PonavljajucaTransakcija.objects.order_by("pk").first()
+        prvi = pravilo.due_dates(self.today)[0]
+        pravilo.build_transaction(prvi).save()
+        obradjeno = PonavljajucaTransakcija.objects.process_due(self.today)
+        self.assertEqual(obradjeno.get(pravilo, 0), len(pravilo.due_dates(self.today)) - 1)
+        self.assertEqual(Transakcija.objects.filter(ponavljajuca=pravilo, datum=prvi).count(), 1)
+
+
+
+class AnalyticsTests(TestCase):
+    """analyze() na maloj povijesti jednak je ručno izračunatim vrijednostima"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analitika", password="x")
+        hrana = Kategorija.objects.create(korisnik=cls.user, naziv="Hrana", tip="TROSAK")
+        placa = Kategorija.objects.create(korisnik=cls.user, naziv="Plaća", tip="PRIHOD")
+        # kategorija bez transakcija ne ulazi u popis
+        Kategorija.objects.create(korisnik=cls.user, naziv="Kino", tip="TROSAK")
+        Transakcija.objects.bulk_create_with_effects([
+            Transakcija(korisnik=cls.user, kategorija=kategorija, iznos=Decimal(iznos), datum=datum)
+            for kategorija, iznos, datum in (
+                # prije razdoblja analize (2 godine do 03.2024)
+                (hrana, "500.00", date(2021, 1, 1)),
+                (hrana, "100.00", date(2023, 1, 10)),
+                (hrana, "50.00", date(2023, 2, 5)),
+                (hrana, "30.00", date(2023, 2, 20)),
+                (placa, "1000.00", date(2023, 2, 1)),
+                (hrana, "120.00", date(2024, 1, 15)),
+                (placa, "1100.00", date(2024, 2, 1)),
+                (hrana, "40.00", date(2024, 3, 1)),
+            )
+        ])
+
+    def setUp(self):
+        cache.clear()
+        # razdoblje počinje prvim mjesecom s transakcijama: 01.2023 - 03.2024
+        self.data = cached_analytics(self.user, date(2024, 3, 15), years=2)
+
+    def test_monthly_series(self):
+        nule = [0.0] * 10
+        self.assertEqual(self.data["mjeseci"][:2] + self.data["mjeseci"][-2:], ["01.2023", "02.2023", "02.2024", "03.2024"])
+        self.assertEqual(len(self.data["mjeseci"]), 15)
+        self.assertEqual(self.data["troskovi"], [100.0, 80.0, *nule, 120.0, 0.0, 40.0])
+        self.assertEqual(self.data["prihodi"], [0.0, 1000.0, *nule, 0.0, 1100.0, 0.0])
+        # isti mjesec prošle godine: (120 - 100) / 100, (0 - 80) / 80, a bez troškova nema promjene
+        self.assertEqual(self.data["promjena_godisnje"], [None] * 12 + [20.0, -100.0, None])
+
+        prosjeci = {p["prozor"]: p["vrijednosti"] for p in self.data["prosjeci"]}
+        self.assertEqual(prosjeci[3], [None, None, 60.0, 26.67, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 40.0, 40.0, 53.33])
+        self.assertEqual(prosjeci[6], [None] * 5 + [30.0, 13.33, 0.0, 0.0, 0.0, 0.0, 0.0, 20.0, 20.0, 26.67])
+        self.assertEqual(prosjeci[12], [None] * 11 + [15.0, 16.67, 10.0, 13.33])
+
+    def test_categories(self):
+        self.assertEqual(self.data["kategorije"], [{
+            "naziv": "Plaća", "tip": "PRIHOD",
+            "zadnjih12": 1100.0, "prethodnih12": 1000.0, "promjena": 10.0,
+            # 1100 u 11. od zadnjih 12 mjeseci: 1100 * 4.5 / 143
+            "trend": 34.62,
+            "prosjeci": [366.67, 183.33, 91.67],
+            # 15 mjeseci [0 x 13, 1000, 1100]: 90. percentil na 12.6 -> 0.6 * 1000
+            "percentili": [0.0, 600.0],
+        }, {
+            "naziv": "Hrana", "tip": "TROSAK",
+            "zadnjih12": 160.0, "prethodnih12": 180.0, "promjena": -11.1,
+            # (120 * 3.5 + 40 * 5.5) / 143
+            "trend": 4.48,
+            "prosjeci": [53.33, 26.67, 13.33],
+            # [0 x 11, 40, 80, 100, 120]: 80 + 0.6 * 20
+            "percentili": [0.0, 92.0],
+        }])
+
+    def test_transaction_percentiles(self):
+        self.assertEqual(self.data["transakcije"], 7)
+        # troškovi [30, 40, 50, 100, 120], linearna interpolacija
+        self.assertEqual(self.data["percentili_transakcija"],
+                         [(25, 40.0), (50, 50.0), (75, 100.0), (90, 112.0), (99, 119.2)])
+
+    def test_empty_history(self):
+        data = cached_analytics(User.objects.create_user("analitika-prazno", password="x"), date(2024, 3, 15), years=1)
+        self.assertEqual(data["troskovi"], [0.0] * 12)
+        self.assertEqual(data["kategorije"], [])
+        self.assertEqual(data["percentili_transakcija"], [(p, None) for p in TRANSACTION_PERCENTILES])
+
+
+class DailyBalanceTests(TestCase):
+    """Dnevna stanja prate transakcije s ranijim datumom, izmjene i brisanja"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rng = random.Random(113)
+        cls.user = seed_user("dnevno", 0, cls.rng)
+        cls.hrana = Kategorija.objects.get(korisnik=cls.user, naziv="Hrana")
+        cls.placa = Kategorija.objects.get(korisnik=cls.user, naziv="Plaća")
+        cls.racuni = list(Racun.objects.filter(korisnik=cls.user).order_by("pk"))
+        cls.today = timezone.localdate()
+        Transakcija.objects.bulk_create_with_effects(random_transactions(cls.user, 120, cls.rng, days=60))
+
+    def expected_balance(self, racun, datum):
+        ukupno = (Transakcija.objects.filter(racun=racun, datum__lte=datum)
+                  .aggregate(ukupno=Transakcija.signed_sum())["ukupno"])
+        # SQLite zbraja decimalne stupce kao REAL
+        return (racun.pocetno_stanje + (ukupno or 0)).quantize(Decimal("0.01"))
+
+    def days(self):
+        return [self.today - timedelta(days=n) for n in range(-1, 100)]
+
+    def snapshot(self, racun):
+        # dan kojem su sve transakcije obrisane ostaje s promjenom 0, rebuild ga ne stvara
+        return [red for red in DnevnoStanje.objects.filter(racun=racun).values_list("datum", "promjena", "kumulativ")
+                if red[1]]
+
+    def assertBalancesCorrect(self):
+        for racun in Racun.objects.filter(korisnik=self.user):
+            with self.subTest(racun=racun.naziv):
+                promet = defaultdict(Decimal)
+                for datum, iznos, tip in Transakcija.objects.filter(racun=racun).values_list("datum", "iznos", "kategorija__tip"):
+                    promet[datum] += iznos if tip == "PRIHOD" else -iznos
+                self.assertEqual([racun.balance_on(d) for d in self.days()],
+                                 [racun.pocetno_stanje + sum(v for k, v in promet.items() if k <= d) for d in self.days()])
+                self.assertEqual(racun.balance_on(self.today), racun.trenutno_stanje)
+                inkrementalno = self.snapshot(racun)
+                with transaction.atomic():
+                    DnevnoStanje.rebuild_account(racun.pk)
+                    self.assertEqual(inkrementalno, self.snapshot(racun))
+                    transaction.set_rollback(True)
+
+    def test_backdated_insert_edit_delete(self):
+        self.assertBalancesCorrect()
+        # ranije od svih postojećih transakcija
+        t = Transakcija.objects.create(korisnik=self.user, kategorija=self.hrana, racun=self.racuni[0],
+                                       iznos=Decimal("33.30"), datum=self.today - timedelta(days=90))
+        self.assertBalancesCorrect()
+        for promjena in ({"datum": self.today - timedelta(days=30)}, {"iznos": Decimal("5.05")},
+                         {"kategorija": self.placa}, {"racun": self.racuni[1], "datum": self.today - timedelta(days=95)},
+                         {"racun": None}, {"racun": self.racuni[0], "datum": self.today}):
+            with self.subTest(promjena=promjena):
+                for polje, vrijednost in promjena.items():
+                    setattr(t, polje, vrijednost)
+                t.save()
+                self.assertBalancesCorrect()
+        t.delete()
+        self.assertBalancesCorrect()
+        # brisanje svih transakcija jednog dana
+        dan = Transakcija.objects.filter(racun=self.racuni[0]).order_by("datum").values_list("datum", flat=True).first()
+        for t in Transakcija.objects.filter(racun=self.racuni[0], datum=dan):
+            t.delete()
+        self.assertBalancesCorrect()
+
+    def test_bulk_changes(self):
+        Transakcija.objects.bulk_create_with_effects(random_transactions(self.user, 80, self.rng, days=90))
+        self.assertBalancesCorrect()
+        izmjene = list(Transakcija.objects.filter(korisnik=self.user).order_by("?")[:60])
+        for t in izmjene:
+            t.datum = self.today - timedelta(days=self.rng.randint(0, 95))
+            t.racun = self.rng.choice(self.racuni + [None])
+        Transakcija.objects.bulk_update_with_effects(izmjene, ["datum", "racun"])
+        self.assertBalancesCorrect()
+        with TransactionEffects.deferred():
+            for t in izmjene[:30]:
+                t.delete()
+        self.assertBalancesCorrect()
+
+    def test_history_view(self):
+        racun = self.racuni[0]
+        Transakcija.objects.create(korisnik=self.user, kategorija=self.placa, racun=racun,
+                                   iznos=Decimal("250.00"), datum=self.today - timedelta(days=45))
+        self.client.force_login(self.user)
+        od, do, datum = self.today - timedelta(days=50), self.today - timedelta(days=10), self.today - timedelta(days=45)
+        response = self.client.get(reverse("racun_povijest", args=[racun.pk]),
+                                   {"od": od.isoformat(), "do": do.isoformat(), "datum": datum.isoformat()})
+        self.assertEqual(response.context["stanje_na_datum"], self.expected_balance(racun, datum))
+        graf = response.context["graf"]
+        self.assertEqual((graf["labels"][0], graf["labels"][-1]), (od.isoformat(), do.isoformat()))
+        # prva točka je stanje na početku raspona, ostale na kraju dana
+        self.assertAlmostEqual(graf["stanje"][0], float(self.expected_balance(racun, od - timedelta(days=1))), places=2)
+        for label, stanje in zip(graf["labels"][1:], graf["stanje"][1:]):
+            self.assertAlmostEqual(stanje, float(self.expected_balance(racun, date.fromisoformat(label))), places=2)
+        # graf ima točku za svaki dan s prometom u rasponu
+        dani = set(Transakcija.objects.filter(racun=racun, datum__gte=od, datum__lte=do).values_list("datum", flat=True))
+        self.assertLessEqual({d.isoformat() for d in dani}, set(graf["labels"]))
+
+
+class PositiveAmountMigrationTests(TransactionTestCase):
+    """Stari negativni troškovi postaju pozitivni prije sažetka i usklađivanja stanja (0004, 0005)"""
+
+    def test_negative_amounts_are_normalized(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("core", "0003_alter_transakcija_racun")])
+        apps = executor.loader.project_state([("core", "0003_alter_transakcija_racun")]).apps
+        user = apps.get_model("auth", "User").objects.create(username="stari")
+        racun = apps.get_model("core", "Racun").objects.create(korisnik=user, naziv="Tekući", tip="BANKA",
+                                                               pocetno_stanje=100, trenutno_stanje=100)
+        kategorija = apps.get_model("core", "Kategorija")
+        hrana = kategorija.objects.create(korisnik=user, naziv="Hrana", tip="TROSAK")
+        placa = kategorija.objects.create(korisnik=user, naziv="Plaća", tip="PRIHOD")
+        stara = apps.get_model("core", "Transakcija")
+        for kat, iznos in ((hrana, "-30.00"), (hrana, "20.00"), (placa, "50.00"), (hrana, "0")):
+            stara.objects.create(korisnik=user, kategorija=kat, racun=racun, iznos=Decimal(iznos), datum=date(2024, 5, 1))
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(sorted(Transakcija.objects.values_list("iznos", flat=True)), [20, 30, 50])
+        racun = Racun.objects.get(pk=racun.pk)
+        self.assertEqual(racun.trenutno_stanje, 100 - 30 - 20 + 50)
+        self.assertEqual(racun.balance_on(date(2024, 5, 1)), racun.trenutno_stanje)
+        self.assertEqual(MjesecniSazetak.objects.get(kategorija_id=hrana.pk).iznos, 50)
+
+
+class DemoDataTests(TestCase):
+    """create_demo_data --scale: isti seed daje iste podatke, broj redaka i izvedena stanja odgovaraju"""
+
+    def rows(self, prefix):
+        return [(t.korisnik.username.removeprefix(prefix), t.kategorija.naziv, t.racun and t.racun.naziv,
+                 t.doprinos_cilju and t.doprinos_cilju.naziv, t.iznos, t.datum, t.opis)
+                for t in Transakcija.objects.filter(korisnik__username__startswith=prefix)
+                .select_related("korisnik", "kategorija", "racun", "doprinos_cilju").order_by("pk")]
+
+    def test_same_seed_same_rows(self):
+        today = date(2024, 6, 15)
+        for prefix, seed in (("prvi", 7), ("drugi", 7), ("treci", 8)):
+            DemoGenerator(seed=seed, transactions=40, months=6, chunk_size=25, prefix=prefix, today=today).run(0, 3)
+        prvi = self.rows("prvi")
+        self.assertEqual(len(prvi), 120)
+        self.assertEqual(prvi, self.rows("drugi"))
+        self.assertNotEqual(prvi, self.rows("treci"))
+        # korisnici iz drugog raspona ne ovise o prethodnima
+        DemoGenerator(seed=7, transactions=40, months=6, chunk_size=25, prefix="dio", today=today).run(2, 1)
+        self.assertEqual([r for r in prvi if r[0] == "0000002"], self.rows("dio"))
+
+    def test_scale_counts_and_balances(self):
+        izlaz = io.StringIO()
+        # komad od 7 redaka: transakcije korisnika idu u više bulk_create poziva
+        call_command("create_demo_data", "--scale", "5", "--transactions", "30", "--months", "4",
+                     "--chunk-size", "7", "--prefix", "skala", stdout=izlaz)
+        self.assertIn("Kreirano 5 korisnika, 150 transakcija", izlaz.getvalue())
+        users = User.objects.filter(username__startswith="skala")
+        self.assertEqual(users.count(), 5)
+        for user in users:
+            with self.subTest(user=user.username):
+                self.assertEqual(Transakcija.objects.filter(korisnik=user).count(), 30)
+                self.assertEqual(Kategorija.objects.filter(korisnik=user).count(), len(KATEGORIJE))
+                self.assertTrue(PonavljajucaTransakcija.objects.filter(korisnik=user).exists())
+
+                sazetak = lambda: {(s.kategorija_id, s.racun_id, s.godina, s.mjesec): (s.iznos, s.broj)
+                                   for s in MjesecniSazetak.objects.filter(korisnik=user)}
+                inkrementalno = sazetak()
+                MjesecniSazetak.rebuild(user)
+                self.assertEqual(inkrementalno, sazetak())
+                for racun in Racun.objects.filter(korisnik=user):
+                    stanje = racun.trenutno_stanje
+                    racun.update_balance()
+                    self.assertEqual(stanje, racun.trenutno_stanje, racun.naziv)
+                    dnevno = list(DnevnoStanje.objects.filter(racun=racun).order_by("datum")
+                                  .values_list("datum", "promjena", "kumulativ"))
+                    DnevnoStanje.rebuild_account(racun.pk)
+                    self.assertEqual(dnevno, list(DnevnoStanje.objects.filter(racun=racun).order_by("datum")
+                                                  .values_list("datum", "promjena", "kumulativ")))
+
+        with self.assertRaises(CommandError):
+            call_command("create_demo_data", "--scale", "1", "--prefix", "skala", stdout=io.StringIO())
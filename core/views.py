@@ -1,18 +1,32 @@
-from datetime import timedelta, date
-import calendar
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 import csv
+import io
+import json
+import zlib
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.views import LoginView, LogoutView
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
-from django.http import HttpResponse
-from django.shortcuts import redirect, render
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-
-from .forms import RegisterForm, KategorijaForm, TransakcijaForm, CiljForm, RacunForm, BudzetForm, PonavljajucaTransakcijaForm
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+
+from .analytics import PERCENTILES, WINDOWS, cached_analytics
+from .batch import BatchError, TransactionBatch
+from .caching import DATA, counters, get_version
+from .forecast import forecast_for_user
+from .forms import RegisterForm, KategorijaForm, TransakcijaForm, CiljForm, RacunForm, BudzetForm, PonavljajucaTransakcijaForm, ImportForm
+from .importer import TransactionImporter
 from .models import Kategorija, Transakcija, CiljStednje, Racun, Budzet, PonavljajucaTransakcija
+from .reports import (WIDGETS, acached_dashboard_context, budget_analysis_chart, budget_analysis_data,
+                      cached_dashboard_context, in_thread)
+from .routers import replica_reads
 
 
 def register(request):
@@ -38,130 +52,22 @@ class MyLogoutView(LogoutView):
 
 
 @login_required
+@replica_reads
 def dashboard(request):
-    today = timezone.localdate()
-
-    # cijeli tekući mjesec
-    first_of_month = date(today.year, today.month, 1)
-    last_day = calendar.monthrange(today.year, today.month)[1]
-    end_of_month = date(today.year, today.month, last_day)
+    context = cached_dashboard_context(request.user, timezone.localdate())
+    return render(request, "core/dashboard.html", context)
 
-    trans = Transakcija.objects.filter(
-        korisnik=request.user,
-        datum__gte=first_of_month,
-        datum__lte=end_of_month
-    )
 
-    prihodi_val = trans.filter(kategorija__tip="PRIHOD").aggregate(s=Sum("iznos"))["s"] or 0
-    troskovi_val = trans.filter(kategorija__tip="TROSAK").aggregate(s=Sum("iznos"))["s"] or 0
-
-    prihodi = float(prihodi_val)
-    troskovi = abs(float(troskovi_val))
-    stanje = prihodi - troskovi
-
-    # PIE graf
-    pie_qs = (trans.filter(kategorija__tip="TROSAK")
-                    .values("kategorija__naziv")
-                    .annotate(total=Sum("iznos"))
-                    .order_by("-total"))
-    pie_labels = [x["kategorija__naziv"] for x in pie_qs]
-    pie_values = [abs(float(x["total"])) for x in pie_qs]
-
-    # BAR graf
-    year_ago = today.replace(day=1) - timedelta(days=365)
-    hist = (Transakcija.objects
-            .filter(korisnik=request.user, datum__gte=year_ago, datum__lte=end_of_month)
-            .annotate(m=TruncMonth("datum"))
-            .values("m", "kategorija__tip")
-            .annotate(total=Sum("iznos"))
-            .order_by("m"))
-
-    months = []
-    inc = {}
-    exp = {}
-    cur = year_ago.replace(day=1)
-    while cur <= end_of_month:
-        key = cur.strftime("%Y-%m")
-        months.append(key)
-        inc[key] = 0.0
-        exp[key] = 0.0
-        if cur.month == 12:
-            cur = cur.replace(year=cur.year + 1, month=1)
-        else:
-            cur = cur.replace(month=cur.month + 1)
-
-    for row in hist:
-        key = row["m"].strftime("%Y-%m")
-        val = float(row["total"] or 0)
-        if row["kategorija__tip"] == "PRIHOD":
-            inc[key] += val
-        else:
-            exp[key] += val
-
-    bar_labels = [f'{k.split("-")[1]}.{k.split("-")[0]}' for k in months]
-    bar_prihodi = [inc[k] for k in months]
-    bar_troskovi = [exp[k] for k in months]
-
-    ciljevi = CiljStednje.objects.filter(korisnik=request.user).order_by("naziv")
-    
-    # Budžet analiza za trenutni mjesec
-    current_year = today.year
-    current_month = today.month
-    budgets = Budzet.objects.filter(
-        korisnik=request.user,
-        godina=current_year,
-        mjesec=current_month,
-        aktivno=True
-    )
-    
-    budget_summary = []
-    total_budget = 0
-    total_spent = 0
-    over_budget_count = 0
-    
-    for budget in budgets:
-        actual_spending = budget.get_actual_spending()
-        remaining = budget.get_remaining_budget()
-        percentage_used = budget.get_percentage_used()
-        
-        budget_summary.append({
-            'budget': budget,
-            'actual': actual_spending,
-            'remaining': remaining,
-            'percentage': percentage_used,
-            'status': 'over' if remaining < 0 else 'warning' if percentage_used > 80 else 'under'
-        })
-        
-        total_budget += float(budget.iznos)
-        total_spent += actual_spending
-        if remaining < 0:
-            over_budget_count += 1
-    
-    # Računi
-    racuni = Racun.objects.filter(korisnik=request.user, aktivno=True)
-    total_account_balance = sum(float(racun.trenutno_stanje) for racun in racuni)
-    
-    # Ponavljajuće transakcije
-    recurring_count = PonavljajucaTransakcija.objects.filter(
-        korisnik=request.user, 
-        aktivno=True
-    ).count()
-    
-    return render(request, "core/dashboard.html", {
-        "prihodi": prihodi, "troskovi": troskovi, "stanje": stanje,
-        "pie_labels": pie_labels, "pie_values": pie_values,
-        "bar_labels": bar_labels, "bar_prihodi": bar_prihodi, "bar_troskovi": bar_troskovi,
-        "ciljevi": ciljevi,
-        "budget_summary": budget_summary,
-        "total_budget": total_budget,
-        "total_spent": total_spent,
-        "over_budget_count": over_budget_count,
-        "racuni": racuni,
-        "total_account_balance": total_account_balance,
-        "recurring_count": recurring_count,
-        "current_month": current_month,
-        "current_year": current_year
-    })
+@replica_reads
+async def dashboard_async(request):
+    """dashboard za ASGI: widgeti se računaju istovremeno (vidi ASYNC_VIEWS)"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    # request.user bi inače ponovno učitao korisnika sinkrono (predložak, context processori)
+    request.user = user
+    context = await acached_dashboard_context(user, timezone.localdate())
+    return await sync_to_async(render)(request, "core/dashboard.html", context)
 
 
 @login_required
@@ -179,8 +85,8 @@ def kategorije_list_create(request):
     return render(request, "core/kategorije.html", {"form": form, "items": items})
 
 
-@login_required
-def transakcije_list_create(request):
+def filter_transakcije(request):
+    """Transakcije korisnika filtrirane po GET parametrima (tip, kategorija, od, do, q)"""
     qs = Transakcija.objects.filter(korisnik=request.user)
 
     tip = request.GET.get("tip")
@@ -196,6 +102,57 @@ def transakcije_list_create(request):
         qs = qs.filter(datum__gte=od)
     if do:
         qs = qs.filter(datum__lte=do)
+    if request.GET.get("q"):
+        qs = qs.search(request.GET["q"], korisnik=request.user)
+    return qs
+
+
+TRANSAKCIJE_PO_STRANICI = 50
+
+
+def parse_cursor(cursor):
+    """Kursor 'YYYY-MM-DD_id' -> (datum, id) ili None ako nije ispravan"""
+    try:
+        datum, pk = cursor.split("_")
+        return date.fromisoformat(datum), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(qs, nakon, prije, per_page):
+    """Stranica po redoslijedu (-datum, -id) bez OFFSET-a.
+
+    ``nakon`` vraća sljedeću stranicu iza kursora, ``prije`` prethodnu. Svaka
+    stranica je jedan indeksirani upit od per_page + 1 redaka, pa je stranica
+    500 jednako brza kao prva. Vraća (redci, kursor sljedeće, kursor prethodne).
+    """
+    unatrag = parse_cursor(prije)
+    naprijed = parse_cursor(nakon)
+    if unatrag:
+        datum, pk = unatrag
+        rows = list(qs.filter(Q(datum__gt=datum) | Q(datum=datum, id__gt=pk))
+                      .order_by("datum", "id")[:per_page + 1])
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if naprijed:
+            datum, pk = naprijed
+            qs = qs.filter(Q(datum__lt=datum) | Q(datum=datum, id__lt=pk))
+        rows = list(qs.order_by("-datum", "-id")[:per_page + 1])
+        has_prev, has_next = bool(naprijed), len(rows) > per_page
+        rows = rows[:per_page]
+    if not rows:
+        return rows, None, None
+
+    def cursor(t):
+        return f"{t.datum.isoformat()}_{t.id}"
+
+    return rows, cursor(rows[-1]) if has_next else None, cursor(rows[0]) if has_prev else None
+
+
+@login_required
+def transakcije_list_create(request):
+    qs = filter_transakcije(request)
 
     if request.method == "POST":
         form = TransakcijaForm(request.POST)
@@ -213,8 +170,29 @@ def transakcije_list_create(request):
         form.fields["racun"].queryset = Racun.objects.filter(korisnik=request.user, aktivno=True)
         form.fields["doprinos_cilju"].queryset = CiljStednje.objects.filter(korisnik=request.user)
 
+    items, nakon, prije = keyset_page(
+        qs.select_related("kategorija", "racun", "doprinos_cilju"),
+        request.GET.get("nakon"), request.GET.get("prije"), TRANSAKCIJE_PO_STRANICI,
+    )
+    # ukupan broj je skup na velikim povijestima, pa se računa samo na zahtjev
+    ukupno = qs.count() if request.GET.get("ukupno") else None
+
+    def page_query(**cursor):
+        params = request.GET.copy()
+        for key in ("nakon", "prije"):
+            params.pop(key, None)
+        params.update(cursor)
+        return params.urlencode()
+
     kategorije = Kategorija.objects.filter(korisnik=request.user)
-    return render(request, "core/transakcije.html", {"form": form, "items": qs, "kategorije": kategorije})
+    return render(request, "core/transakcije.html", {
+        "form": form, "items": items, "kategorije": kategorije,
+        "ukupno": ukupno,
+        "first_query": page_query() if request.GET.get("nakon") or request.GET.get("prije") else None,
+        "next_query": page_query(nakon=nakon) if nakon else None,
+        "prev_query": page_query(prije=prije) if prije else None,
+        "total_query": page_query(ukupno=1),
+    })
 
 
 @login_required
@@ -232,38 +210,88 @@ def ciljevi_list_create(request):
     return render(request, "core/ciljevi.html", {"form": form, "items": items})
 
 
+class Echo:
+    """Pseudo-buffer za csv.writer: writerow() vraća redak umjesto pisanja"""
+    def write(self, value):
+        return value
+
+
+def csv_rows(qs, chunk_size=2000):
+    """Generira CSV izvoz u blokovima redaka; memorija ne raste s brojem transakcija"""
+    tipovi = dict(Kategorija.TIP_CHOICES)
+    writer = csv.writer(Echo())
+    # stupci kao DEFAULT_COLUMNS uvoza, pa se izvoz može ponovno uvesti
+    yield writer.writerow(["Datum", "Tip", "Kategorija", "Iznos", "Opis", "Cilj", "Račun"])
+    rows = (qs.order_by("-datum", "-id")
+              .values_list("datum", "kategorija__tip", "kategorija__naziv", "iznos", "opis", "doprinos_cilju__naziv",
+                           "racun__naziv")
+              .iterator(chunk_size=chunk_size))
+    blok = []
+    for datum, tip, kategorija, iznos, opis, cilj, racun in rows:
+        blok.append(writer.writerow([datum, tipovi.get(tip, tip), kategorija, float(iznos), opis or "", cilj or "",
+                                     racun or ""]))
+        if len(blok) >= chunk_size:
+            yield "".join(blok)
+            blok = []
+    if blok:
+        yield "".join(blok)
+
+
+def gzip_stream(chunks):
+    """Komprimira tok tekstualnih blokova u gzip bez držanja cijelog izvoza u memoriji"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @login_required
+@replica_reads
 def transakcije_export_csv(request):
-    qs = Transakcija.objects.filter(korisnik=request.user)
+    qs = filter_transakcije(request)
 
-    tip = request.GET.get("tip")
-    kategorija_id = request.GET.get("kategorija")
-    od = request.GET.get("od")
-    do = request.GET.get("do")
+    if request.GET.get("gzip"):
+        response = StreamingHttpResponse(gzip_stream(csv_rows(qs)), content_type="application/gzip")
+        response["Content-Disposition"] = 'attachment; filename="transakcije.csv.gz"'
+    else:
+        response = StreamingHttpResponse(csv_rows(qs), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="transakcije.csv"'
+    return response
 
-    if tip in ("PRIHOD", "TROSAK"):
-        qs = qs.filter(kategorija__tip=tip)
-    if kategorija_id:
-        qs = qs.filter(kategorija_id=kategorija_id)
-    if od:
-        qs = qs.filter(datum__gte=od)
-    if do:
-        qs = qs.filter(datum__lte=do)
+@login_required
+def transakcije_import(request):
+    """Uvoz transakcija iz CSV izvoda (stupci kao u CSV izvozu)"""
+    result = None
+    if request.method == "POST":
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            importer = TransactionImporter(request.user, create_missing=form.cleaned_data["kreiraj_kategorije"])
+            lines = io.TextIOWrapper(form.cleaned_data["datoteka"].file, encoding="utf-8-sig",
+                                     errors="surrogateescape", newline="")
+            result = importer.run(lines, delimiter=form.cleaned_data["razdjelnik"])
+    else:
+        form = ImportForm()
+    return render(request, "core/import.html", {"form": form, "result": result})
 
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = 'attachment; filename="transakcije.csv"'
-    writer = csv.writer(response)
-    writer.writerow(["Datum", "Tip", "Kategorija", "Iznos", "Opis", "Cilj"])
-    for t in qs.order_by("-datum", "-id"):
-        writer.writerow([
-            t.datum,
-            t.kategorija.get_tip_display(),
-            t.kategorija.naziv,
-            float(t.iznos),
-            t.opis or "",
-            t.doprinos_cilju.naziv if t.doprinos_cilju else ""
-        ])
-    return response
+@login_required
+@require_POST
+def transakcije_batch(request):
+    """JSON API: {"transakcije": [...]} kreira stavke bez id-a i mijenja stavke s id-em, sve ili ništa"""
+    try:
+        podaci = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"greska": "Neispravan JSON"}, status=400)
+    batch = TransactionBatch(request.user)
+    try:
+        rezultat = batch.run(podaci.get("transakcije") if isinstance(podaci, dict) else None)
+    except BatchError as e:
+        return JsonResponse({"greska": str(e)}, status=400)
+    if rezultat is None:
+        return JsonResponse({"greske": batch.errors}, status=400)
+    kreirano, izmijenjeno = rezultat
+    return JsonResponse({"kreirano": kreirano, "izmijenjeno": izmijenjeno}, status=201 if kreirano else 200)
 
 from django.contrib.auth import logout
 from django.shortcuts import redirect
@@ -291,6 +319,36 @@ def racuni_list_create(request):
     return render(request, "core/racuni.html", {"form": form, "items": items})
 
 
+def parse_date(value, default):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+
+@login_required
+def racun_povijest(request, pk):
+    """Stanje računa kroz vrijeme (graf) i stanje na odabrani dan (?datum=)"""
+    racun = get_object_or_404(Racun, pk=pk, korisnik=request.user)
+    today = timezone.localdate()
+    do = parse_date(request.GET.get("do"), today)
+    od = parse_date(request.GET.get("od"), do.replace(day=1) - timedelta(days=365))
+    datum = parse_date(request.GET.get("datum"), today)
+    pocetak, dani = racun.balance_history(od, do)
+    # stanje se mijenja samo na dane s prometom, graf ide od početka do kraja raspona
+    tocke = [(od, pocetak)] + dani
+    if tocke[-1][0] < do:
+        tocke.append((do, tocke[-1][1]))
+    return render(request, "core/racun_povijest.html", {
+        "racun": racun,
+        "od": od,
+        "do": do,
+        "datum": datum,
+        "stanje_na_datum": racun.balance_on(datum),
+        "graf": {"labels": [d.isoformat() for d, _ in tocke], "stanje": [float(s) for _, s in tocke]},
+    })
+
+
 @login_required
 def budzeti_list_create(request):
     if request.method == "POST":
@@ -302,7 +360,7 @@ def budzeti_list_create(request):
             return redirect("budzeti")
     else:
         form = BudzetForm(user=request.user)
-    items = Budzet.objects.filter(korisnik=request.user)
+    items = Budzet.objects.filter(korisnik=request.user).select_related("kategorija").with_actual_spending()
     return render(request, "core/budzeti.html", {"form": form, "items": items})
 
 
@@ -326,71 +384,99 @@ def ponavljajuce_transakcije_list_create(request):
 def process_recurring_transactions(request):
     """Obrađuje ponavljajuće transakcije koje su dospjele"""
     today = timezone.now().date()
-    recurring_transactions = PonavljajucaTransakcija.objects.filter(
-        korisnik=request.user,
-        aktivno=True,
-        sljedeci_datum__lte=today
-    )
-    
-    processed_count = 0
-    for recurring in recurring_transactions:
-        if not recurring.datum_kraja or recurring.sljedeci_datum <= recurring.datum_kraja:
-            recurring.create_transaction()
-            processed_count += 1
+    obradjeno = PonavljajucaTransakcija.objects.filter(korisnik=request.user).process_due(today)
+    processed_count = sum(obradjeno.values())
     
     return HttpResponse(f"Obrađeno {processed_count} ponavljajućih transakcija.")
 
 
 @login_required
+@replica_reads
 def budget_analysis(request):
     """Analiza budžeta vs stvarnih troškova"""
-    today = timezone.now().date()
-    current_year = today.year
-    current_month = today.month
-    
-    # Dohvati sve aktivne budžete za trenutnu godinu
-    budgets = Budzet.objects.filter(
-        korisnik=request.user,
-        godina=current_year,
-        aktivno=True
-    ).order_by('period', 'mjesec', 'kategorija__naziv')
-    
-    # Grupiraj budžete po kategoriji
-    budget_groups = {}
-    for budget in budgets:
-        kategorija_naziv = budget.kategorija.naziv
-        if kategorija_naziv not in budget_groups:
-            budget_groups[kategorija_naziv] = {
-                'kategorija': budget.kategorija,
-                'total_budget': 0,
-                'total_actual': 0,
-                'budgets': []
-            }
-        
-        actual_spending = budget.get_actual_spending()
-        budget_groups[kategorija_naziv]['total_budget'] += float(budget.iznos)
-        budget_groups[kategorija_naziv]['total_actual'] += actual_spending
-        budget_groups[kategorija_naziv]['budgets'].append(budget)
-    
-    # Kreiraj budget_data za prikaz
-    budget_data = []
-    for kategorija_naziv, group in budget_groups.items():
-        total_remaining = group['total_budget'] - group['total_actual']
-        percentage_used = (group['total_actual'] / group['total_budget'] * 100) if group['total_budget'] > 0 else 0
-        
-        budget_data.append({
-            'kategorija_naziv': kategorija_naziv,
-            'kategorija': group['kategorija'],
-            'total_budget': group['total_budget'],
-            'actual': group['total_actual'],
-            'remaining': total_remaining,
-            'percentage': percentage_used,
-            'status': 'over' if total_remaining < 0 else 'under' if percentage_used < 80 else 'warning',
-            'budgets': group['budgets']
-        })
-    
+    today = timezone.localdate()
+    budget_data = budget_analysis_data(request.user, today)
     return render(request, "core/budget_analysis.html", {
         "budget_data": budget_data,
-        "current_month": current_month,
-        "current_year": current_year
+        "graf": budget_analysis_chart(budget_data),
+        "current_month": today.month,
+        "current_year": today.year
     })
+
+
+@replica_reads
+async def budget_analysis_async(request):
+    """budget_analysis za ASGI (vidi ASYNC_VIEWS); jedan upit u zasebnoj dretvi, ništa ne teče paralelno"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    request.user = user
+    today = timezone.localdate()
+    budget_data = await in_thread(budget_analysis_data, user, today)
+    return await sync_to_async(render)(request, "core/budget_analysis.html", {
+        "budget_data": budget_data,
+        "graf": budget_analysis_chart(budget_data),
+        "current_month": today.month,
+        "current_year": today.year
+    })
+
+
+@login_required
+@replica_reads
+def analytics(request):
+    """Dugoročni trendovi potrošnje (zadnjih 10 godina)"""
+    return render(request, "core/analitika.html", {
+        "analitika": cached_analytics(request.user, timezone.localdate()),
+        "prozori": WINDOWS,
+        "percentili": PERCENTILES,
+    })
+
+
+def data_etag(request, widget):
+    """Mijenja se sa svakom promjenom podataka korisnika i s novim danom"""
+    return f"{widget}-{get_version(DATA, request.user.pk)}-{timezone.localdate().isoformat()}"
+
+
+def data_last_modified(request, widget):
+    changed = datetime.fromtimestamp(get_version(DATA, request.user.pk) / 1e9, tz=dt_timezone.utc)
+    # izračuni ovise i o tekućem danu/mjesecu
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(changed, midnight)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@replica_reads
+def widget_data(request, widget):
+    """Podaci jednog widgeta pregleda ili analize (JSON); 304 ako se ništa nije promijenilo"""
+    if widget not in WIDGETS:
+        raise Http404
+    return JsonResponse(WIDGETS[widget](request.user, timezone.localdate()))
+
+
+@login_required
+def cash_flow_forecast(request):
+    """Prognoza ukupnog stanja računa po danu iz ponavljajućih transakcija (JSON)"""
+    try:
+        months = int(request.GET.get("mjeseci", 12))
+    except ValueError:
+        months = 12
+    days, balances = forecast_for_user(request.user, months, timezone.localdate())
+    return JsonResponse({
+        "dani": [d.isoformat() for d in days],
+        "stanje": balances.round(2).tolist(),
+    })
+
+
+METRIKE = ("dashboard_hit", "dashboard_miss")
+
+
+@staff_member_required
+def metrics(request):
+    """Brojači cachea u Prometheus tekstualnom formatu"""
+    lines = []
+    for name, value in counters(METRIKE).items():
+        lines.append(f"# TYPE budzet_{name}_total counter")
+        lines.append(f"budzet_{name}_total {value}")
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")